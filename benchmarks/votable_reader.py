@@ -0,0 +1,75 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Compares the speed of pyvo.io.votable.parse with astropy.io.votable.parse.
+
+Run as ``python benchmarks/votable_reader.py [nrows]``.  The table is
+modelled on ObsCore responses: a few repetitive strings, identifiers,
+and floating point and integer columns, some of them null.
+"""
+import sys
+import timeit
+from functools import partial
+from io import BytesIO
+
+import numpy as np
+
+from astropy.io.votable import parse as astropy_parse
+from astropy.io.votable.tree import Field, Resource, TableElement, VOTableFile
+
+from pyvo.io.votable import parse as pyvo_parse
+
+
+def make_votable(nrows, format):
+    rng = np.random.default_rng(42)
+    votable = VOTableFile()
+    resource = Resource(type="results")
+    votable.resources.append(resource)
+    table = TableElement(votable)
+    resource.tables.append(table)
+    table.fields.extend([
+        Field(votable, name="obs_collection", datatype="char", arraysize="*"),
+        Field(votable, name="obs_publisher_did", datatype="char", arraysize="*"),
+        Field(votable, name="dataproduct_type", datatype="char", arraysize="8"),
+        Field(votable, name="calib_level", datatype="short"),
+        Field(votable, name="s_ra", datatype="double", unit="deg"),
+        Field(votable, name="s_dec", datatype="double", unit="deg"),
+        Field(votable, name="t_exptime", datatype="float", unit="s"),
+        Field(votable, name="em_min", datatype="double", unit="m"),
+        Field(votable, name="access_estsize", datatype="long", unit="kbyte"),
+    ])
+    table.create_arrays(nrows)
+    array = table.array
+    array["obs_collection"] = rng.choice(["SURVEY-A", "SURVEY-B", "ARCHIVE"], nrows)
+    array["obs_publisher_did"] = [f"ivo://org.example/obs?{index}" for index in range(nrows)]
+    array["dataproduct_type"] = rng.choice(["image", "cube", "spectrum"], nrows)
+    array["calib_level"] = rng.integers(0, 4, nrows)
+    array["s_ra"] = rng.uniform(0, 360, nrows)
+    array["s_dec"] = rng.uniform(-90, 90, nrows)
+    array["t_exptime"] = rng.uniform(0, 3600, nrows)
+    array["em_min"] = rng.uniform(3e-7, 1e-6, nrows)
+    array.mask["em_min"] = rng.random(nrows) < 0.1
+    array["access_estsize"] = rng.integers(0, 10**7, nrows)
+    table.format = format
+
+    out = BytesIO()
+    votable.to_xml(out)
+    return out.getvalue()
+
+
+def main(nrows=100000, repeat=3):
+    print(f"{nrows} rows; best of {repeat} runs")
+    for format in ("tabledata", "binary2"):
+        content = make_votable(nrows, format)
+        times = {}
+        for name, parse in (
+                ("astropy", astropy_parse),
+                ("pyvo", pyvo_parse),
+                ("pyvo, 3 columns", partial(pyvo_parse, columns=["obs_publisher_did", "s_ra", "s_dec"]))):
+            times[name] = min(timeit.repeat(
+                lambda: parse(BytesIO(content)), number=1, repeat=repeat))
+        print(f"{format:>10}: " + ", ".join(
+            f"{name} {time:.3f} s ({times['astropy'] / time:.1f}x)" for name, time in times.items()))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
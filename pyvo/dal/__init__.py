@@ -6,14 +6,16 @@ from .sla import search as linesearch
 from .scs import search as conesearch
 from .tap import search as tablesearch
 
-from .query import DALService, DALQuery, DALResults, Record
+from .query import DALService, DALQuery, DALResults, Record, MAX_GET_URL_LENGTH, DatasetDownload
 
 from .sia import SIAService, SIAQuery, SIAResults, SIARecord
 from .sia2 import SIA2Service, SIA2Query, SIA2Results, ObsCoreRecord
 from .ssa import SSAService, SSAQuery, SSAResults, SSARecord
 from .sla import SLAService, SLAQuery, SLAResults, SLARecord
 from .scs import SCSService, SCSQuery, SCSResults, SCSRecord
-from .tap import TAPService, TAPQuery, TAPResults, AsyncTAPJob, DEFAULT_JOB_POLL_TIMEOUT, DEFAULT_JOB_WAIT_TIMEOUT
+from .tap import (
+    TAPService, TAPQuery, TAPResults, AsyncTAPJob, TAPPipeline,
+    DEFAULT_JOB_POLL_TIMEOUT, DEFAULT_JOB_WAIT_TIMEOUT)
 from .adhoc import DATALINK_BATCH_CALL_SIZE
 
 
@@ -30,8 +32,8 @@ __all__ = [
     "SIAResults", "SIA2Results", "SSAResults", "SLAResults", "SCSResults", "TAPResults",
     "Record", "ObsCoreRecord",
     "SIARecord", "SSARecord", "SLARecord", "SCSRecord",
-    "AsyncTAPJob",
+    "AsyncTAPJob", "TAPPipeline",
     "DALAccessError", "DALProtocolError", "DALFormatError", "DALServiceError",
     "DALQueryError", "DALOverflowWarning", "DALRateLimitError",
     "DEFAULT_JOB_POLL_TIMEOUT", "DEFAULT_JOB_WAIT_TIMEOUT",
-    "DATALINK_BATCH_CALL_SIZE"]
+    "DATALINK_BATCH_CALL_SIZE", "MAX_GET_URL_LENGTH", "DatasetDownload"]
@@ -2,16 +2,25 @@
 """
 Datalink classes and mixins
 """
+import collections
+import hashlib
 import numpy as np
+import os
+import tempfile
+import threading
+import time
 import warnings
 import copy
 import requests
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-from .query import DALResults, DALQuery, DALService, Record
+from .query import DALResults, DALQuery, DALService, Record, MAX_GET_URL_LENGTH
 from .exceptions import DALServiceError
 from .vosi import AvailabilityMixin, CapabilityMixin
 from .params import find_param_by_keyword, get_converter
+from .mimetype import mime2extension
 
+from astropy.io.votable import parse as votableparse
 from astropy.io.votable.tree import Param
 from astropy import units as u
 from astropy.units import Quantity, Unit
@@ -24,13 +33,16 @@ except ImportError:
     from astropy.io.votable.tree import Table as TableElement
 from astropy.utils.collections import HomogeneousList
 
+from ..utils.concurrency import DEFAULT_MAX_WORKERS, ordered_map
 from ..utils.decorators import stream_decode_content
+from ..utils.http import use_session
 from ..utils import vocabularies
 from .params import PosQueryParam, IntervalQueryParam, TimeQueryParam, EnumQueryParam
 from ..dam.obscore import POLARIZATION_STATES
 
 # calls to DataLink from the results pages are batched for performance
-# reasons. This is the size of a batch
+# reasons. This is the size of the first batch; later batches adapt to
+# the service's response times (see _DatalinkBatchSizer)
 DATALINK_BATCH_CALL_SIZE = 50
 
 SODA_SYNC_IVOID = 'ivo://ivoa.net/std/SODA#sync-1'
@@ -83,10 +95,23 @@ if not hasattr(Resource, 'groups'):
 __all__ = [
     "AdhocServiceResultsMixin", "DatalinkResultsMixin", "DatalinkRecordMixin",
     "DatalinkService", "DatalinkQuery", "DatalinkResults", "DatalinkRecord",
-    "SodaRecordMixin", "SodaQuery",
+    "SodaRecordMixin", "SodaQuery", "SodaCutout", "DatalinkCache",
+    "enable_datalink_cache", "disable_datalink_cache", "get_datalink_cache",
     "DATALINK_BATCH_CALL_SIZE"]
 
 
+SodaCutout = collections.namedtuple(
+    "SodaCutout", ["original_row", "filename", "error"])
+SodaCutout.__doc__ = """
+An entry of the manifest returned by
+`~pyvo.dal.adhoc.DatalinkResultsMixin.cutout_all`.
+
+``original_row`` is the record the cutout was made for, ``filename`` the
+file it was written to.  If the cutout could not be retrieved,
+``filename`` is None and ``error`` is the exception describing why.
+"""
+
+
 def _get_input_params_from_resource(resource):
     # get the group with name inputParams
     group_input_params = next(
@@ -106,6 +131,199 @@ def _get_accessurl_from_params(params):
     return params["accessURL"].value
 
 
+def _run_starts(values):
+    """
+    returns the indices at which runs of equal values start in the
+    1-d array values.
+    """
+    return np.concatenate(([0], np.flatnonzero(values[1:] != values[:-1]) + 1))
+
+
+class _DatalinkBatchSizer:
+    """
+    Adapts the number of IDs sent per datalink batch call.
+
+    The size starts at ``DATALINK_BATCH_CALL_SIZE`` and moves towards what
+    would make a call take about ``target_duration`` seconds and return
+    about ``target_rows`` links, growing at most by a factor of two per
+    response.  Services answering only part of a batch reveal their
+    limit, which then caps the size.
+    """
+    max_size = 1000
+    target_duration = 5.
+    target_rows = 20000
+
+    def __init__(self, size=None):
+        self.size = size or DATALINK_BATCH_CALL_SIZE
+        self._service_limit = None
+
+    def update(self, *, requested, answered, elapsed, nrows):
+        """
+        take into account a response answering ``answered`` out of
+        ``requested`` IDs with ``nrows`` links in ``elapsed`` seconds.
+        """
+        if answered < requested:
+            self._service_limit = min(answered, self._service_limit or answered)
+
+        ideal = self.max_size
+        if elapsed > 0:
+            ideal = min(ideal, self.target_duration * answered / elapsed)
+        if nrows > 0:
+            ideal = min(ideal, self.target_rows * answered / nrows)
+
+        size = min(int(ideal), 2 * self.size)
+        if self._service_limit:
+            size = min(size, self._service_limit)
+        self.size = max(size, 1)
+
+
+class DatalinkCache:
+    """
+    A bounded cache of parsed datalink documents.
+
+    Documents are kept in memory up to ``maxsize`` entries, evicting the
+    least recently used ones first.  If ``directory`` is given, documents
+    are also written there as VOTable files and read back from there
+    when they are not in memory, so the cache survives the process.
+
+    Keys are built using `url_key` for documents retrieved from a URL
+    and `query_key` for documents retrieved from a datalink service
+    with a set of parameters (in particular, an ID).
+
+    The cache is safe to use from several threads.
+    """
+    def __init__(self, maxsize=1000, *, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def url_key(url):
+        """
+        returns the cache key for the datalink document at url.
+        """
+        return ("url", url)
+
+    @staticmethod
+    def query_key(service_url, params):
+        """
+        returns the cache key for the datalink document returned by the
+        service at service_url for the mapping of parameters params.
+        """
+        return ("query", service_url, tuple(sorted(
+            (str(name).upper(), str(value)) for name, value in params.items())))
+
+    def _path(self, key):
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + ".xml")
+
+    def get(self, key):
+        """
+        returns the VOTableFile cached for key, or None if there is none.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        if self.directory is None:
+            return None
+        try:
+            votable = votableparse(self._path(key))
+        except Exception:
+            # missing or unreadable files are just misses
+            return None
+        self._remember(key, votable)
+        return votable
+
+    def put(self, key, votable):
+        """
+        caches the VOTableFile votable under key.
+        """
+        self._remember(key, votable)
+
+        if self.directory is None:
+            return
+        try:
+            fd, tmpname = tempfile.mkstemp(suffix=".xml", dir=self.directory)
+            with os.fdopen(fd, "wb") as f:
+                votable.to_xml(f)
+            os.replace(tmpname, self._path(key))
+        except Exception as ex:
+            warnings.warn(f"Could not write datalink cache entry: {ex}")
+
+    def _remember(self, key, votable):
+        with self._lock:
+            self._entries[key] = votable
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        drops all cached documents, including those on disk.
+        """
+        with self._lock:
+            self._entries.clear()
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith(".xml"):
+                    os.remove(os.path.join(self.directory, name))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._entries:
+                return True
+        return self.directory is not None and os.path.exists(self._path(key))
+
+
+_datalink_cache = None
+
+
+def enable_datalink_cache(maxsize=1000, *, directory=None):
+    """
+    makes datalink retrieval consult a `DatalinkCache` before going to
+    the network.
+
+    Parameters
+    ----------
+    maxsize : int
+        the maximum number of documents kept in memory.
+    directory : str, optional
+        a directory to persist the documents in.
+
+    Returns
+    -------
+    DatalinkCache
+        the cache now in use.
+    """
+    global _datalink_cache
+    _datalink_cache = DatalinkCache(maxsize, directory=directory)
+    return _datalink_cache
+
+
+def disable_datalink_cache():
+    """
+    stops caching datalink documents and drops the in-memory cache.
+    """
+    global _datalink_cache
+    _datalink_cache = None
+
+
+def get_datalink_cache():
+    """
+    returns the `DatalinkCache` in use, or None if caching is disabled.
+    """
+    return _datalink_cache
+
+
 class AdhocServiceResultsMixin:
     """
     Mixin for adhoc:service functionality for results classes.
@@ -168,35 +386,58 @@ class AdhocServiceResultsMixin:
         raise DALServiceError(
             f"No Adhoc Service with service_def id {id_}!")
 
+    def _get_soda_sync_service(self):
+        """
+        returns the SODA sync service descriptor of these results, or None
+        if there is none.  The lookup is only done once.
+        """
+        if not hasattr(self, '_soda_sync_service'):
+            try:
+                self._soda_sync_service = self.get_adhocservice_by_ivoid(
+                    SODA_SYNC_IVOID)
+            except DALServiceError:
+                self._soda_sync_service = None
+        return self._soda_sync_service
+
 
 class DatalinkResultsMixin(AdhocServiceResultsMixin):
     """
     Mixin for datalink functionality for results classes.
     """
-    def _iter_datalinks_from_dlblock(self, preserve_order=False):
+    def _iter_datalinks_from_dlblock(
+            self, preserve_order=False, max_workers=DEFAULT_MAX_WORKERS):
         """yields datalinks from the current rows using a datalink
         service RESOURCE.
 
+        The IDs are sent to the service in batches, with up to
+        ``max_workers`` batches in flight at the same time.  The batch size
+        adapts to the observed latency and response size (see
+        `_DatalinkBatchSizer`); IDs the service did not answer are sent
+        again in a later batch.
+
         Parameters
         ----------
 
         preserve_order : bool
             True to return the datalinks keeping the order of the current rows.
-            NOTE: There might be a performance penalty for keeping the order as
-            one request per row is sent to the service. When the order of the
-            datalinks is not important, the execution is optimized to query the
-            service in batches.
-
-        """
-        def _get_results_tb(rows, dl_batch_tb):
-            # Creates a new DL result table with the given rows as the results data
-            # and the dl_batch_tb as the template for both table fields and other resources
+            The batches are then reordered on the client: all datalinks
+            received for rows after the next one to yield are buffered,
+            and those of IDs occurring in several rows until their last
+            row.  If the datalinks of an early row arrive late, e.g.,
+            because the service left its ID out of a batch, this can be
+            almost all of them.
+        max_workers : int
+            the maximum number of batch requests in flight.
+
+        """
+        def _get_results_tb(array, dl_batch_tb):
+            # Creates a new DL result table with array (a view into the batch
+            # results) as the results data and the dl_batch_tb as the template
+            # for both table fields and other resources
             tb = VOTableFile()
             new_table = TableElement(tb)
             new_table.fields.extend(dl_batch_tb.get_first_table().fields)
-            new_table.create_arrays(len(rows))
-            for index, row in enumerate(rows):
-                new_table.array[index] = row
+            new_table.array = array
             results_resource = Resource()
             results_resource.type = "results"
             results_resource.tables.append(new_table)
@@ -207,90 +448,157 @@ class DatalinkResultsMixin(AdhocServiceResultsMixin):
                     tb.resources.append(resource)
             return tb
 
-        if preserve_order:
-            # one request at the time to preserve order
-            for row in self:
-                self.query = DatalinkQuery.from_resource(
-                    row, self._datalink, session=self._session, original_row=None)
-                yield DatalinkResults(
-                    self.query.execute(post=True).votable,
-                    original_row=row)
-            return
+        def _split_batch(current_batch):
+            # returns a dict of ID -> VOTableFile with only the links for that ID
+            array = current_batch.votable.get_first_table().array
+            if len(array) == 0:
+                return {}
+
+            # Datalink spec: ID is the first column
+            ids = array.data[array.dtype.names[0]]
+            starts = _run_starts(ids)
+            # Datalink spec: "... all links for a single ID value must be served in
+            # consecutive rows in the output"
+            # Accordingly, the sort below should not be necessary but in
+            # practice it might be needed
+            if len(set(ids[starts].tolist())) != len(starts):
+                order = np.argsort(ids, kind="stable")
+                array, ids = array[order], ids[order]
+                starts = _run_starts(ids)
+
+            stops = np.append(starts[1:], len(ids))
+            return {
+                ids[start]: _get_results_tb(array[start:stop], current_batch.votable)
+                for start, stop in zip(starts, stops)}
 
         # results from batch calls are not guaranteed to be in the same order with
         # the results rows. To map the links back to the original result rows,
-        # create a dictionary of IDs to result rows, where ID is the value of
+        # create a dictionary of IDs to result row indices, where ID is the value of
         # the column given by the ref field of the service descriptor (input parameter)
         original_rows = {}
-        input_params = _get_input_params_from_resource(self._datalink)
-        for name, input_param in input_params.items():
-            if input_param.ref:
-                for row in self:
-                    original_rows[row[input_param.ref]] = row
-
+        # the values of the input parameters referencing columns, by row
+        ref_values = {}
         self.query = DatalinkQuery.from_resource(
-            [_ for _ in self],
+            [],
             self._datalink,
             session=self._session,
             original_row=None)
-        remaining_ids = self.query['ID']
-        if not remaining_ids:
+        input_params = _get_input_params_from_resource(self._datalink)
+        for name, input_param in input_params.items():
+            if input_param.ref:
+                values = np.ma.getdata(self.getcolumn(input_param.ref)).tolist()
+                self.query[name.upper()] = values
+                ref_values[name.upper()] = values
+                original_rows.update(
+                    (value, index) for index, value in enumerate(values))
+
+        def original_row(id_):
+            index = original_rows.get(id_, None)
+            return None if index is None else self.getrecord(index)
+
+        row_ids = self.query.get('ID')
+        if not row_ids:
             # we are done before starting
             return
+        # for preserve_order: the last row each ID is needed for
+        last_rows = {id_: index for index, id_ in enumerate(row_ids)}
+        max_workers = max(max_workers or 1, 1)
 
-        current_batch = self.query.execute(post=True)
-        if len(current_batch) == 0:
-            raise DALServiceError(
-                'Could not retrieve datalinks for: {}'.format(
-                    ', '.join([_ for _ in remaining_ids])))
-        batch_size = 0  # unknown yet
-        batch_size_determined = False  # apparent only after first returned batch
-        while remaining_ids:
-            start_remaining_ids = len(remaining_ids)
-            res_votable = current_batch.votable.get_first_table()
-
-            id_index = 0  # Datalink spec: ID is the first column
-            # Datalink spec: "... all links for a single ID value must be served in
-            # consecutive rows in the output"
-            # Accordingly, the line below should not be necessary but in
-            # practice it might be needed
-            np.ma.MaskedArray.sort(res_votable.array, id_index)
-            last_id = res_votable.array[id_index][0]
-            rows = []
-            for index, row in enumerate(res_votable.array):
-                if row[id_index] == last_id:
-                    rows.append(row)
-                else:
-                    yield DatalinkResults(_get_results_tb(rows, current_batch.votable),
-                                          original_row=original_rows.get(last_id, None))
-                    if not batch_size_determined:
-                        batch_size += 1
-                    if last_id in remaining_ids:
-                        remaining_ids.remove(last_id)
-                    # proceed to the next ID
-                    last_id = row[id_index]
-                    rows = [row]
-
-            if last_id in remaining_ids:
-                remaining_ids.remove(last_id)
-            if not batch_size_determined:
-                batch_size += 1
-                batch_size_determined = True
-            yield DatalinkResults(_get_results_tb(rows, current_batch.votable),
-                                  original_row=original_rows.get(last_id, None))
-            if not remaining_ids:
-                return  # we are done
-            if len(remaining_ids) == start_remaining_ids:
-                # no progress
-                raise DALServiceError(
-                    'Could not retrieve datalinks for: {}'.format(
-                        ', '.join([_ for _ in remaining_ids])))
-            self.query['ID'] = remaining_ids[:batch_size]
-            current_batch = self.query.execute(post=True)
-            if not current_batch:
-                raise DALServiceError(
-                    'Could not retrieve datalinks for: {}'.format(
-                        ', '.join([_ for _ in remaining_ids])))
+        # for preserve_order: the datalinks received but not yet yielded
+        received = {}
+        next_row = 0
+
+        def emit(id_, votable):
+            if preserve_order:
+                received[id_] = votable
+            else:
+                yield DatalinkResults(votable, original_row=original_row(id_))
+
+        def emit_ordered():
+            nonlocal next_row
+            while next_row < len(row_ids) and row_ids[next_row] in received:
+                id_ = row_ids[next_row]
+                yield DatalinkResults(
+                    received[id_], original_row=self.getrecord(next_row))
+                if last_rows[id_] == next_row:
+                    del received[id_]
+                next_row += 1
+
+        cache = get_datalink_cache()
+        first_rows = {}
+        for index, id_ in enumerate(row_ids):
+            first_rows.setdefault(id_, index)
+        fixed_params = {
+            key: value for key, value in self.query.items() if key.upper() not in ref_values}
+
+        def cache_key(id_):
+            # the parameters getdatalink sends for the (first) row of id_
+            row = first_rows[id_]
+            params = dict(fixed_params)
+            params.update((name, values[row]) for name, values in ref_values.items())
+            return cache.query_key(self.query.baseurl, params)
+
+        # a dict keeps the row order and drops duplicate IDs
+        pending_ids = collections.deque()
+        for id_ in dict.fromkeys(row_ids):
+            votable = None
+            if cache is not None:
+                votable = cache.get(cache_key(id_))
+            if votable is None:
+                pending_ids.append(id_)
+            else:
+                yield from emit(id_, votable)
+        yield from emit_ordered()
+
+        def fetch(batch_ids):
+            batch_query = copy.copy(self.query)
+            batch_query['ID'] = batch_ids
+            started = time.monotonic()
+            batch = batch_query.execute(post=True)
+            return batch, time.monotonic() - started
+
+        sizer = _DatalinkBatchSizer()
+        in_flight = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                while pending_ids or in_flight:
+                    while pending_ids and len(in_flight) < max_workers:
+                        batch_ids = [
+                            pending_ids.popleft()
+                            for _ in range(min(sizer.size, len(pending_ids)))]
+                        in_flight[executor.submit(fetch, batch_ids)] = batch_ids
+
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        batch_ids = in_flight.pop(future)
+                        current_batch, elapsed = future.result()
+
+                        groups = _split_batch(current_batch)
+                        answered = [id_ for id_ in batch_ids if id_ in groups]
+                        if not answered:
+                            # no progress
+                            raise DALServiceError(
+                                'Could not retrieve datalinks for: {}'.format(
+                                    ', '.join([_ for _ in batch_ids])))
+                        sizer.update(
+                            requested=len(batch_ids), answered=len(answered),
+                            elapsed=elapsed,
+                            nrows=len(current_batch.votable.get_first_table().array))
+
+                        # send what the service left out again, first
+                        pending_ids.extendleft(reversed(
+                            [id_ for id_ in batch_ids if id_ not in groups]))
+
+                        for id_ in answered:
+                            if cache is not None:
+                                cache.put(cache_key(id_), groups[id_])
+                            yield from emit(id_, groups[id_])
+
+                    yield from emit_ordered()
+            finally:
+                for future in in_flight:
+                    future.cancel()
 
     @staticmethod
     def _guess_access_format(row):
@@ -368,7 +676,7 @@ class DatalinkResultsMixin(AdhocServiceResultsMixin):
                         access_url,
                         original_row=row)
 
-    def iter_datalinks(self, preserve_order=False):
+    def iter_datalinks(self, preserve_order=False, max_workers=DEFAULT_MAX_WORKERS):
         """
         Iterates over all datalinks in a DALResult.
 
@@ -377,10 +685,13 @@ class DatalinkResultsMixin(AdhocServiceResultsMixin):
 
         preserve_order : bool
             True to return the datalinks keeping the order of the current rows.
-            NOTE: There might be a performance penalty for keeping the order as
-            one request per row is sent to the service. When the order of the
-            datalinks is not important, the execution is optimized to query the
-            service in batches.
+            The service is still queried in batches; the datalinks are
+            reordered on the client, which may delay the first datalinks
+            somewhat.  Datalinks received ahead of the next row to yield
+            are kept in memory until it is yielded.
+        max_workers : int
+            the maximum number of datalink batch requests in flight at
+            the same time.
 
         """
 
@@ -395,7 +706,85 @@ class DatalinkResultsMixin(AdhocServiceResultsMixin):
 
         else:
             yield from self._iter_datalinks_from_dlblock(
-                preserve_order=preserve_order)
+                preserve_order=preserve_order, max_workers=max_workers)
+
+    def cutout_all(
+            self, *, circle=None, range=None, polygon=None, band=None,
+            dir=".", max_workers=DEFAULT_MAX_WORKERS, **kwargs):
+        """
+        Retrieves SODA cutouts of the datasets of all rows and writes them
+        into files in ``dir``.
+
+        The SODA service descriptor of the results is looked up once; for
+        rows pointing to datalink documents instead, the descriptor of
+        each document is used.  Up to ``max_workers`` cutouts are
+        downloaded at the same time, and each is streamed to disk.
+
+        Rows for which no cutout could be retrieved do not stop the
+        operation; the reason is given in the corresponding manifest entry.
+
+        Parameters
+        ----------
+        circle : `astropy.units.Quantity`
+            latitude, longitude and radius
+        range : `astropy.units.Quantity`
+            two longitude + two latitude values describing a rectangle
+        polygon : `astropy.units.Quantity`
+            multiple (at least three) pairs of longitude and latitude points
+        band : `astropy.units.Quantity`
+            two bandwidth or frequency values
+        dir : str
+            the directory to write the cutouts to.  It is created if it
+            does not exist.
+        max_workers : int
+            the maximum number of cutouts retrieved at the same time.
+        **kwargs
+            further parameters for the SODA service.
+
+        Returns
+        -------
+        list of `SodaCutout`
+            a manifest with one entry per row, in row order.
+        """
+        os.makedirs(dir, exist_ok=True)
+        soda_service = self._get_soda_sync_service()
+
+        def cutout(item):
+            index, record = item
+            filename = None
+            try:
+                soda_resource = soda_service or record._get_soda_resource()
+                if soda_resource is None:
+                    raise DALServiceError("No SODA service for this row")
+
+                query = SodaQuery.from_resource(
+                    record, soda_resource, circle=circle, range=range,
+                    polygon=polygon, band=band, session=self._session, **kwargs)
+                response = query.submit()
+                try:
+                    response.raise_for_status()
+                except requests.RequestException as ex:
+                    raise DALServiceError.from_except(ex, query.queryurl)
+
+                ext = mime2extension(response.headers.get("Content-Type"), "dat")
+                base = record.suggest_dataset_basename().replace(
+                    "/", "_").replace("\\", "_")
+                filename = os.path.join(dir, f"{base}-{index}.{ext}")
+                try:
+                    with open(filename, "wb") as out:
+                        for chunk in response.iter_content(524288):
+                            out.write(chunk)
+                finally:
+                    response.close()
+                return SodaCutout(record, filename, None)
+
+            except (DALServiceError, OSError) as ex:
+                if filename is not None and os.path.exists(filename):
+                    os.remove(filename)
+                return SodaCutout(record, None, ex)
+
+        return list(ordered_map(
+            cutout, enumerate(self), max_workers=max_workers))
 
 
 class DatalinkRecordMixin:
@@ -423,7 +812,19 @@ class DatalinkRecordMixin:
             datalink = self._results.get_adhocservice_by_ivoid(DATALINK_IVOID)
 
             query = DatalinkQuery.from_resource(self, datalink, session=self._session)
-            return query.execute()
+            cache = get_datalink_cache()
+            if cache is None:
+                return query.execute()
+
+            key = cache.query_key(query.baseurl, query)
+            votable = cache.get(key)
+            if votable is not None:
+                return DatalinkResults(
+                    votable, url=query.queryurl, session=self._session)
+            # only cache documents that made it into results
+            results = query.execute()
+            cache.put(key, results.votable)
+            return results
         except DALServiceError as error:
             datalink = self._results._guess_datalink(self, session=self._session)
             if datalink is not None:
@@ -433,7 +834,7 @@ class DatalinkRecordMixin:
                 raise DALServiceError("No datalink found for record.") from error
 
     @stream_decode_content
-    def getdataset(self, timeout=None):
+    def _fetch_dataset(self, timeout=None):
         try:
             url = next(self.getdatalink().bysemantics('#this')).access_url
             response = self._session.get(url, stream=True, timeout=timeout)
@@ -443,8 +844,8 @@ class DatalinkRecordMixin:
                 raise DALServiceError.from_except(ex, url)
             return response.raw
         except (DALServiceError, ValueError, StopIteration):
-            # this should go to Record.getdataset()
-            return super().getdataset(timeout=timeout)
+            # this should go to Record._fetch_dataset()
+            return super()._fetch_dataset(timeout=timeout)
 
 
 class DatalinkService(DALService, AvailabilityMixin, CapabilityMixin):
@@ -534,7 +935,13 @@ class DatalinkQuery(DALQuery):
     The typical function for submitting the query is ``execute()``; however,
     alternate execute functions provide the response in different forms,
     allowing the caller to take greater control of the result processing.
+
+    Queries too long for a GET request are sent by POST; use
+    :py:meth:`~pyvo.dal.DALQuery.split` to break up queries with long
+    multi-valued parameters instead.
     """
+    max_get_url_length = MAX_GET_URL_LENGTH
+
     @classmethod
     def from_resource(cls, rows, resource, *, session=None, **kwargs):
         """
@@ -693,6 +1100,11 @@ class DatalinkResults(DatalinkResultsMixin, DALResults):
         self.original_row = kwargs.pop("original_row", None)
         super().__init__(*args, **kwargs)
 
+    def _pickle_state(self):
+        kwargs, state = super()._pickle_state()
+        kwargs["original_row"] = self.original_row
+        return kwargs, state
+
     def getrecord(self, index):
         """
         return a representation of a datalink result record that follows
@@ -792,10 +1204,8 @@ class DatalinkResults(DatalinkResultsMixin, DALResults):
         for index, field in enumerate(votable.fields):
             if field.name == 'ID':
                 id_index = index
-        rows = [x for x in votable.array if x[id_index] == id]
-        votable.create_arrays(len(rows))
-        for index, row in enumerate(rows):
-            votable.array[index] = row
+        ids = votable.array.data[votable.array.dtype.names[id_index]]
+        votable.array = votable.array[ids == id]
         # now remove unreferenced services from resources
         referenced_serviced = [x for x in votable.array['service_def'] if x]
         # remove customized that are not referenced by the current results
@@ -836,8 +1246,21 @@ class DatalinkResults(DatalinkResultsMixin, DALResults):
 
     @classmethod
     def from_result_url(cls, result_url, *, session=None, original_row=None):
+        cache = get_datalink_cache()
+        if cache is None:
+            res = super().from_result_url(result_url, session=session)
+            res.original_row = original_row
+            return res
+
+        key = cache.url_key(result_url)
+        votable = cache.get(key)
+        if votable is not None:
+            return cls(
+                votable, url=result_url, session=use_session(session),
+                original_row=original_row)
         res = super().from_result_url(result_url, session=session)
         res.original_row = original_row
+        cache.put(key, res.votable)
         return res
 
 
@@ -849,10 +1272,9 @@ class SodaRecordMixin:
     """
 
     def _get_soda_resource(self):
-        try:
-            return self._results.get_adhocservice_by_ivoid(SODA_SYNC_IVOID)
-        except DALServiceError:
-            pass
+        soda_resource = self._results._get_soda_sync_service()
+        if soda_resource is not None:
+            return soda_resource
 
         dataformat = self.getdataformat()
         if dataformat is None:
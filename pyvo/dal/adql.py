@@ -0,0 +1,407 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Client-side handling of ADQL queries.
+
+This is not a full ADQL parser.  It splits queries into tokens and finds
+the clauses of the outermost SELECT, which is enough to amend queries
+with further conditions.  `parse_select` parses the small subset of ADQL
+that pyvo can evaluate locally.
+"""
+import collections
+import re
+
+import numpy as np
+
+__all__ = ["tokenize", "add_condition", "make_literal", "parse_select"]
+
+Token = collections.namedtuple("Token", ["kind", "text", "start", "end"])
+Token.__doc__ = """
+A token of an ADQL query as returned by `tokenize`.
+
+``kind`` is one of ``"string"``, ``"identifier"`` (delimited
+identifiers in double quotes), ``"number"``, ``"word"`` (keywords and
+regular identifiers) and ``"operator"``; ``start`` and ``end`` give the
+position of ``text`` in the query.
+"""
+
+_TOKEN = re.compile(r"""
+    (?P<space>\s+|--[^\n]*)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<identifier>"(?:[^"]|"")*")
+  | (?P<number>(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][+-]?[0-9]+)?)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<operator><>|!=|<=|>=|\|\||[-+*/%<>=(),.;])
+""", re.X)
+
+# keywords ending the WHERE clause of a query
+_AFTER_WHERE = {"GROUP", "HAVING", "ORDER", "OFFSET"}
+_SET_OPERATIONS = {"UNION", "INTERSECT", "EXCEPT"}
+
+Select = collections.namedtuple("Select", ["top", "columns", "table", "where", "order_by"])
+Select.__doc__ = """
+A query in the ADQL subset understood by `parse_select`.
+
+``top`` is the row limit or None; ``columns`` is a tuple of column
+nodes, or None for ``*``; ``table`` is a tuple of the parts of the table
+name; ``where`` is the condition node or None; ``order_by`` is a tuple
+of pairs of a column node and a flag that is True for descending order.
+
+Nodes are tuples starting with their kind:
+
+* ``("column", name, delimited)``: regular identifiers are lower-cased,
+  delimited identifiers are kept as given;
+* ``("literal", value)``: a python number or string;
+* ``("compare", operator, left, right)``: the operator is one of
+  ``=``, ``<>``, ``<``, ``<=``, ``>``, ``>=``; literals are always on
+  the right;
+* ``("in", operand, values, negated)``: values is a tuple of python
+  numbers or strings;
+* ``("null", operand, negated)``: the ``IS [NOT] NULL`` test;
+* ``("and", nodes)``, ``("or", nodes)`` and ``("not", node)``.
+
+``BETWEEN`` is turned into a pair of comparisons.
+"""
+
+# operators of comparisons with their operands swapped
+_SWAPPED = {"=": "=", "<>": "<>", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+# keywords that cannot be table aliases in the subset
+_NOT_ALIASES = {"WHERE", "ORDER", "GROUP", "HAVING", "OFFSET", "JOIN", "NATURAL",
+                "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "ON", "USING"} | _SET_OPERATIONS
+
+
+def tokenize(query):
+    """
+    returns the tokens of the ADQL query as a list of `Token`.
+
+    White space and comments are dropped.
+
+    Raises
+    ------
+    ValueError
+        if the query contains characters not allowed outside of strings
+        or an unterminated string.
+    """
+    tokens, pos = [], 0
+    while pos < len(query):
+        match = _TOKEN.match(query, pos)
+        if match is None:
+            raise ValueError(f"Cannot parse ADQL at position {pos}: {query[pos:pos + 20]!r}")
+        if match.lastgroup != "space":
+            tokens.append(Token(match.lastgroup, match.group(), match.start(), match.end()))
+        pos = match.end()
+    return tokens
+
+
+def _top_level(tokens):
+    """
+    returns the tokens of tokens not within parentheses.
+    """
+    depth, top_level = 0, []
+    for token in tokens:
+        if token.text == "(":
+            depth += 1
+        elif token.text == ")":
+            depth -= 1
+        elif depth == 0:
+            top_level.append(token)
+    if depth != 0:
+        raise ValueError("Unbalanced parentheses in ADQL query")
+    return top_level
+
+
+def add_condition(query, condition):
+    """
+    returns the ADQL query with condition added to the WHERE clause of
+    its outermost SELECT.
+
+    Conditions already there are kept, so the result selects the rows of
+    query for which condition holds.
+
+    Parameters
+    ----------
+    query : str
+        an ADQL query.
+    condition : str
+        an ADQL condition, e.g., ``"mag < 10"``.
+
+    Returns
+    -------
+    str
+        the amended query.
+
+    Raises
+    ------
+    ValueError
+        if query cannot be amended, e.g., because it is not a SELECT
+        statement or combines several with UNION.
+    """
+    tokens = _top_level(tokenize(query))
+    words = [token for token in tokens if token.kind == "word"]
+    if not words or words[0].text.upper() != "SELECT":
+        raise ValueError("Only SELECT statements can be amended")
+    if any(word.text.upper() in _SET_OPERATIONS for word in words):
+        raise ValueError("Cannot add conditions to queries combining several SELECTs")
+
+    end = len(query.rstrip())
+    if tokens[-1].text == ";":
+        end = tokens[-1].start
+    where = None
+    for word in words:
+        keyword = word.text.upper()
+        if keyword == "WHERE":
+            where = word
+        elif keyword in _AFTER_WHERE:
+            end = word.start
+            break
+
+    tail = query[end:].strip()
+    if where is None:
+        amended = f"{query[:end].rstrip()} WHERE {condition}"
+    else:
+        amended = (f"{query[:where.end]} ({query[where.end:end].strip()})"
+                   f" AND ({condition})")
+    return f"{amended} {tail}" if tail else amended
+
+
+def make_literal(value):
+    """
+    returns an ADQL literal for a python (or numpy) number or string.
+    """
+    if isinstance(value, bytes):
+        value = value.decode("utf-8")
+    if isinstance(value, str):
+        return "'{}'".format(value.replace("'", "''"))
+    if isinstance(value, (bool, np.bool_)):
+        raise ValueError("ADQL has no boolean literals")
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    if isinstance(value, (float, np.floating)) and np.isfinite(value):
+        return repr(float(value))
+    raise ValueError(f"Cannot make an ADQL literal from {value!r}")
+
+
+def parse_select(query):
+    """
+    parses a query in the subset of ADQL that pyvo can evaluate locally.
+
+    The subset consists of queries on a single table selecting either
+    ``*`` or plain columns, optionally with ``TOP``, a ``WHERE`` clause
+    made of comparisons, ``BETWEEN``, ``IN`` with literal values,
+    ``IS [NOT] NULL``, ``AND``, ``OR`` and ``NOT``, and an ``ORDER BY``
+    on columns.
+
+    Returns
+    -------
+    Select
+        the parsed query.
+
+    Raises
+    ------
+    ValueError
+        if query is not in the subset, e.g., because it uses functions,
+        arithmetic, joins, ``DISTINCT`` or ``GROUP BY``.
+    """
+    return _Parser(tokenize(query)).parse()
+
+
+class _Parser:
+    """
+    a recursive descent parser for `parse_select`.
+    """
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self, offset=0):
+        if self.pos + offset < len(self.tokens):
+            return self.tokens[self.pos + offset]
+        return None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise ValueError("Unexpected end of ADQL query")
+        self.pos += 1
+        return token
+
+    def at(self, *texts):
+        token = self.peek()
+        return (token is not None and token.kind in ("word", "operator")
+                and token.text.upper() in texts)
+
+    def accept(self, *texts):
+        if self.at(*texts):
+            return self.next()
+        return None
+
+    def expect(self, text):
+        token = self.next()
+        if token.kind not in ("word", "operator") or token.text.upper() != text:
+            raise ValueError(f"Expected {text} but found {token.text!r} in ADQL query")
+        return token
+
+    def parse(self):
+        self.expect("SELECT")
+        top = None
+        if self.accept("TOP"):
+            token = self.next()
+            if token.kind != "number" or not token.text.isdigit():
+                raise ValueError("TOP must be followed by an integer")
+            top = int(token.text)
+
+        columns = None
+        if not self.accept("*"):
+            columns = [self.column()]
+            while self.accept(","):
+                columns.append(self.column())
+            columns = tuple(columns)
+
+        self.expect("FROM")
+        table = self.table()
+
+        where = None
+        if self.accept("WHERE"):
+            where = self.condition()
+
+        order_by = []
+        if self.accept("ORDER"):
+            self.expect("BY")
+            while True:
+                column = self.column()
+                descending = bool(self.accept("DESC"))
+                if not descending:
+                    self.accept("ASC")
+                order_by.append((column, descending))
+                if not self.accept(","):
+                    break
+
+        self.accept(";")
+        if self.peek() is not None:
+            raise ValueError(f"Unsupported ADQL at {self.peek().text!r}")
+        return Select(top, columns, table, where, tuple(order_by))
+
+    def identifier(self):
+        token = self.next()
+        if token.kind == "identifier":
+            return token.text[1:-1].replace('""', '"'), True
+        if token.kind == "word":
+            return token.text.lower(), False
+        raise ValueError(f"Expected an identifier but found {token.text!r} in ADQL query")
+
+    def column(self):
+        # qualifiers can only name the single table of the query
+        name = self.identifier()
+        while self.accept("."):
+            name = self.identifier()
+        if self.at("("):
+            raise ValueError("Functions are not supported")
+        return ("column",) + name
+
+    def table(self):
+        parts = [self.identifier()]
+        while self.accept("."):
+            parts.append(self.identifier())
+        if self.accept("AS"):
+            self.identifier()
+        elif self.peek() is not None and (
+                self.peek().kind == "identifier"
+                or self.peek().kind == "word"
+                and self.peek().text.upper() not in _NOT_ALIASES):
+            self.identifier()
+        return tuple(parts)
+
+    def condition(self):
+        nodes = [self.conjunction()]
+        while self.accept("OR"):
+            nodes.append(self.conjunction())
+        return nodes[0] if len(nodes) == 1 else ("or", _flatten("or", nodes))
+
+    def conjunction(self):
+        nodes = [self.negation()]
+        while self.accept("AND"):
+            nodes.append(self.negation())
+        return nodes[0] if len(nodes) == 1 else ("and", _flatten("and", nodes))
+
+    def negation(self):
+        if self.accept("NOT"):
+            return ("not", self.negation())
+        if self.at("("):
+            self.next()
+            node = self.condition()
+            self.expect(")")
+            return node
+        return self.predicate()
+
+    def predicate(self):
+        operand = self.operand()
+        if self.accept("IS"):
+            negated = bool(self.accept("NOT"))
+            self.expect("NULL")
+            return ("null", operand, negated)
+
+        negated = bool(self.accept("NOT"))
+        if self.accept("BETWEEN"):
+            low = self.operand()
+            self.expect("AND")
+            high = self.operand()
+            if negated:
+                return ("or", (_compare("<", operand, low), _compare(">", operand, high)))
+            return ("and", (_compare(">=", operand, low), _compare("<=", operand, high)))
+
+        if self.accept("IN"):
+            self.expect("(")
+            values = [self.literal()]
+            while self.accept(","):
+                values.append(self.literal())
+            self.expect(")")
+            return ("in", operand, tuple(values), negated)
+
+        if negated:
+            raise ValueError("NOT must be followed by BETWEEN or IN here")
+        token = self.next()
+        operator = "<>" if token.text == "!=" else token.text
+        if operator not in _SWAPPED:
+            raise ValueError(f"Unsupported operator {token.text!r} in ADQL query")
+        return _compare(operator, operand, self.operand())
+
+    def literal(self):
+        sign = self.accept("-", "+")
+        token = self.next()
+        if token.kind == "number":
+            value = float(token.text) if any(c in token.text for c in ".eE") else int(token.text)
+            return -value if sign and sign.text == "-" else value
+        if token.kind == "string" and sign is None:
+            return token.text[1:-1].replace("''", "'")
+        raise ValueError(f"Expected a literal but found {token.text!r} in ADQL query")
+
+    def operand(self):
+        token = self.peek()
+        if token is not None and (token.kind in ("string", "number") or self.at("-", "+")):
+            node = ("literal", self.literal())
+        else:
+            node = self.column()
+        if self.at("+", "-", "*", "/", "%", "||"):
+            raise ValueError("Expressions are not supported")
+        return node
+
+
+def _compare(operator, left, right):
+    """
+    returns a comparison node with a literal operand on the right.
+    """
+    if left[0] == "literal" and right[0] != "literal":
+        operator, left, right = _SWAPPED[operator], right, left
+    return ("compare", operator, left, right)
+
+
+def _flatten(kind, nodes):
+    """
+    returns the operands of nested nodes of kind (AND or OR) as one tuple.
+    """
+    flat = []
+    for node in nodes:
+        if node[0] == kind:
+            flat.extend(node[1])
+        else:
+            flat.append(node)
+    return tuple(flat)
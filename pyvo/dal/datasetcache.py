@@ -0,0 +1,421 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+A local, content-addressed cache for datasets retrieved through
+``Record.getdataset`` and ``Record.cachedataset``.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+__all__ = ["DatasetCache", "enable_dataset_cache", "disable_dataset_cache",
+           "get_dataset_cache"]
+
+# the Linux ioctl cloning a file (reflink) on filesystems supporting it
+_FICLONE = 0x40049409
+
+
+class DatasetCache:
+    """
+    A cache of datasets in a local directory.
+
+    The datasets are stored under the SHA-256 digest of their content, so
+    that a product reachable under several URLs (or identifiers) is
+    stored only once.  Keys (see `url_key` and `did_key`) map to these
+    files.
+
+    The cache may be shared by several processes; changes to it are made
+    under a lock file in the cache directory.  The sizes of the datasets
+    and when they were last used are kept in an index file next to it,
+    so that the cached files themselves are never modified.  If
+    ``max_size`` is given, the least recently used datasets are removed
+    whenever the cache grows beyond it.
+
+    Parameters
+    ----------
+    directory : str
+        the directory to keep the datasets in.  It is created if it does
+        not exist.
+    max_size : int, optional
+        the maximum size of all cached datasets in bytes.
+    use_did : bool
+        if True, datasets are also looked up by the publisher DID of their
+        records, so that a product is found even if its URL changed.
+    link : bool
+        if True, `copy_to` places cached datasets by hard link or, where
+        the filesystem supports it, as a copy-on-write clone rather than
+        by copying.  Cached files are read-only, and so are hard links to
+        them.
+    """
+    def __init__(self, directory, *, max_size=None, use_did=False, link=True):
+        self.directory = directory
+        self.max_size = max_size
+        self.use_did = use_did
+        self.link = link
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "keys"), exist_ok=True)
+
+    @staticmethod
+    def url_key(url):
+        """
+        returns the cache key for the dataset at url.
+        """
+        return ("url", url)
+
+    @staticmethod
+    def did_key(did):
+        """
+        returns the cache key for the dataset with the publisher DID did.
+        """
+        return ("did", did)
+
+    def keys_for(self, record):
+        """
+        returns the keys the dataset of record is cached under.
+
+        Raises
+        ------
+        KeyError
+            if the record has no dataset access URL.
+        """
+        url = record.getdataurl()
+        if not url:
+            raise KeyError("no dataset access URL recognized in record")
+        keys = [self.url_key(url)]
+        if self.use_did:
+            did = record._get_publisher_did()
+            if did:
+                keys.append(self.did_key(did))
+        return keys
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, "objects", digest[:2], digest)
+
+    def _key_path(self, key):
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, "keys", digest)
+
+    @contextmanager
+    def _locked(self):
+        """
+        holds the lock of the cache directory, shared between threads and
+        processes.
+        """
+        with self._lock, open(os.path.join(self.directory, "lock"), "a+b") as lockfile:
+            if fcntl is not None:
+                fcntl.flock(lockfile, fcntl.LOCK_EX)
+            else:
+                lockfile.seek(0)
+                msvcrt.locking(lockfile.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lockfile, fcntl.LOCK_UN)
+                else:
+                    lockfile.seek(0)
+                    msvcrt.locking(lockfile.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _write_key(self, key, digest):
+        path = self._key_path(key)
+        fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as f:
+            f.write(digest)
+        os.replace(tmpname, path)
+
+    def _read_index(self):
+        """
+        returns the index of the cached datasets, a dict with the
+        ``total`` size of the datasets, a ``clock`` counting their uses,
+        and, under their digests, the ``objects`` as pairs of size and
+        value of the clock when they were last used.  Must be called with
+        the lock held.
+        """
+        try:
+            with open(os.path.join(self.directory, "index.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+
+        # a new cache, or one written by an older version
+        objects = {}
+        for dirpath, _, filenames in os.walk(os.path.join(self.directory, "objects")):
+            if dirpath == os.path.join(self.directory, "objects"):
+                # incomplete downloads
+                continue
+            for name in filenames:
+                stat = os.stat(os.path.join(dirpath, name))
+                objects[name] = [stat.st_size, stat.st_mtime]
+        order = sorted(objects, key=lambda digest: objects[digest][1])
+        for clock, digest in enumerate(order):
+            objects[digest][1] = clock
+        return {"total": sum(size for size, _ in objects.values()),
+                "clock": len(objects), "objects": objects}
+
+    def _write_index(self, index):
+        fd, tmpname = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f)
+        os.replace(tmpname, os.path.join(self.directory, "index.json"))
+
+    @staticmethod
+    def _use(index, digest, size):
+        """
+        marks the dataset with digest as used in index, adding it with
+        size if it is new.
+        """
+        entry = index["objects"].get(digest)
+        if entry is None:
+            entry = index["objects"][digest] = [size, 0]
+            index["total"] += size
+        index["clock"] += 1
+        entry[1] = index["clock"]
+
+    def get_path(self, keys):
+        """
+        returns the path of the file cached for the first of keys known to
+        the cache, or None if none of them is.
+
+        The keys not known yet are made to point to the file, and the file
+        is marked as recently used.
+        """
+        with self._locked():
+            for key in keys:
+                try:
+                    with open(self._key_path(key)) as f:
+                        digest = f.read().strip()
+                except FileNotFoundError:
+                    continue
+
+                path = self._object_path(digest)
+                try:
+                    size = os.path.getsize(path)
+                except FileNotFoundError:
+                    # the dataset has been evicted
+                    os.remove(self._key_path(key))
+                    continue
+
+                index = self._read_index()
+                self._use(index, digest, size)
+                self._write_index(index)
+                for other_key in keys:
+                    if other_key != key:
+                        self._write_key(other_key, digest)
+                return path
+        return None
+
+    def put(self, keys, stream):
+        """
+        stores the dataset read from the file-like object stream under keys
+        and returns the path of the cached file.
+        """
+        digest, size = hashlib.sha256(), 0
+        fd, tmpname = tempfile.mkstemp(dir=os.path.join(self.directory, "objects"))
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = stream.read(524288)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    out.write(chunk)
+            os.chmod(tmpname, 0o444)
+
+            digest = digest.hexdigest()
+            path = self._object_path(digest)
+            with self._locked():
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if os.path.exists(path):
+                    os.remove(tmpname)
+                else:
+                    os.replace(tmpname, path)
+                for key in keys:
+                    self._write_key(key, digest)
+                index = self._read_index()
+                self._use(index, digest, size)
+                self._evict(index, keep=digest)
+                self._write_index(index)
+        except BaseException:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            raise
+        return path
+
+    def fetch(self, keys, download):
+        """
+        returns the path of the file cached for keys, first storing what
+        the function download returns there if it is not cached yet.
+
+        Parameters
+        ----------
+        keys : list
+            the keys of the dataset.
+        download : callable
+            a function without arguments returning a file-like object with
+            the dataset.
+        """
+        path = self.get_path(keys)
+        if path is None:
+            stream = download()
+            try:
+                path = self.put(keys, stream)
+            finally:
+                stream.close()
+        return path
+
+    def _evict(self, index, keep=None):
+        """
+        removes the least recently used datasets until the cache is no
+        larger than max_size, never the one with the digest keep.  Must be
+        called with the lock held.
+        """
+        if self.max_size is None or index["total"] <= self.max_size:
+            return
+
+        objects = index["objects"]
+        for digest in sorted(objects, key=lambda digest: objects[digest][1]):
+            if index["total"] <= self.max_size:
+                break
+            if digest != keep:
+                try:
+                    os.remove(self._object_path(digest))
+                except FileNotFoundError:
+                    pass
+                index["total"] -= objects.pop(digest)[0]
+
+    def open_dataset(self, keys, download):
+        """
+        returns the dataset cached for keys opened for reading, storing
+        it first if necessary (see `fetch`).
+        """
+        try:
+            return open(self.fetch(keys, download), "rb")
+        except FileNotFoundError:
+            # evicted by somebody else in the meantime
+            return open(self.fetch(keys, download), "rb")
+
+    def copy_to(self, keys, download, target):
+        """
+        places the dataset cached for keys at the path target, replacing
+        any file there, and storing the dataset first if necessary (see
+        `fetch`).
+
+        Unless ``link`` is False, a hard link or a copy-on-write clone is
+        tried first; the file is copied if neither is possible.
+        """
+        try:
+            self._place(self.fetch(keys, download), target)
+        except FileNotFoundError:
+            # evicted by somebody else in the meantime
+            self._place(self.fetch(keys, download), target)
+
+    def _place(self, path, target):
+        tmpname = os.path.join(
+            os.path.dirname(os.path.abspath(target)),
+            f".{os.path.basename(target)}.{os.getpid()}.{threading.get_ident()}")
+        try:
+            if not (self.link and (_hard_link(path, tmpname) or _clone(path, tmpname))):
+                shutil.copyfile(path, tmpname)
+            os.replace(tmpname, target)
+        except BaseException:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            raise
+
+    def clear(self):
+        """
+        removes all cached datasets.
+        """
+        with self._locked():
+            for subdir in ("objects", "keys"):
+                shutil.rmtree(os.path.join(self.directory, subdir))
+                os.makedirs(os.path.join(self.directory, subdir))
+            if os.path.exists(os.path.join(self.directory, "index.json")):
+                os.remove(os.path.join(self.directory, "index.json"))
+
+    @property
+    def size(self):
+        """
+        the total size of the cached datasets in bytes.
+        """
+        with self._locked():
+            return self._read_index()["total"]
+
+
+def _hard_link(source, target):
+    try:
+        os.link(source, target)
+        return True
+    except OSError:
+        return False
+
+
+def _clone(source, target):
+    if fcntl is None:
+        return False
+    try:
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        return True
+    except OSError:
+        if os.path.exists(target):
+            os.remove(target)
+        return False
+
+
+_dataset_cache = None
+
+
+def enable_dataset_cache(directory, *, max_size=None, use_did=False, link=True):
+    """
+    makes ``getdataset`` and ``cachedataset`` of records use a
+    `DatasetCache`.
+
+    Parameters
+    ----------
+    directory : str
+        the directory to keep the datasets in.
+    max_size : int, optional
+        the maximum size of the cache in bytes.
+    use_did : bool
+        if True, datasets are also looked up by publisher DID.
+    link : bool
+        if True, ``cachedataset`` hard-links or clones cached datasets
+        into place where possible.
+
+    Returns
+    -------
+    DatasetCache
+        the cache now in use.
+    """
+    global _dataset_cache
+    _dataset_cache = DatasetCache(
+        directory, max_size=max_size, use_did=use_did, link=link)
+    return _dataset_cache
+
+
+def disable_dataset_cache():
+    """
+    stops using the dataset cache.  The cached files are left alone.
+    """
+    global _dataset_cache
+    _dataset_cache = None
+
+
+def get_dataset_cache():
+    """
+    returns the `DatasetCache` in use, or None if there is none.
+    """
+    return _dataset_cache
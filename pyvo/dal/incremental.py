@@ -0,0 +1,284 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+A local store for TAP results that are refreshed incrementally, see
+`~pyvo.dal.TAPService.run_incremental`.
+"""
+import collections
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import warnings
+from io import BytesIO
+
+import numpy as np
+
+from astropy.io.votable import parse as votableparse
+
+from .exceptions import DALOverflowWarning
+from .serialization import split_votable
+
+__all__ = ["IncrementalStore"]
+
+
+class IncrementalStore:
+    """
+    A directory keeping the results of queries for incremental refreshes.
+
+    For each query, the store holds the table metadata, the rows
+    retrieved so far, the watermark (the largest value of the monotonic
+    column seen so far), digests of the rows at the watermark and a
+    fingerprint of the table schema.  The rows are kept column by column,
+    with one numpy file per column and increment, so that refreshes only
+    write the new rows.
+
+    A store must only be used by one process at a time.
+
+    Parameters
+    ----------
+    directory : str
+        the directory to keep the results in.  It is created if it does
+        not exist.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(baseurl, query, column):
+        """
+        returns the key the results of query on the service at baseurl,
+        refreshed along column, are stored under.
+        """
+        return hashlib.sha256(
+            json.dumps([baseurl, query, column]).encode("utf-8")).hexdigest()
+
+    def _path(self, key, *parts):
+        return os.path.join(self.directory, key, *parts)
+
+    def get_state(self, key):
+        """
+        returns the state of the query with key as a dictionary, or None
+        if the store has no results for it.
+
+        The state contains the ``watermark``, the schema ``fingerprint``
+        and the number of rows (``nrows``) stored.
+        """
+        try:
+            with open(self._path(key, "state.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_state(self, key, state):
+        fd, tmpname = tempfile.mkstemp(dir=self._path(key))
+        with os.fdopen(fd, "w") as f:
+            json.dump(state, f)
+        os.replace(tmpname, self._path(key, "state.json"))
+
+    def save(self, key, results, column, *, append=False):
+        """
+        stores results (e.g., `~pyvo.dal.TAPResults`) under key.
+
+        Parameters
+        ----------
+        key : str
+            the key of the query, see `key`.
+        results : `~pyvo.dal.DALResults`
+            the results to store.
+        column : str
+            the name of the monotonic column in results.
+        append : bool
+            if True, the rows of results are added to those stored under
+            key, which must have the same schema; rows at the watermark
+            that are already stored are skipped, so that refreshes can
+            select rows from the watermark on.  Otherwise, whatever was
+            stored under key is replaced.
+
+        Returns
+        -------
+        dict
+            the new state of the query.
+        """
+        state = self.get_state(key) if append else None
+        if state is None:
+            self.remove(key)
+            os.makedirs(self._path(key))
+            state = {"watermark": None, "nrows": 0, "increments": 0, "ties": {},
+                     "fingerprint": schema_fingerprint(results)}
+        elif state["fingerprint"] != schema_fingerprint(results):
+            raise ValueError("Cannot append results with a different schema")
+
+        skeleton, arrays = split_votable(results.votable)
+        table_index = list(results.votable.iter_tables()).index(results.resultstable)
+        data, mask = arrays[table_index]
+        values, valid = _column_values(results[column])
+        old_watermark = state["watermark"]
+
+        # only the rows at the old watermark can have been stored before
+        stored = collections.Counter(state.get("ties", {}))
+        keep = np.ones(len(data), dtype=bool)
+        for index in np.flatnonzero(_at_value(values, valid, old_watermark)):
+            digest = _row_digest(data, mask, index)
+            if stored[digest]:
+                stored[digest] -= 1
+                keep[index] = False
+        data = data[keep]
+        if mask is not None:
+            mask = mask[keep]
+        values, valid = values[keep], valid[keep]
+
+        # the increment is written next to its final place and moved
+        # there when complete, so that an interrupted save leaves the
+        # store as it was.
+        increment = f"{state['increments']:08d}"
+        tmpdir = tempfile.mkdtemp(dir=self._path(key))
+        for index, name in enumerate(data.dtype.names):
+            np.save(os.path.join(tmpdir, f"{index}.npy"), _storable(data[name], name))
+            if mask is not None:
+                np.save(os.path.join(tmpdir, f"{index}.mask.npy"), mask[name])
+        os.replace(tmpdir, self._path(key, increment))
+        with open(self._path(key, "skeleton.xml"), "wb") as f:
+            f.write(skeleton)
+
+        watermark = _scalar(values[valid].max()) if valid.any() else None
+        ties = collections.Counter()
+        if old_watermark is not None and (watermark is None or watermark <= old_watermark):
+            watermark = old_watermark
+            ties.update(state.get("ties", {}))
+        ties.update(
+            _row_digest(data, mask, index)
+            for index in np.flatnonzero(_at_value(values, valid, watermark)))
+        state.update(
+            watermark=watermark, ties=dict(ties), nrows=state["nrows"] + len(data),
+            increments=state["increments"] + 1, table=table_index)
+        self._write_state(key, state)
+        return state
+
+    def load(self, key, cls, **kwargs):
+        """
+        returns the results stored under key as an instance of cls (e.g.,
+        `~pyvo.dal.TAPResults`), constructed with kwargs.
+        """
+        state = self.get_state(key)
+        if state is None:
+            raise KeyError(key)
+        with open(self._path(key, "skeleton.xml"), "rb") as f:
+            votable = votableparse(BytesIO(f.read()), verify="ignore")
+        table = list(votable.iter_tables())[state["table"]]
+
+        dtype = table.array.dtype
+        data = np.empty(state["nrows"], dtype=dtype)
+        mask = np.zeros(state["nrows"], dtype=np.ma.make_mask_descr(dtype))
+        increments = [self._path(key, f"{index:08d}") for index in range(state["increments"])]
+        for index, name in enumerate(dtype.names):
+            values, masks = [], []
+            for path in increments:
+                values.append(np.load(os.path.join(path, f"{index}.npy")))
+                mask_path = os.path.join(path, f"{index}.mask.npy")
+                if os.path.exists(mask_path):
+                    masks.append(np.load(mask_path))
+                else:
+                    masks.append(np.zeros(values[-1].shape, dtype=mask.dtype[name]))
+            data[name] = np.concatenate(values).astype(dtype[name])
+            mask[name] = np.concatenate(masks)
+        table.array = np.ma.array(data, mask=mask)
+
+        # warnings on the status have been issued when the rows were
+        # retrieved.
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DALOverflowWarning)
+            return cls(votable, **kwargs)
+
+    def remove(self, key):
+        """
+        removes the results stored under key, if any.
+        """
+        shutil.rmtree(self._path(key), ignore_errors=True)
+
+    def clear(self):
+        """
+        removes all stored results.
+        """
+        for key in os.listdir(self.directory):
+            self.remove(key)
+
+
+def schema_fingerprint(results):
+    """
+    returns a digest of the columns of results.
+
+    Results of a query have the same fingerprint as long as the service
+    does not change the name, type or unit of any of their columns.
+    """
+    fields = [
+        [field.ID, field.name, field.datatype, field.arraysize, str(field.unit), field.xtype]
+        for field in results.fielddescs]
+    return hashlib.sha256(json.dumps(fields).encode("utf-8")).hexdigest()
+
+
+def _storable(column, name):
+    """
+    returns column as an array without python objects, which numpy can
+    store without pickling.  Strings in object columns become fixed-width
+    strings; they are turned back into objects when loaded.
+    """
+    if not column.dtype.hasobject:
+        return column
+    values = column.tolist()
+    for kind in (str, bytes):
+        if all(isinstance(value, kind) for value in values):
+            return np.array(values, dtype=kind)
+    raise ValueError(f"Column {name} holds values that cannot be stored")
+
+
+def _scalar(value):
+    """
+    returns a value of a column as a python scalar, or None if it is
+    masked or NaN.
+    """
+    if value is np.ma.masked or value is None:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bytes):
+        value = value.decode("utf-8")
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def _column_values(column):
+    """
+    returns the values of column (a possibly masked array) with byte
+    strings decoded, and a boolean array that is False where they are
+    masked or NaN.
+    """
+    values = np.ma.getdata(column)
+    valid = ~np.ma.getmaskarray(column)
+    if values.dtype.kind == "S":
+        values = np.char.decode(values, "utf-8")
+    elif values.dtype.kind == "f":
+        valid &= ~np.isnan(values)
+    return values, valid
+
+
+def _at_value(values, valid, value):
+    """
+    returns a boolean array that is True for the valid values equal to
+    value (a python scalar, see `_scalar`, or None for no value).
+    """
+    if value is None:
+        return np.zeros(len(values), dtype=bool)
+    return valid & np.asarray(values == value, dtype=bool)
+
+
+def _row_digest(data, mask, index):
+    """
+    returns a digest of the values (and mask) of row index.
+    """
+    row = repr(data[index].tolist())
+    if mask is not None:
+        row += repr(mask[index].tolist())
+    return hashlib.sha256(row.encode("utf-8")).hexdigest()
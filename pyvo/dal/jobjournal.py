@@ -0,0 +1,107 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+A local journal of async TAP jobs, used to find completed jobs for
+identical requests, see `~pyvo.dal.TAPService.find_completed_job`.
+"""
+import json
+import os
+import tempfile
+import threading
+
+__all__ = ["JobJournal", "set_job_journal", "get_job_journal"]
+
+
+class JobJournal:
+    """
+    The URLs of async jobs submitted for reuse, by the digest of their
+    request.
+
+    Parameters
+    ----------
+    path : str, optional
+        a JSON file to keep the journal in, so that jobs can be reused
+        in later sessions.  If not given, the journal is only kept in
+        memory.
+    max_jobs : int
+        the number of jobs remembered for each request.
+    """
+    def __init__(self, path=None, *, max_jobs=4):
+        self.path = path
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+        self._entries = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self._entries = json.load(f)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _write(self):
+        if self.path is None:
+            return
+        fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)))
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(tmpname, self.path)
+
+    def record(self, digest, url):
+        """
+        records that the job at url was submitted for the request with
+        digest.
+        """
+        with self._lock:
+            urls = [url] + [other for other in self._entries.get(digest, []) if other != url]
+            self._entries[digest] = urls[:self.max_jobs]
+            self._write()
+
+    def lookup(self, digest):
+        """
+        returns the URLs of the jobs recorded for the request with digest,
+        the most recent first.
+        """
+        with self._lock:
+            return list(self._entries.get(digest, []))
+
+    def forget(self, digest, url):
+        """
+        removes the job at url from the jobs recorded for digest, e.g.,
+        because it was destroyed.
+        """
+        with self._lock:
+            urls = [other for other in self._entries.get(digest, []) if other != url]
+            if urls:
+                self._entries[digest] = urls
+            else:
+                self._entries.pop(digest, None)
+            self._write()
+
+    def clear(self):
+        """
+        forgets all jobs.
+        """
+        with self._lock:
+            self._entries = {}
+            self._write()
+
+
+_job_journal = JobJournal()
+
+
+def set_job_journal(journal):
+    """
+    makes the async queries of all TAP services record the jobs they
+    submit for reuse in journal, a `JobJournal`.
+
+    By default, jobs are recorded in a journal kept in memory; use a
+    journal with a path to reuse jobs across sessions.
+    """
+    global _job_journal
+    _job_journal = journal
+
+
+def get_job_journal():
+    """
+    returns the `JobJournal` in use.
+    """
+    return _job_journal
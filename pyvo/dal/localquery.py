@@ -0,0 +1,477 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Local evaluation of refinements of cached TAP queries.
+
+When enabled, `~pyvo.dal.TAPService.run_sync` remembers the results of
+the queries it runs.  A later query that provably selects a subset of
+the rows and columns of a remembered one, e.g., because it adds a
+condition, selects fewer columns or only wants the first rows in some
+order, is then answered from the remembered results without contacting
+the service.
+"""
+import collections
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from .adql import parse_select
+from .exceptions import DALOverflowWarning
+from .serialization import join_votable, restore_results, split_votable
+
+__all__ = ["LocalQueryCache", "enable_local_query_cache", "disable_local_query_cache",
+           "get_local_query_cache", "evaluate", "is_refinement"]
+
+_COMPARE = {
+    "=": np.equal, "<>": np.not_equal, "<": np.less, "<=": np.less_equal,
+    ">": np.greater, ">=": np.greater_equal}
+
+
+class LocalQueryCache:
+    """
+    The results of recent queries, used to answer refinements of them.
+
+    Only queries in the ADQL subset of `~pyvo.dal.adql.parse_select`
+    without ``TOP`` are remembered, and only if the service did not
+    report an overflow, so that the remembered results contain all rows
+    matching the query.  The rows are copied when they are remembered,
+    so later changes to the results passed in do not affect the answers.
+
+    Parameters
+    ----------
+    max_entries : int
+        the number of results to remember.  When more are added, the
+        least recently used results are forgotten.
+    max_age : float, optional
+        the number of seconds results are used for.  By default, they
+        are used until they are forgotten.
+    """
+    def __init__(self, max_entries=16, *, max_age=None):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def remember(self, baseurl, query, results):
+        """
+        remembers the results of query on the service at baseurl.
+
+        Returns
+        -------
+        bool
+            True if the results were remembered, False if query or the
+            results cannot be used to answer other queries.
+        """
+        try:
+            select = parse_select(query)
+        except ValueError:
+            return False
+        if select.top is not None or results.status[0].lower() != "ok":
+            return False
+
+        skeleton, arrays = split_votable(results.votable)
+        arrays = [(data.copy(), None if mask is None else mask.copy()) for data, mask in arrays]
+        kwargs, state = results._pickle_state()
+        stored = (type(results), skeleton, arrays, kwargs, state)
+
+        with self._lock:
+            key = (baseurl, query)
+            self._entries.pop(key, None)
+            self._entries[key] = (select, time.monotonic(), stored)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def answer(self, baseurl, query, *, maxrec=None, cls=None, **kwargs):
+        """
+        returns the results of query on the service at baseurl if they
+        can be computed from remembered results, or None otherwise.
+
+        Parameters
+        ----------
+        baseurl : str
+            the base URL of the service.
+        query : str
+            the ADQL query.
+        maxrec : int
+            the maximum number of rows the service would return.  Queries
+            with more rows are not answered, as the service would report
+            an overflow.
+        cls : type
+            the results class to return, by default that of the
+            remembered results.
+        **kwargs
+            further arguments for constructing the results.
+        """
+        try:
+            select = parse_select(query)
+        except ValueError:
+            return None
+
+        with self._lock:
+            if self.max_age is not None:
+                expired = [
+                    key for key, (_, remembered, _) in self._entries.items()
+                    if time.monotonic() - remembered > self.max_age]
+                for key in expired:
+                    del self._entries[key]
+            candidates = [
+                (key, entry) for key, entry in reversed(self._entries.items())
+                if key[0] == baseurl]
+
+        for key, (cached, _, stored) in candidates:
+            if not is_refinement(select, cached):
+                continue
+            results = restore_results(*stored)
+            try:
+                answer = evaluate(select, results, cls=cls, **kwargs)
+            except ValueError:
+                continue
+            if maxrec is not None and len(answer) > maxrec:
+                return None
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+            return answer
+        return None
+
+    def clear(self):
+        """
+        forgets all remembered results.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+def is_refinement(select, cached):
+    """
+    returns True if the rows and columns of the parsed query select
+    provably are a subset of those of the parsed query cached.
+
+    This is the case if both query the same table, cached has no ``TOP``,
+    the conditions of select imply those of cached and, if select uses
+    ``*``, so does cached.  The columns select refers to must still be
+    looked up in the results of cached, see `evaluate`.
+    """
+    if select.table != cached.table or cached.top is not None:
+        return False
+    if select.columns is None and cached.columns is not None:
+        return False
+    if cached.where is None:
+        return True
+    if select.where is None:
+        return False
+    conditions = _conjuncts(select.where)
+    return all(
+        any(_implies(condition, required) for condition in conditions)
+        for required in _conjuncts(cached.where))
+
+
+def _conjuncts(node):
+    return node[1] if node[0] == "and" else (node,)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _comparable(a, b):
+    return (_is_number(a) and _is_number(b)) or (isinstance(a, str) and isinstance(b, str))
+
+
+def _holds(node, value):
+    """
+    returns True if the single-column condition node holds for value.
+    """
+    if node[0] == "in":
+        return any(_comparable(value, other) and value == other for other in node[2]) != node[3]
+    if node[0] == "compare" and node[3][0] == "literal" and _comparable(value, node[3][1]):
+        return bool(_COMPARE[node[1]](value, node[3][1]))
+    return False
+
+
+def _subject(node):
+    """
+    returns the operand a comparison, IN or IS NULL node is about.
+    """
+    return node[2] if node[0] == "compare" else node[1]
+
+
+def _implies(condition, required):
+    """
+    returns True if condition provably implies required.
+
+    Apart from identical conditions, this covers conditions on the same
+    column: equality and IN implying any condition their values satisfy,
+    narrower ranges implying wider ones, and any comparison implying
+    ``IS NOT NULL``.
+    """
+    if condition == required:
+        return True
+    if condition[0] not in ("compare", "in") or _subject(condition)[0] != "column":
+        return False
+    column = _subject(condition)
+    if required == ("null", column, True):
+        # comparisons only hold for non-null values
+        return True
+    if (condition[0] == "compare" and condition[3][0] != "literal"
+            or condition[0] == "in" and condition[3]
+            or required[0] not in ("compare", "in") or _subject(required) != column):
+        return False
+
+    if condition[0] == "in" or condition[1] == "=":
+        values = condition[2] if condition[0] == "in" else (condition[3][1],)
+        return all(_holds(required, value) for value in values)
+
+    if required[0] != "compare" or required[3][0] != "literal":
+        return False
+    operator, bound = condition[1], condition[3][1]
+    required_operator, required_bound = required[1], required[3][1]
+    if not (_is_number(bound) and _is_number(required_bound)):
+        return False
+    if operator[0] != required_operator[0] or "<>" in (operator, required_operator):
+        return False
+    if required_operator[0] == "<":
+        tighter, strictly_tighter = bound <= required_bound, bound < required_bound
+    else:
+        tighter, strictly_tighter = bound >= required_bound, bound > required_bound
+    # x <= b only implies x < a if b < a
+    if required_operator in ("<", ">") and operator in ("<=", ">="):
+        return strictly_tighter
+    return tighter
+
+
+def evaluate(select, results, *, cls=None, **kwargs):
+    """
+    returns the result of the parsed query select computed from results.
+
+    Conditions follow the three-valued logic of SQL, so that rows with
+    null values in a compared column are not selected.  Strings are
+    compared by value and only for (in)equality, and not sorted, as the
+    collation of the service is unknown.  In ``ORDER BY``, nulls sort after all other
+    values in ascending and before them in descending order.
+
+    Parameters
+    ----------
+    select : `~pyvo.dal.adql.Select`
+        the parsed query.
+    results : `~pyvo.dal.DALResults`
+        results containing all rows and columns needed for select.
+    cls : type
+        the results class to return, by default that of results.
+    **kwargs
+        further arguments for constructing the results; by default, the
+        URL and session of results are used.
+
+    Raises
+    ------
+    ValueError
+        if select cannot be evaluated on results, e.g., because it refers
+        to columns results do not have.
+    """
+    table = results.resultstable
+    array = table.array
+    columns = _Columns(table)
+
+    if select.where is None:
+        rows = np.arange(len(array))
+    else:
+        rows = np.flatnonzero(_condition(select.where, columns)[0])
+
+    if select.order_by:
+        keys = []
+        for column, descending in reversed(select.order_by):
+            values, nulls = columns.values(column)
+            if values.dtype == object:
+                raise ValueError("Ordering by strings cannot be evaluated locally")
+            _, ranks = np.unique(values[rows], return_inverse=True)
+            ranks = ranks.reshape(-1)
+            nulls = nulls[rows]
+            keys.extend([-ranks, ~nulls] if descending else [ranks, nulls])
+        rows = rows[np.lexsort(keys)]
+    if select.top is not None:
+        rows = rows[:select.top]
+
+    if select.columns is None:
+        selected = list(range(len(table.fields)))
+    else:
+        selected = [columns.index(column) for column in select.columns]
+        if len(set(selected)) != len(selected):
+            raise ValueError("Columns selected twice cannot be evaluated locally")
+
+    skeleton, arrays = split_votable(results.votable)
+    table_index = list(results.votable.iter_tables()).index(table)
+    votable = join_votable(skeleton, arrays)
+    new_table = list(votable.iter_tables())[table_index]
+    fields = list(new_table.fields)
+    new_table.fields[:] = [fields[index] for index in selected]
+
+    names = [array.dtype.names[index] for index in selected]
+    dtype = np.dtype([
+        ((array.dtype.fields[name][2], name) if len(array.dtype.fields[name]) > 2 else name,
+         array.dtype.fields[name][0])
+        for name in names])
+    data = np.empty(len(rows), dtype=dtype)
+    mask = np.zeros(len(rows), dtype=np.ma.make_mask_descr(dtype))
+    for name in names:
+        data[name] = np.ma.getdata(array[name])[rows]
+        mask[name] = np.ma.getmaskarray(array[name])[rows]
+    new_table.array = np.ma.array(data, mask=mask)
+    if new_table.nrows is not None:
+        new_table._nrows = len(rows)
+
+    kwargs.setdefault("url", results.queryurl)
+    kwargs.setdefault("session", getattr(results, "_session", None))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DALOverflowWarning)
+        return (cls or type(results))(votable, **kwargs)
+
+
+class _Columns:
+    """
+    the columns of a results table, looked up by column nodes.
+    """
+    def __init__(self, table):
+        self.table = table
+        self._values = {}
+
+    def index(self, column):
+        _, name, delimited = column
+        matches = [
+            index for index, field in enumerate(self.table.fields)
+            if (field.name == name if delimited else field.name.lower() == name)]
+        if len(matches) != 1:
+            raise ValueError(f"Column {name} cannot be identified in the results")
+        return matches[0]
+
+    def values(self, column):
+        """
+        returns the values of column with nulls replaced by a placeholder
+        and an array that is True for nulls.
+        """
+        index = self.index(column)
+        if index not in self._values:
+            array = self.table.array
+            column_array = array[array.dtype.names[index]]
+            values = np.ma.getdata(column_array)
+            nulls = np.ma.getmaskarray(column_array)
+            if values.ndim != 1:
+                raise ValueError("Array columns cannot be evaluated locally")
+            if values.dtype.kind == "f":
+                nulls = nulls | np.isnan(values)
+                values = np.where(nulls, 0, values).astype(np.float64)
+            elif values.dtype.kind in "iu":
+                values = np.where(nulls, 0, values)
+            elif values.dtype.kind in "SUO":
+                values = np.array(
+                    ["" if null else value.decode("utf-8") if isinstance(value, bytes) else value
+                     for value, null in zip(values.tolist(), nulls)], dtype=object)
+                if not all(isinstance(value, str) for value in values):
+                    raise ValueError("Only string columns of type object can be evaluated locally")
+            else:
+                raise ValueError(f"Columns of type {values.dtype} cannot be evaluated locally")
+            self._values[index] = values, nulls
+        return self._values[index]
+
+
+def _check_types(values, other, operator):
+    """
+    raises a ValueError unless values can be compared to other locally.
+    """
+    if isinstance(other, np.ndarray):
+        other_is_string = other.dtype == object
+    elif isinstance(other, str) or _is_number(other):
+        other_is_string = isinstance(other, str)
+    else:
+        raise ValueError(f"Cannot compare to {other!r} locally")
+    is_string = values.dtype == object
+    if is_string != other_is_string:
+        raise ValueError("Comparisons of strings with numbers cannot be evaluated locally")
+    if is_string and operator not in ("=", "<>"):
+        raise ValueError("Ordering comparisons of strings cannot be evaluated locally")
+
+
+def _condition(node, columns):
+    """
+    returns a pair of arrays telling for which rows node is true and for
+    which it is false; where both are False, its value is unknown.
+    """
+    kind = node[0]
+    if kind == "and" or kind == "or":
+        parts = [_condition(child, columns) for child in node[1]]
+        trues, falses = zip(*parts)
+        if kind == "and":
+            return np.logical_and.reduce(trues), np.logical_or.reduce(falses)
+        return np.logical_or.reduce(trues), np.logical_and.reduce(falses)
+    if kind == "not":
+        true, false = _condition(node[1], columns)
+        return false, true
+    if kind == "null":
+        if node[1][0] != "column":
+            raise ValueError("IS NULL on literals cannot be evaluated locally")
+        _, nulls = columns.values(node[1])
+        return (~nulls, nulls) if node[2] else (nulls, ~nulls)
+
+    if _subject(node)[0] != "column":
+        raise ValueError("Comparisons of literals cannot be evaluated locally")
+    values, nulls = columns.values(_subject(node))
+    if kind == "in":
+        matches = np.zeros(len(values), dtype=bool)
+        for value in node[2]:
+            _check_types(values, value, "=")
+            matches |= values == value
+        if node[3]:
+            matches = ~matches
+    else:
+        if node[3][0] == "literal":
+            other, other_nulls = node[3][1], False
+        else:
+            other, other_nulls = columns.values(node[3])
+        _check_types(values, other, node[1])
+        matches = np.asarray(_COMPARE[node[1]](values, other), dtype=bool)
+        nulls = nulls | other_nulls
+    return matches & ~nulls, ~matches & ~nulls
+
+
+_local_query_cache = None
+
+
+def enable_local_query_cache(max_entries=16, *, max_age=None):
+    """
+    makes `~pyvo.dal.TAPService.run_sync` remember the results of ADQL
+    queries and answer refinements of them locally.
+
+    Parameters
+    ----------
+    max_entries : int
+        the number of results to remember.
+    max_age : float, optional
+        the number of seconds results are used for.
+
+    Returns
+    -------
+    LocalQueryCache
+        the cache now in use.
+    """
+    global _local_query_cache
+    _local_query_cache = LocalQueryCache(max_entries, max_age=max_age)
+    return _local_query_cache
+
+
+def disable_local_query_cache():
+    """
+    stops answering queries locally and forgets all remembered results.
+    """
+    global _local_query_cache
+    _local_query_cache = None
+
+
+def get_local_query_cache():
+    """
+    returns the `LocalQueryCache` in use, or None if there is none.
+    """
+    return _local_query_cache
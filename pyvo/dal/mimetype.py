@@ -3,10 +3,15 @@
 A module for parsing and working with mimetypes
 """
 
+import io
 import mimetypes
+import os
+import re
+import tempfile
+from collections import OrderedDict
 from email.message import Message
 
-from astropy.io.fits import HDUList
+from astropy.io import fits
 
 from ..utils.http import use_session
 
@@ -16,6 +21,15 @@ mimetypes.add_type('application/x-fits', '.fits')
 mimetypes.add_type('image/fits', '.fits')
 mimetypes.add_type('text/plain', '.txt')
 
+# the size of the blocks read from servers supporting HTTP range requests;
+# a multiple of the FITS block size
+_RANGE_BLOCK_SIZE = 2880 * 64
+
+# the number of such blocks kept in memory
+_RANGE_CACHE_BLOCKS = 32
+
+_CONTENT_RANGE_PATTERN = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+)")
+
 
 def mime2extension(mimetype, default=None):
     """
@@ -65,6 +79,11 @@ def mime_object_maker(url, mimetype, *, session=None):
     this will either return a astropy fits object or a pyvo DALResults object,
     a PIL object for conventional images or string for text content.
 
+    FITS files are opened lazily: if the server supports HTTP range
+    requests, only the headers and data actually accessed are fetched.
+    Otherwise, the file is downloaded into a temporary file, from which
+    HDUs are read as they are accessed.
+
     Parameters
     ----------
     url : str
@@ -94,8 +113,7 @@ def mime_object_maker(url, mimetype, *, session=None):
         return session.get(url).text
 
     if mtype[1] == 'fits' or mtype[1] == 'x-fits':
-        response = session.get(url)
-        return HDUList.fromstring(response.content)
+        return _open_fits(url, session)
 
     if mtype[0] == 'image':
         from PIL import Image
@@ -113,3 +131,117 @@ def mime_object_maker(url, mimetype, *, session=None):
                 return DatalinkResults.from_result_url(url)
         from .query import DALResults
         return DALResults.from_result_url(url)
+
+
+class _HTTPRangeFile(io.RawIOBase):
+    """
+    A read-only, seekable file reading a remote resource through HTTP
+    range requests.
+
+    Small reads are served from a cache of blocks of ``block_size`` bytes;
+    larger reads are fetched in one request.
+    """
+    def __init__(self, url, *, session, size, block_size=_RANGE_BLOCK_SIZE,
+                 first_block=None):
+        super().__init__()
+        self.url = url
+        self._session = session
+        self._size = size
+        self._block_size = block_size
+        self._pos = 0
+        self._blocks = OrderedDict()
+        if first_block is not None:
+            self._blocks[0] = first_block
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError(f"Negative seek position {pos}")
+        self._pos = pos
+        return pos
+
+    def _fetch(self, start, end):
+        response = self._session.get(
+            self.url, headers={"Range": f"bytes={start}-{end - 1}"})
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise OSError(f"{self.url}: server no longer honours range requests")
+        return response.content
+
+    def _get_block(self, index):
+        if index in self._blocks:
+            self._blocks.move_to_end(index)
+        else:
+            start = index * self._block_size
+            self._blocks[index] = self._fetch(
+                start, min(start + self._block_size, self._size))
+            if len(self._blocks) > _RANGE_CACHE_BLOCKS:
+                self._blocks.popitem(last=False)
+        return self._blocks[index]
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        size = min(len(view), self._size - self._pos)
+        if size <= 0:
+            return 0
+
+        if size > self._block_size:
+            data = self._fetch(self._pos, self._pos + size)
+        else:
+            index, offset = divmod(self._pos, self._block_size)
+            data = self._get_block(index)[offset:offset + size]
+
+        view[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+
+def _open_fits(url, session):
+    """
+    opens the remote FITS file at url with lazily loaded HDUs, reading
+    it through range requests if the server supports them and from a
+    temporary copy otherwise.
+    """
+    response = session.get(
+        url, headers={"Range": f"bytes=0-{_RANGE_BLOCK_SIZE - 1}"}, stream=True)
+    response.raise_for_status()
+
+    content_range = _CONTENT_RANGE_PATTERN.match(
+        response.headers.get("Content-Range", ""))
+    if (response.status_code == 206 and content_range
+            and int(content_range.group(1)) == 0
+            and not response.headers.get("Content-Encoding")):
+        fileobj = io.BufferedReader(
+            _HTTPRangeFile(url, session=session, size=int(content_range.group(3)),
+                           first_block=response.content),
+            buffer_size=_RANGE_BLOCK_SIZE)
+    else:
+        # the server sent the whole file; keep it on disk rather than
+        # in memory, read through a read-only handle of its own
+        try:
+            with tempfile.TemporaryFile() as spill:
+                for chunk in response.iter_content(524288):
+                    spill.write(chunk)
+                spill.flush()
+                fileobj = io.BufferedReader(io.FileIO(os.dup(spill.fileno()), "rb"))
+                fileobj.seek(0)
+        finally:
+            response.close()
+
+    return fits.open(fileobj, lazy_load_hdus=True)
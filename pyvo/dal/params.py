@@ -244,8 +244,8 @@ class AbstractDalQueryParam(MutableSet, metaclass=abc.ABCMeta):
         """
         self.dal = []
         self._data = []
-        for item in values:
-            self.add(item)
+        self._dal_set = set()
+        self.update(values)
         super().__init__()
 
     @abc.abstractmethod
@@ -255,29 +255,107 @@ class AbstractDalQueryParam(MutableSet, metaclass=abc.ABCMeta):
         """
         return
 
+    def is_array(self, values):
+        """
+        Returns True if values is an array holding several values that
+        this parameter can validate and format in one go.
+
+        Subclasses accepting arrays override this, and usually
+        `_get_dal_formats` to format the values in a vectorized way.
+        """
+        return False
+
+    def _get_dal_formats(self, values):
+        """
+        Returns a function returning the i-th value of the array values
+        and the list of the DAL formats of all its values.
+
+        By default, the values are formatted one by one with
+        `get_dal_format`.
+        """
+        formats = [self.get_dal_format(values[index]) for index in range(len(values))]
+        return values.__getitem__, formats
+
+    def update(self, values):
+        """
+        Adds several values.
+
+        Parameters
+        ----------
+        values : iterable or array
+            Either an iterable of values, each of which is added as with
+            `add`, or an array accepted by `is_array`; such arrays are
+            validated and formatted in one vectorized pass, giving the
+            same DAL formats as adding their values one by one.
+        """
+        if self.is_array(values):
+            # the values are only taken out of the array when asked for,
+            # which for SkyCoord or Time arrays is slow
+            get_value, formats = self._get_dal_formats(values)
+            items = (_ArrayValue(get_value, index) for index in range(len(formats)))
+        else:
+            items = list(values)
+            formats = [self.get_dal_format(item) for item in items]
+
+        for item, formatted in zip(items, formats):
+            if formatted not in self._dal_set:
+                self._dal_set.add(formatted)
+                self._data.append(item)
+                self.dal.append(formatted)
+
     def add(self, item):
-        if item in self:
+        formatted = self.get_dal_format(item)
+        if formatted in self._dal_set:
             return
+        self._dal_set.add(formatted)
         self._data.append(item)
-        self.dal.append(self.get_dal_format(item))
+        self.dal.append(formatted)
 
     def discard(self, item):
         # relies on the fact that both the raw and the formatted
         # attribute lists have the items in the same order. It
         # uses the formatted list (normalized units) to get the index.
-        index = self.dal.index(self.get_dal_format(item))
+        formatted = self.get_dal_format(item)
+        index = self.dal.index(formatted)
         self._data.pop(index)
         self.dal.pop(index)
+        self._dal_set.discard(formatted)
 
     def __iter__(self):
-        return iter(self._data)
+        for item in self._data:
+            if isinstance(item, _ArrayValue):
+                item = item.get()
+            yield item
 
     def __len__(self):
         return len(self._data)
 
     def __contains__(self, item):
         # check dal format for duplications since the quantities are known
-        return self.get_dal_format(item) in self.dal
+        return self.get_dal_format(item) in self._dal_set
+
+
+class _ArrayValue:
+    """
+    A value added to a parameter as part of an array.
+    """
+    __slots__ = ("_get_value", "_index")
+
+    def __init__(self, get_value, index):
+        self._get_value = get_value
+        self._index = index
+
+    def get(self):
+        return self._get_value(self._index)
+
+
+def _format_values(array):
+    """
+    Returns the rows of the 2-D array as lists of strings formatted like
+    the individual values would be.
+    """
+    # str of the python scalars is what the per-value formatting produces
+    return [[str(value) for value in row] for row in array.tolist()]
 
 
 class StrQueryParam(AbstractDalQueryParam):
@@ -317,6 +395,83 @@ class PosQueryParam(AbstractDalQueryParam):
              val.transform_to('icrs').to_string() if isinstance(val, SkyCoord) else
              str((val * u.deg).value) for val in val]))
 
+    def is_array(self, values):
+        """
+        Returns True for arrays of positions: 2-D arrays or quantities
+        with one CIRCLE (3 columns), RANGE (4 columns) or POLYGON (6 or
+        more columns) per row, and tuples of a SkyCoord array and a radius
+        or an array of radii.
+        """
+        if isinstance(values, tuple):
+            return (len(values) == 2 and isinstance(values[0], SkyCoord)
+                    and not values[0].isscalar)
+        return isinstance(values, np.ndarray) and values.ndim == 2
+
+    def _get_dal_formats(self, values):
+        if isinstance(values, tuple):
+            coords, radii = values
+            coords = coords.ravel()
+            radius = np.broadcast_to(Quantity(radii, u.deg).value, coords.shape)
+            self._validate_radii(radius)
+            formats = [
+                f'CIRCLE {center} {radius}' for center, (radius,) in zip(
+                    coords.transform_to('icrs').to_string(),
+                    _format_values(radius[:, np.newaxis]))]
+
+            def get_value(index):
+                if np.ndim(radii):
+                    return coords[index], np.ravel(radii)[index]
+                return coords[index], radii
+            return get_value, formats
+
+        array = Quantity(values, u.deg).value
+        if array.shape[1] == 2:
+            raise ValueError("a 2-length pos should be a coordinate and a radius")
+        elif array.shape[1] == 3:
+            shape = 'CIRCLE'
+            self._validate_ras(array[:, 0])
+            self._validate_decs(array[:, 1])
+            self._validate_radii(array[:, 2])
+        elif array.shape[1] == 4:
+            shape = 'RANGE'
+            for low, high, validate, name in [
+                    (0, 1, self._validate_ras, 'ra'),
+                    (2, 3, self._validate_decs, 'dec')]:
+                validate(array[:, low])
+                validate(array[:, high])
+                bad = np.flatnonzero(array[:, high] < array[:, low])
+                if len(bad):
+                    raise ValueError('min > max in {} range: {} > {}'.format(
+                        name, array[bad[0], low] * u.deg, array[bad[0], high] * u.deg))
+        elif array.shape[1] > 5 and not array.shape[1] % 2:
+            shape = 'POLYGON'
+            self._validate_ras(array[:, ::2])
+            self._validate_decs(array[:, 1::2])
+        else:
+            raise ValueError(
+                'Invalid shape {}. Tuple with 3 (CIRCLE), 4 (RANGE) or '
+                'even 6 and above (POLYGON) accepted.'.format(values[0]))
+
+        def get_value(index):
+            return values[index]
+        return get_value, [
+            '{} {}'.format(shape, ' '.join(row)) for row in _format_values(array)]
+
+    def _validate_radii(self, radii):
+        bad = np.flatnonzero((radii <= 0) | (radii > 90))
+        if len(bad):
+            raise ValueError(f'Invalid circle radius: {radii.flat[bad[0]] * u.deg}')
+
+    def _validate_ras(self, ras):
+        bad = np.flatnonzero((ras < 0) | (ras > 360))
+        if len(bad):
+            raise ValueError(f'Invalid ra: {ras.flat[bad[0]] * u.deg}')
+
+    def _validate_decs(self, decs):
+        bad = np.flatnonzero((decs < -90) | (decs > 90))
+        if len(bad):
+            raise ValueError(f'Invalid dec: {decs.flat[bad[0]] * u.deg}')
+
     def _validate_pos(self, pos):
         """
         validates position
@@ -428,6 +583,41 @@ class IntervalQueryParam(AbstractDalQueryParam):
 
         return f'{low} {high}'
 
+    def is_array(self, values):
+        """
+        Returns True for arrays of intervals, i.e., 2-D arrays or
+        quantities with one interval per row (or one value per row for
+        degenerate intervals).
+        """
+        return (isinstance(values, np.ndarray) and values.ndim == 2
+                and values.shape[1] in (1, 2))
+
+    def _get_dal_formats(self, values):
+        low, high = values[:, 0], values[:, -1]
+        if not isinstance(values, Quantity):
+            bad = np.flatnonzero(low > high)
+            if len(bad):
+                raise ValueError('Invalid interval: min({}) > max({})'.format(
+                    low[bad[0]], high[bad[0]]))
+        if self._unit:
+            if not isinstance(values, Quantity):
+                low, high = Quantity(low, self._unit), Quantity(high, self._unit)
+            low = low.to(self._unit, equivalencies=self._equivalencies).value
+            high = high.to(self._unit, equivalencies=self._equivalencies).value
+            # intervals could become invalid during transform (e.g. GHz->m)
+            low, high = np.minimum(low, high), np.maximum(low, high)
+
+        if isinstance(low, Quantity):
+            formats = [f'{lo} {hi}' for lo, hi in zip(low, high)]
+        else:
+            formats = [' '.join(row) for row in _format_values(np.stack([low, high], axis=1))]
+
+        def get_value(index):
+            if isinstance(values, Quantity):
+                return values[index]
+            return tuple(values[index])
+        return get_value, formats
+
 
 class TimeQueryParam(AbstractDalQueryParam):
     """
@@ -457,6 +647,31 @@ class TimeQueryParam(AbstractDalQueryParam):
             ))
         return f'{min_time.mjd} {max_time.mjd}'
 
+    def is_array(self, values):
+        """
+        Returns True for Time arrays, holding either one time per element
+        or, in two dimensions, one interval per row.
+        """
+        return isinstance(values, Time) and (
+            values.ndim == 1 or (values.ndim == 2 and values.shape[1] in (1, 2)))
+
+    def _get_dal_formats(self, values):
+        if values.ndim == 1:
+            min_time = max_time = values
+        else:
+            min_time, max_time = values[:, 0], values[:, -1]
+        bad = np.flatnonzero(min_time > max_time)
+        if len(bad):
+            raise ValueError('Invalid time interval: min({}) > max({})'.format(
+                min_time[bad[0]], max_time[bad[0]]))
+
+        def get_value(index):
+            if values.ndim == 1:
+                return values[index]
+            return tuple(values[index])
+        return get_value, [
+            ' '.join(row) for row in _format_values(np.stack([min_time.mjd, max_time.mjd], axis=1))]
+
 
 class EnumQueryParam(AbstractDalQueryParam):
     """
@@ -21,32 +21,101 @@ standard data model.  Usually the field names are used to uniquely
 identify table columns.
 """
 __all__ = ["DALService", "DALServiceError", "DALQuery", "DALQueryError",
-           "DALResults", "Record", "UploadList"]
+           "DALResults", "Record", "UploadList", "MAX_GET_URL_LENGTH",
+           "DatasetDownload"]
 
+import copy
 import os
 import shutil
 import re
 import requests
+import sys
+import tempfile
+import threading
 from collections.abc import Mapping
 from io import BytesIO, StringIO
+from urllib.parse import urlencode
 
 import collections
 
 from warnings import warn
 
+import numpy as np
+
+from astropy import units as u
+from astropy.coordinates import SkyCoord
 from astropy.table import Table, QTable
-from astropy.io.votable import parse as votableparse
+from astropy.io.votable.tree import Info
 from astropy.io.votable.ucd import parse_ucd
 from astropy.utils.exceptions import AstropyDeprecationWarning
 
+from .datasetcache import get_dataset_cache
 from .mimetype import mime_object_maker
+from .serialization import SharedResults, join_votable, restore_results, split_votable
 from .exceptions import (DALFormatError, DALServiceError, DALQueryError,
                          DALOverflowWarning)
 
 from .. import samp
+from ..io.votable import parse as parse_votable
 
+from ..utils.concurrency import ordered_map
 from ..utils.decorators import stream_decode_content
-from ..utils.http import use_session
+from ..utils.http import single_flight, use_session
+from ..utils.spatial import SpatialIndex
+
+# the longest GET URL queries with a max_get_url_length will send; longer
+# ones are split or sent by POST.  Many servers and proxies reject URLs
+# of more than 8 kB, some even shorter ones.
+MAX_GET_URL_LENGTH = 4000
+
+# the number of result tables converted to astropy tables so far; see
+# table_conversion_count.
+_table_conversions = 0
+_table_conversions_lock = threading.Lock()
+
+
+def table_conversion_count():
+    """
+    returns the number of times result tables have been converted to
+    astropy tables in this process.
+
+    Each result is converted at most once (unless its table is replaced,
+    e.g., by `~pyvo.dal.DALResults.compact`); this counter lets tests
+    check that.
+    """
+    return _table_conversions
+
+
+DatasetDownload = collections.namedtuple(
+    "DatasetDownload", ["record", "data", "error"])
+DatasetDownload.__doc__ = """
+An item yielded by `~pyvo.dal.DALResults.iter_datasets`.
+
+``record`` is the record the dataset belongs to, ``data`` a file-like
+object positioned at the start of the dataset.  If the dataset could not
+be retrieved, ``data`` is None and ``error`` is the exception describing
+why.
+"""
+
+# ways to find the main position columns of a result, in order of preference:
+# (ucd words, utype, column name) of the RA and Dec columns
+_POSITION_COLUMNS = [
+    (("pos.eq.ra", "meta.main"), None, None),
+    (("pos_eq_ra_main",), None, None),
+    (None, "obscore:char.spatialaxis.coverage.location.coords.position2d.value2.c1", None),
+    (("pos.eq.ra",), None, None),
+    (None, None, "s_ra"),
+    (None, None, "ra"),
+]
+_DEC_FOR_RA = {
+    "pos.eq.ra": "pos.eq.dec",
+    "pos_eq_ra_main": "pos_eq_dec_main",
+    "obscore:char.spatialaxis.coverage.location.coords.position2d.value2.c1":
+        "obscore:char.spatialaxis.coverage.location.coords.position2d.value2.c2",
+    "s_ra": "s_dec",
+    "ra": "dec",
+    "meta.main": "meta.main",
+}
 
 
 class DALService:
@@ -147,6 +216,10 @@ class DALQuery(dict):
 
     _ex = None
 
+    # queries longer than this are sent by POST; see also split().  None
+    # leaves the choice to the caller.
+    max_get_url_length = None
+
     def __init__(self, baseurl, *, session=None, **keywords):
         """
         initialize the query object with a baseurl
@@ -223,6 +296,9 @@ class DALQuery(dict):
         url = self.queryurl
         params = {k: v for k, v in self.items()}
 
+        if not post and self.max_get_url_length is not None:
+            post = self._get_url_length() > self.max_get_url_length
+
         if post:
             response = self._session.post(url, data=params, stream=True,
                                           allow_redirects=True)
@@ -231,12 +307,67 @@ class DALQuery(dict):
                                          allow_redirects=True)
         return response
 
-    def execute_votable(self, *, post=False):
+    def _get_url_length(self):
+        """
+        returns the length of the URL a GET request for this query would use.
+        """
+        return len(self.queryurl) + 1 + len(urlencode(
+            {key: value for key, value in self.items() if value is not None},
+            doseq=True))
+
+    def split(self):
+        """
+        return a list of queries that together ask for the same as this one
+        while each fitting into ``max_get_url_length`` as a GET request.
+
+        Multi-valued parameters are OR-ed by the services, so this query is
+        split by halving the value list of its longest multi-valued
+        parameter until the pieces are short enough.  The results of the
+        queries returned can thus overlap.  Pieces that cannot be split
+        further are sent by POST.
+
+        Returns
+        -------
+        list of DALQuery
+            the queries, or a list of just this query if it is short
+            enough or has no ``max_get_url_length``.
+        """
+        if (self.max_get_url_length is None
+                or self._get_url_length() <= self.max_get_url_length):
+            return [self]
+
+        multi_valued = [
+            (len(urlencode({key: value}, doseq=True)), key)
+            for key, value in self.items()
+            if isinstance(value, (list, tuple)) and len(value) > 1]
+        if not multi_valued:
+            return [self]
+
+        _, key = max(multi_valued)
+        values = list(self[key])
+        queries = []
+        for chunk in (values[:len(values) // 2], values[len(values) // 2:]):
+            query = copy.copy(self)
+            query[key] = chunk
+            queries.extend(query.split())
+        return queries
+
+    def execute_votable(self, *, post=False, columns=None, max_rows=None):
         """
         Submit the query and return the results as an AstroPy votable instance.
         As this is the level where qualified error messages are available,
         they are raised here instead of in the underlying execute_stream.
 
+        Parameters
+        ----------
+        post : bool
+            send the query by POST rather than GET.
+        columns : sequence of str or int, optional
+            the IDs, names or indices of the columns to read.  The values of other
+            columns are not decoded.  By default, all columns are read.
+        max_rows : int, optional
+            the maximum number of rows to read.
+
         Returns
         -------
         astropy.io.votable.tree.VOTableFile
@@ -257,7 +388,8 @@ class DALQuery(dict):
         DALQueryError
         """
         try:
-            return votableparse(self.execute_stream(post=post).read)
+            return parse_votable(
+                self.execute_stream(post=post).read, columns=columns, max_rows=max_rows)
         except Exception as e:
             self.raise_if_error()
             raise DALFormatError(e, self.queryurl)
@@ -290,17 +422,23 @@ class DALResults:
         return session.get(result_url, stream=True).raw
 
     @classmethod
-    def from_result_url(cls, result_url, *, session=None):
+    def from_result_url(cls, result_url, *, session=None, columns=None, max_rows=None):
         """
         Create a result object from a url.
 
-        Uses the optional session to make the request.
+        Uses the optional session to make the request.  Only the columns
+        given by ``columns`` (IDs, names or indices) and the first ``max_rows``
+        rows are read if these are given.
         """
         session = use_session(session)
-        return cls(
-            votableparse(cls._from_result_url(result_url, session).read),
-            url=result_url,
-            session=session)
+        if columns is not None and not isinstance(columns, str):
+            columns = tuple(columns)
+        votable = single_flight(
+            session, ("GET", result_url, columns, max_rows),
+            lambda: parse_votable(
+                cls._from_result_url(result_url, session).read,
+                columns=columns, max_rows=max_rows))
+        return cls(votable, url=result_url, session=session)
 
     def __init__(self, votable, *, url=None, session=None, client_set_maxrec=None):
         """
@@ -332,7 +470,7 @@ class DALResults:
         self._votable = votable
 
         self._url = url
-        self._session = use_session(session)
+        self._session = session
         self._client_set_maxrec = client_set_maxrec
 
         self._status = self._findstatus(votable)
@@ -356,6 +494,56 @@ class DALResults:
 
         self._infos = self._findinfos(votable)
 
+    @property
+    def _session(self):
+        # the default session is only made when it is first needed, which
+        # saves the trouble for results unpickled in worker processes.
+        if self._session_value is None:
+            self._session_value = use_session(None)
+        return self._session_value
+
+    @_session.setter
+    def _session(self, session):
+        self._session_value = session
+
+    def _pickle_state(self):
+        """
+        returns the keyword arguments for the constructor and the
+        attributes to restore on unpickling (besides the VOTable).
+
+        Subclasses with further state of their own extend this.
+        """
+        return {"url": self._url}, {"_client_set_maxrec": self._client_set_maxrec}
+
+    def __reduce__(self):
+        # Pickling the VOTableFile as it is would pickle the whole tree of
+        # VOTable elements, and the session might not be picklable at all.
+        # Instead, the table rows are passed as plain binary arrays with
+        # the metadata as a VOTable without rows, and the session is
+        # dropped.
+        kwargs, state = self._pickle_state()
+        skeleton, arrays = split_votable(self._votable)
+        return restore_results, (type(self), skeleton, arrays, kwargs, state)
+
+    def to_shared_memory(self):
+        """
+        puts these results into shared memory for passing them to other
+        processes.
+
+        Pickling the results copies all rows into the pickle.  For large
+        results sent to several processes, it is cheaper to put them into
+        shared memory once and only pass the returned handle, on which the
+        receiving processes call ``load()``.
+
+        Returns
+        -------
+        `~pyvo.dal.serialization.SharedResults`
+            the handle to the shared results.  The shared memory is
+            released by calling its ``unlink()`` method or by leaving a
+            ``with`` block on it.
+        """
+        return SharedResults(self)
+
     def _handle_overflow_warning(self, client_set_maxrec=None):
         """
         Handle overflow warning - can be overridden by subclasses.
@@ -466,7 +654,7 @@ class DALResults:
         return infos
 
     def __repr__(self):
-        return f"<DALResults{repr(self.to_table())[1:]}"
+        return f"<DALResults{repr(self._table_view())[1:]}"
 
     @property
     def queryurl(self):
@@ -489,15 +677,38 @@ class DALResults:
         """
         return self._resultstable
 
-    def to_table(self):
+    def _table_view(self):
+        """
+        returns a read-only astropy table sharing its columns with the
+        result table.
+
+        The table is made once and kept until the result table is replaced.
+        """
+        array = self.resultstable.array
+        if getattr(self, "_table_view_of", None) is not array:
+            self._table_view_cache = _read_only_table(self.resultstable)
+            self._table_view_of = array
+        return self._table_view_cache
+
+    def to_table(self, *, copy=True):
         """
         Returns a astropy Table object.
 
+        Parameters
+        ----------
+        copy : bool
+            if False, a read-only table sharing its column buffers with
+            `resultstable` is returned.  It is made once per result, so
+            this is cheap to call repeatedly.  Changing its values raises
+            a `ValueError`; use a copy (the default) for that.
+
         Returns
         -------
         `astropy.table.Table`
         """
-        return self.resultstable.to_table(use_names_over_ids=True)
+        if copy:
+            return self._table_view().copy()
+        return self._table_view()
 
     def to_qtable(self):
         """
@@ -508,7 +719,7 @@ class DALResults:
         -------
         `astropy.table.QTable`
         """
-        return QTable(self.resultstable.to_table(use_names_over_ids=True))
+        return QTable(self._table_view())
 
     @property
     def table(self):
@@ -518,6 +729,54 @@ class DALResults:
         ))
         return self.to_table()
 
+    def compact(self, *, downcast=True):
+        """
+        reduces the memory taken by the result table, keeping all values.
+
+        String columns are dictionary-encoded: each distinct value is kept
+        once, and the column only holds references to these values (i.e.,
+        it becomes an object column).  This is done where it saves memory,
+        which is typically the case for columns with few distinct values,
+        such as ``dataproduct_type`` or ``obs_collection``.
+
+        Parameters
+        ----------
+        downcast : bool
+            if True, numeric columns held in a wider type than the
+            datatype of their FIELD (as happens for tables put together
+            from other tables) are narrowed to that datatype where all
+            values fit.
+
+        Returns
+        -------
+        DALResults
+            these results, for chaining.
+        """
+        array = self.resultstable.array
+        data = np.ma.getdata(array)
+        columns = {}
+        for field, name in zip(self.resultstable.fields, data.dtype.names):
+            column = _dictionary_encode(data[name])
+            if column is None and downcast:
+                column = _downcast(data[name], field)
+            if column is not None:
+                columns[name] = column
+
+        if columns:
+            descr = []
+            for name in data.dtype.names:
+                title = data.dtype.fields[name][2:]
+                descr.append(
+                    (title + (name,) if title else name,
+                     columns[name].dtype if name in columns else data.dtype[name]))
+            dtype = np.dtype((data.dtype.type, descr))
+            compacted = np.empty(len(data), dtype=dtype).view(type(data))
+            for name in data.dtype.names:
+                compacted[name] = columns.get(name, data[name])
+            self.resultstable.array = np.ma.array(
+                compacted, mask=np.ma.getmaskarray(array))
+        return self
+
     def __len__(self):
         """
         return the record count
@@ -692,6 +951,82 @@ class DALResults:
             yield out
             pos += 1
 
+    def iter_datasets(self, *, prefetch=2, to="memory", timeout=None):
+        """
+        iterates over the datasets of the records, downloading the next
+        ``prefetch`` datasets in the background while the current one is
+        processed.
+
+        The datasets are retrieved like with
+        :py:meth:`~pyvo.dal.Record.getdataset`.  At most ``prefetch`` + 1
+        datasets are held at a time.  When the iterator is closed (e.g.,
+        by leaving a loop over it early), downloads that have not started
+        are cancelled and running ones are abandoned.
+
+        Parameters
+        ----------
+        prefetch : int
+            the number of datasets to download ahead.  With 0, each
+            dataset is downloaded when it is due.
+        to : str
+            where to keep the downloaded datasets: ``"memory"`` or
+            ``"tempfile"``.  Temporary files are named with the extension
+            the record suggests and are deleted when closed.
+        timeout : float
+            the time in seconds to allow for a successful connection with
+            the server of each dataset.
+
+        Yields
+        ------
+        `DatasetDownload`
+            the record and its dataset, in record order.  Retrieval errors
+            do not stop the iteration; they are reported in the ``error``
+            attribute.
+        """
+        if to not in ("memory", "tempfile"):
+            raise ValueError(f"to must be 'memory' or 'tempfile', not {to!r}")
+        closed = threading.Event()
+
+        def download(record):
+            try:
+                if to == "memory":
+                    data = BytesIO()
+                else:
+                    data = tempfile.NamedTemporaryFile(
+                        suffix="." + record.suggest_extension(default="dat"))
+                try:
+                    inp = record.getdataset(timeout)
+                    try:
+                        while not closed.is_set():
+                            chunk = inp.read(524288)
+                            if not chunk:
+                                break
+                            data.write(chunk)
+                    finally:
+                        inp.close()
+                except BaseException:
+                    data.close()
+                    raise
+                if closed.is_set():
+                    # nobody is going to read this any more
+                    data.close()
+                    return None
+                data.seek(0)
+                return DatasetDownload(record, data, None)
+            except (DALServiceError, OSError, KeyError) as ex:
+                return DatasetDownload(record, None, ex)
+
+        # ordered_map only uses threads from two workers on; the extra one
+        # serves the download the consumer is waiting for
+        downloads = ordered_map(
+            download, self, max_workers=prefetch + 1, window=prefetch + 1)
+        try:
+            for item in downloads:
+                yield item
+        finally:
+            closed.set()
+            downloads.close()
+
     def broadcast_samp(self, *, client_name=None):
         """
         Broadcast the table to ``client_name`` via SAMP
@@ -709,6 +1044,299 @@ class DALResults:
         from .dbapi2 import Cursor
         return Cursor(self)
 
+    def _find_position_fieldnames(self):
+        """
+        returns the names of the RA and Dec columns holding the main
+        positions of the rows, or None if there are none.
+        """
+        def find(ucd_words, utype, name):
+            for field in self.fielddescs:
+                if ucd_words and field.ucd:
+                    words = {word.strip().lower() for word in field.ucd.split(";")}
+                    if set(ucd_words) <= words:
+                        return field.name
+                if utype and (field.utype or "").lower() == utype:
+                    return field.name
+                if name and field.name.lower() == name:
+                    return field.name
+
+        for ucd_words, utype, name in _POSITION_COLUMNS:
+            ra_name = find(ucd_words, utype, name)
+            if ra_name is None:
+                continue
+            dec_name = find(
+                ucd_words and tuple(_DEC_FOR_RA[word] for word in ucd_words),
+                utype and _DEC_FOR_RA[utype], name and _DEC_FOR_RA[name])
+            if dec_name is not None:
+                return ra_name, dec_name
+        return None
+
+    def _get_positions(self):
+        """
+        returns arrays of the RA and Dec of the rows in degrees, with NaNs
+        for missing positions.
+        """
+        names = self._find_position_fieldnames()
+        if names is None:
+            raise KeyError("No position columns found in the results")
+
+        positions = []
+        for name in names:
+            column = self.getcolumn(name)
+            values = np.ma.filled(np.ma.asarray(column, dtype=float), np.nan)
+            unit = self.getdesc(name).unit
+            # columns without a (usable) angle unit are taken as degrees
+            if unit is not None and unit != u.deg and unit.is_equivalent(u.deg):
+                values = (values * unit).to_value(u.deg)
+            positions.append(values)
+        return tuple(positions)
+
+    @property
+    def spatial_index(self):
+        """
+        a `~pyvo.utils.spatial.SpatialIndex` over the main positions of the
+        rows, built on first use.
+
+        The position columns are located by their UCDs (``pos.eq.ra`` and
+        ``pos.eq.dec``, preferably with ``meta.main``), their ObsCore
+        utypes or, failing that, their names.
+
+        Raises
+        ------
+        KeyError
+            if no position columns are found.
+        """
+        if getattr(self, "_spatial_index", None) is None:
+            self._spatial_index = SpatialIndex(*self._get_positions())
+        return self._spatial_index
+
+    def nearest(self, coords):
+        """
+        return the indices of the rows nearest to the given positions and
+        the distances to them.
+
+        Parameters
+        ----------
+        coords : astropy.coordinates.SkyCoord
+            the positions to look up.
+            converted if it's an array of shape (n, 2),
+            assuming icrs degrees.
+
+        Returns
+        -------
+        indices : `numpy.ndarray`
+            the row index of the nearest row for each position, -1 for
+            positions that are not finite.
+        separations : `~astropy.units.Quantity`
+            the distances to them, NaN for positions that are not finite.
+        """
+        ra, dec = _as_radec(coords)
+        indices, separations = self.spatial_index.nearest(ra, dec)
+        return indices, separations * u.deg
+
+    def within(self, coord, radius):
+        """
+        return the indices of the rows closer than radius to a position,
+        ordered by distance, and their distances.
+
+        Parameters
+        ----------
+        coord : astropy.coordinates.SkyCoord
+            the center of the circle.
+            converted if it's a pair of scalars, assuming icrs degrees.
+        radius : `~astropy.units.Quantity` or float
+            the radius of the circle, in degrees if not a Quantity.
+
+        Returns
+        -------
+        indices : `numpy.ndarray`
+            the row indices.
+        separations : `~astropy.units.Quantity`
+            their distances from coord.
+        """
+        (ra,), (dec,) = _as_radec(coord)
+        indices, separations = self.spatial_index.within(ra, dec, _as_degrees(radius))
+        return indices, separations * u.deg
+
+    def crossmatch(self, other, radius):
+        """
+        return all pairs of rows of these results and positions in other
+        closer than radius.
+
+        Parameters
+        ----------
+        other : `DALResults` or astropy.coordinates.SkyCoord
+            the positions to match against.  Arrays of shape (n, 2) are
+            taken as icrs degrees.
+        radius : `~astropy.units.Quantity` or float
+            the maximal distance of a pair, in degrees if not a Quantity.
+
+        Returns
+        -------
+        indices : `numpy.ndarray`
+            the row indices in these results.
+        other_indices : `numpy.ndarray`
+            the indices in other.
+        separations : `~astropy.units.Quantity`
+            the distances of the pairs.
+
+        The pairs are ordered by ``other_indices``, then by distance.
+        """
+        if isinstance(other, DALResults):
+            ra, dec = other._get_positions()
+        else:
+            ra, dec = _as_radec(other)
+        indices, other_indices, separations = self.spatial_index.crossmatch(
+            ra, dec, _as_degrees(radius))
+        return indices, other_indices, separations * u.deg
+
+
+def _read_only_table(resultstable):
+    """
+    returns an astropy table with the columns of the VOTable table
+    resultstable without copying them; the columns are made read-only.
+    """
+    global _table_conversions
+    array = resultstable.array
+
+    # the column names and metadata, as astropy makes them
+    template = copy.copy(resultstable)
+    template.array = array[:0]
+    described = template.to_table(use_names_over_ids=True)
+
+    table = Table(array, names=described.colnames, meta=described.meta, copy=False)
+    for name in table.colnames:
+        column, column_description = table[name], described[name]
+        column.unit = column_description.unit
+        column.description = column_description.description
+        column.format = column_description.format
+        column.meta = column_description.meta
+        column.flags.writeable = False
+        if np.ma.getmask(column) is not np.ma.nomask:
+            np.ma.getmask(column).flags.writeable = False
+
+    with _table_conversions_lock:
+        _table_conversions += 1
+    return table
+
+
+def _dictionary_encode(column):
+    """
+    returns the string column column as an object array referencing one
+    python object per distinct value, or None if this would not save
+    memory (or column does not hold strings).
+    """
+    if column.ndim != 1 or not len(column):
+        return None
+    if column.dtype.kind == "O":
+        if not all(isinstance(value, (str, bytes)) for value in column):
+            return None
+    elif column.dtype.kind not in "SU":
+        return None
+
+    values, inverse, counts = np.unique(
+        column, return_inverse=True, return_counts=True)
+    pool = np.empty(len(values), dtype=object)
+    pool[:] = values.tolist()
+    pool_size = sum(sys.getsizeof(value) for value in pool)
+
+    size = column.nbytes
+    if column.dtype.kind == "O":
+        if len({id(value) for value in column}) <= len(values):
+            # the values are shared already
+            return None
+        size += sum(sys.getsizeof(value) * count for value, count in zip(pool, counts))
+    if 8 * len(column) + pool_size >= size:
+        return None
+    return pool[inverse.reshape(-1)]
+
+
+def _downcast(column, field):
+    """
+    returns the numeric column column in the type its FIELD declares if
+    that is narrower than its current type and represents all its values
+    exactly, or None otherwise.
+    """
+    if column.ndim != 1 or column.dtype.kind not in "iuf":
+        return None
+    try:
+        dtype = np.dtype(field.converter.format)
+    except (AttributeError, TypeError):
+        return None
+    if dtype.kind != column.dtype.kind or dtype.itemsize >= column.dtype.itemsize:
+        return None
+
+    with np.errstate(over="ignore", invalid="ignore"):
+        narrowed = column.astype(dtype)
+    if not np.array_equal(narrowed, column, equal_nan=dtype.kind == "f"):
+        return None
+    return narrowed
+
+
+def _concatenate_results(results, *, unique_column=None, maxrec=None):
+    """
+    returns a new VOTableFile with the rows of all results, which must
+    have the same columns, and the metadata of the first results.
+
+    With unique_column, only the first row for each value of that column
+    is kept; rows with a null value there are all kept.  With maxrec,
+    only the first maxrec rows are kept.  The status is OVERFLOW if any
+    of results overflowed or rows were dropped for maxrec.
+    """
+    array = np.ma.concatenate([res.resultstable.array for res in results])
+    if unique_column in results[0].fieldnames:
+        nulls = np.ma.getmaskarray(array[unique_column])
+        values = np.flatnonzero(~nulls)
+        _, first_rows = np.unique(
+            np.ma.getdata(array[unique_column])[values], return_index=True)
+        keep = nulls.copy()
+        keep[values[first_rows]] = True
+        array = array[keep]
+    overflow = any(res.status[0].lower() == "overflow" for res in results)
+    if maxrec is not None and len(array) > maxrec:
+        array = array[:maxrec]
+        overflow = True
+
+    skeleton, arrays = split_votable(results[0].votable)
+    table_index = list(results[0].votable.iter_tables()).index(results[0].resultstable)
+    arrays[table_index] = (np.ma.getdata(array), np.ma.getmaskarray(array))
+    votable = join_votable(skeleton, arrays)
+
+    if overflow:
+        resource = results[0]._findresultsresource(votable)
+        status = results[0]._findstatusinfo(resource.infos)
+        if status is None:
+            status = Info(name="QUERY_STATUS", value="OVERFLOW")
+            resource.infos.append(status)
+        status.value = "OVERFLOW"
+    return votable
+
+
+def _as_radec(coords):
+    """
+    returns one-dimensional arrays of the ICRS RA and Dec in degrees of
+    coords, a SkyCoord or an array of shape (n, 2) in degrees.
+    """
+    if isinstance(coords, SkyCoord):
+        coords = coords.icrs
+        return (np.atleast_1d(coords.ra.deg).reshape(-1),
+                np.atleast_1d(coords.dec.deg).reshape(-1))
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    return coords[:, 0], coords[:, 1]
+
+
+def _as_degrees(angle):
+    """
+    returns angle in degrees, assuming degrees if it is not a Quantity.
+    """
+    if isinstance(angle, u.Quantity):
+        return angle.to_value(u.deg)
+    return float(angle)
+
+
+def _restore_record(results, index):
+    return results.getrecord(index)
+
 
 class Record(Mapping):
     """
@@ -729,6 +1357,12 @@ class Record(Mapping):
             )
         )
 
+    def __reduce__(self):
+        # records travel as their results and their index, so that a
+        # pickle of several records of the same results holds the rows
+        # only once.
+        return _restore_record, (self._results, self._index)
+
     def __getitem__(self, key):
         try:
             if key not in self._mapping:
@@ -802,14 +1436,29 @@ class Record(Mapping):
                 return out
         return None
 
+    def _get_publisher_did(self):
+        """
+        returns the publisher DID of the dataset described by this record,
+        or None if there is no column for it.
+        """
+        for fieldname in self._results.fieldnames:
+            field = self._results.getdesc(fieldname)
+            if (field.utype and "publisherdid" in field.utype.lower()) or (
+                    fieldname.lower() == "obs_publisher_did"):
+                out = self[fieldname]
+                if isinstance(out, bytes):
+                    out = out.decode('utf-8')
+                return out or None
+        return None
+
     def getdataobj(self):
         """
         return the appropriate data object suitable for the data content behind
         this record.
         """
-        return mime_object_maker(self.getdataurl(), self.getdataformat())
+        return mime_object_maker(
+            self.getdataurl(), self.getdataformat(), session=self._session)
 
-    @stream_decode_content
     def getdataset(self, timeout=None):
         """
         Get the dataset described by this record from the server.
@@ -840,6 +1489,23 @@ class Record(Mapping):
            (note: subclass of IOError)
         IOError
            if some other error occurs while establishing the data stream.
+
+        If a dataset cache is enabled (see
+        `~pyvo.dal.datasetcache.enable_dataset_cache`), the dataset is read
+        from there, after downloading it into the cache if it is not there
+        yet.
+        """
+        cache = get_dataset_cache()
+        if cache is None:
+            return self._fetch_dataset(timeout)
+        return cache.open_dataset(
+            cache.keys_for(self), lambda: self._fetch_dataset(timeout))
+
+    @stream_decode_content
+    def _fetch_dataset(self, timeout=None):
+        """
+        retrieves the dataset described by this record from the server
+        (see `getdataset`).
         """
         url = self.getdataurl()
         if not url:
@@ -894,6 +1560,10 @@ class Record(Mapping):
            (note: subclass of IOError)
         IOError
             if an error occurs while writing out the dataset
+
+        If a dataset cache is enabled (see
+        `~pyvo.dal.datasetcache.enable_dataset_cache`), the file is placed
+        from the cache, as a hard link where possible.
         """
         if not bufsize:
             bufsize = 524288
@@ -901,6 +1571,13 @@ class Record(Mapping):
         if not filename:
             filename = self.make_dataset_filename(dir=dir)
 
+        cache = get_dataset_cache()
+        if cache is not None:
+            # link or copy the cached file rather than writing a new one
+            cache.copy_to(
+                cache.keys_for(self), lambda: self._fetch_dataset(timeout), filename)
+            return
+
         inp = self.getdataset(timeout)
         try:
             with open(filename, 'wb') as out:
@@ -1098,7 +1775,7 @@ class Upload:
         elif isinstance(self._content, DALResults):
             fileobj = BytesIO()
 
-            table = self._content.to_table()
+            table = self._content.to_table(copy=False)
             table.write(output=fileobj, format="votable")
             fileobj.seek(0)
 
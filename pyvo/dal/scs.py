@@ -20,15 +20,20 @@ This module also features the SCSQuery class that provides an
 interface for building up and remembering a query.  The SCSService
 class can represent a specific service available at a URL endpoint.
 """
+import numpy as np
+
 from pyvo.io.vosi.vodataservice import TableParam
 
 from astropy.coordinates import SkyCoord
 from astropy.units import Unit, Quantity
+from astropy.io.votable import from_table
 from astropy.io.votable.tree import Field
-from astropy.table import Table
+from astropy.table import Table, vstack
 
 from .query import DALResults, DALQuery, DALService, Record
 from .adhoc import DatalinkResultsMixin, DatalinkRecordMixin
+from .exceptions import DALFormatError
+from ..utils.concurrency import DEFAULT_MAX_WORKERS, ordered_map
 
 __all__ = ["search", "SCSService", "SCSQuery", "SCSResults", "SCSRecord"]
 
@@ -185,6 +190,85 @@ class SCSService(DALService):
         """
         return self.create_query(pos=pos, radius=radius, verbosity=verbosity, **keywords).execute()
 
+    def search_many(
+            self, positions, radius=1.0, *, verbosity=2,
+            max_workers=DEFAULT_MAX_WORKERS, coalesce=True, **keywords):
+        """
+        submit cone search queries around a number of positions and
+        return the matches for all of them in one table.
+
+        The cones are queried concurrently.  Unless ``coalesce`` is False,
+        positions closer to each other than ``radius`` are queried with a
+        single larger cone, and the rows returned are matched to the
+        positions on the client side.
+
+        Parameters
+        ----------
+        positions : astropy.coordinates.SkyCoord
+            a SkyCoord array with the centers of the search regions.
+            converted if it's an array of shape (n, 2),
+            assuming icrs degrees.
+        radius : `~astropy.units.Quantity` or float
+            a Quantity instance defining the radius of the circular search
+            regions, in degrees.
+            converted if it is another unit.
+        verbosity : int
+           an integer value that indicates the volume of columns
+           to return in the result table.  0 means the minimum
+           set of columns, 3 means as many columns as are available.
+        max_workers : int
+            the maximum number of queries in flight at the same time.
+        coalesce : bool
+            False to send one query per position.
+        **keywords :
+           additional case insensitive parameters can be given via arbitrary
+           case insensitive keyword arguments. Where there is overlap
+           with the parameters set by the other arguments to
+           this function, these keywords will override.
+
+        Returns
+        -------
+        SCSResults
+            the matching catalog records of all positions, ordered by
+            position.  The ``input_index`` column gives the index of the
+            position a record matched; a record matching several positions
+            is repeated for each of them.
+
+        Raises
+        ------
+        DALServiceError
+           for errors connecting to or communicating with the service
+        DALQueryError
+           if the service responds with an error,
+           including a query syntax error.
+        """
+        positions = _as_skycoord_array(positions)
+        if not len(positions):
+            raise ValueError("No positions given")
+        if not isinstance(radius, Quantity):
+            radius = radius * Unit("deg")
+
+        if coalesce:
+            cones = _coalesce_cones(positions, radius)
+        else:
+            cones = [(index, radius, [index]) for index in range(len(positions))]
+
+        def query(cone):
+            center, cone_radius, members = cone
+            results = self.search(
+                positions[center], cone_radius, verbosity=verbosity, **keywords)
+            table = results.to_table()
+            if len(members) == 1:
+                table["input_index"] = np.full(len(table), members[0])
+                return table
+            return _match_members(results, table, positions[members], members, radius)
+
+        merged = vstack(
+            list(ordered_map(query, cones, max_workers=max_workers)),
+            metadata_conflicts="silent")
+        merged = merged[np.argsort(merged["input_index"], kind="stable")]
+        return SCSResults(from_table(merged), url=self.baseurl, session=self._session)
+
     def create_query(self, pos=None, radius=None, *, verbosity=None, **keywords):
         """
         create a query object that constraints can be added to and then
@@ -253,6 +337,100 @@ class SCSService(DALService):
             max_lines=-1, max_width=-1, show_unit=False, show_dtype=False)
 
 
+def _as_skycoord_array(positions):
+    """
+    returns positions as a one-dimensional SkyCoord in ICRS.
+    """
+    if isinstance(positions, SkyCoord):
+        return positions.icrs.reshape(-1)
+
+    positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+    return SkyCoord(
+        ra=positions[:, 0], dec=positions[:, 1], unit="deg", frame="icrs")
+
+
+def _unit_vectors(coords):
+    """
+    returns the cartesian unit vectors of coords as an (n, 3) array.
+    """
+    return coords.cartesian.xyz.value.T
+
+
+def _coalesce_cones(positions, radius):
+    """
+    returns a list of (center index, radius, member indices) cones covering
+    the cones of the given radius around positions.
+
+    Going through the positions in order, each position not yet covered
+    becomes the center of a cone also taking in all uncovered positions
+    closer than radius; that cone is then enlarged to contain all their
+    cones.
+    """
+    if len(positions) < 2 or radius <= 0:
+        return [(index, radius, [index]) for index in range(len(positions))]
+
+    vectors = _unit_vectors(positions)
+    min_cos = np.cos(radius.to_value(Unit("rad")))
+    # candidates for neighbours are found in a declination band
+    dec = positions.dec.deg
+    by_dec = np.argsort(dec, kind="stable")
+    sorted_dec = dec[by_dec]
+    radius_deg = radius.to_value(Unit("deg"))
+
+    cones = []
+    covered = np.zeros(len(positions), dtype=bool)
+    for center in range(len(positions)):
+        if covered[center]:
+            continue
+        low = np.searchsorted(sorted_dec, dec[center] - radius_deg, side="left")
+        high = np.searchsorted(sorted_dec, dec[center] + radius_deg, side="right")
+        candidates = by_dec[low:high]
+        candidates = candidates[~covered[candidates]]
+        cos_sep = vectors[candidates] @ vectors[center]
+        within = cos_sep >= min_cos
+        # union1d sorts, and makes sure rounding does not lose the center
+        members = np.union1d(candidates[within], [center])
+        covered[members] = True
+
+        if len(members) <= 1:
+            cones.append((center, radius, [center]))
+        else:
+            max_sep = np.arccos(np.clip(cos_sep[within].min(), -1, 1))
+            cones.append((center, radius + max_sep * Unit("rad"), members.tolist()))
+    return cones
+
+
+def _match_members(results, table, member_positions, members, radius):
+    """
+    returns the rows of table (made from results) within radius of any
+    of member_positions, with an input_index column giving the matching
+    member.
+    """
+    ra_name = results.fieldname_with_ucd("POS_EQ_RA_MAIN")
+    dec_name = results.fieldname_with_ucd("POS_EQ_DEC_MAIN")
+    if ra_name is None or dec_name is None:
+        raise DALFormatError(
+            reason="Cannot match coalesced cones without POS_EQ_RA_MAIN "
+            "and POS_EQ_DEC_MAIN columns", url=results.queryurl)
+
+    table["input_index"] = np.zeros(len(table), dtype=int)
+    if not len(table):
+        return table
+
+    row_positions = SkyCoord(
+        ra=np.ma.getdata(results.getcolumn(ra_name)),
+        dec=np.ma.getdata(results.getcolumn(dec_name)),
+        unit="deg", frame="icrs")
+    cos_sep = _unit_vectors(member_positions) @ _unit_vectors(row_positions).T
+    # the indices come out ordered by member, then by row
+    matched_members, rows = np.nonzero(
+        cos_sep >= np.cos(radius.to_value(Unit("rad"))))
+
+    table = table[rows]
+    table["input_index"] = np.asarray(members)[matched_members]
+    return table
+
+
 class SCSQuery(DALQuery):
     """
     a class for preparing a query to a Cone Search service.  Query constraints
@@ -0,0 +1,317 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Compact serialization of DAL results for pickling and for passing them
+to other processes through shared memory.
+
+A VOTable is split into a skeleton, i.e., the VOTable XML without any
+table rows, and the record arrays of its tables.  The skeleton is small,
+and the arrays are passed as flat binary buffers, which is much cheaper
+than pickling the object graph of the parsed VOTable.
+"""
+import collections
+import copy
+import multiprocessing
+import os
+import sys
+import warnings
+from io import BytesIO
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from astropy.io.votable import parse as votableparse
+from astropy.io.votable.tree import HomogeneousList, Resource, TableElement
+
+from .exceptions import DALOverflowWarning
+
+__all__ = ["SharedResults"]
+
+# offsets of the arrays in shared memory are multiples of this
+_ALIGNMENT = 64
+
+# an array in shared memory
+_Block = collections.namedtuple("_Block", ["offset", "dtype", "shape"])
+# a column of python strings (str or bytes, as given by type) in shared
+# memory, as the blocks of the offsets of the strings in content and of
+# their encoded content
+_Strings = collections.namedtuple("_Strings", ["type", "offsets", "content"])
+# a record array with python objects: the block of its other fields, if
+# any, and its object columns as _Strings or, where they hold other
+# objects, as the column itself
+_Record = collections.namedtuple("_Record", ["dtype", "length", "plain", "columns"])
+
+
+def _strip_tables(element, root=None):
+    """
+    returns a shallow copy of a VOTableFile or Resource element in which
+    all tables are replaced by copies without rows.
+    """
+    stripped = copy.copy(element)
+    if root is None:
+        root = stripped
+    if isinstance(element, Resource):
+        tables = HomogeneousList(TableElement)
+        for table in element.tables:
+            empty = copy.copy(table)
+            empty.array = table.array[:0]
+            empty._votable = root
+            tables.append(empty)
+        stripped._tables = tables
+
+    resources = HomogeneousList(Resource)
+    for resource in element.resources:
+        resources.append(_strip_tables(resource, root))
+    stripped._resources = resources
+    return stripped
+
+
+def split_votable(votable):
+    """
+    returns the VOTable XML of votable without table rows and the record
+    arrays of its tables (in the order of ``iter_tables``).
+
+    Each array is given as a pair of its data and its mask; the mask is
+    None if no value is masked.
+    """
+    out = BytesIO()
+    _strip_tables(votable).to_xml(out)
+
+    arrays = []
+    for table in votable.iter_tables():
+        mask = np.ma.getmask(table.array)
+        if mask is np.ma.nomask or not _any_masked(mask):
+            mask = None
+        arrays.append((np.ma.getdata(table.array), mask))
+    return out.getvalue(), arrays
+
+
+def _any_masked(mask):
+    """
+    returns True if any element of a (possibly structured) mask is set.
+    """
+    if mask.dtype.names is None:
+        return bool(mask.any())
+    return any(_any_masked(mask[name]) for name in mask.dtype.names)
+
+
+def join_votable(skeleton, arrays):
+    """
+    returns the VOTableFile split by `split_votable`.
+    """
+    votable = votableparse(BytesIO(skeleton), verify="ignore")
+    for table, (data, mask) in zip(votable.iter_tables(), arrays):
+        if mask is None:
+            mask = np.zeros(data.shape, dtype=np.ma.make_mask_descr(data.dtype))
+        table.array = np.ma.array(data, mask=mask)
+    return votable
+
+
+def restore_results(cls, skeleton, arrays, kwargs, state):
+    """
+    returns an instance of the results class cls for the split VOTable.
+
+    This is what pickled results are unpickled with.  Warnings on the
+    result status, e.g., an overflow, have been issued when the results
+    were made and are not repeated.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DALOverflowWarning)
+        results = cls(join_votable(skeleton, arrays), **kwargs)
+    results.__dict__.update(state)
+    return results
+
+
+class SharedResults:
+    """
+    DAL results placed in shared memory.
+
+    Pickling a `SharedResults` instance only pickles the name of the
+    shared memory block and the table metadata, so passing it to other
+    processes (e.g., workers of a `concurrent.futures.ProcessPoolExecutor`)
+    is cheap regardless of the size of the results.  Call `load` there
+    to get the results back.  Columns of variable-length strings are
+    placed in shared memory as well, as their encoded content and the
+    offsets of the strings in it; only columns of other python objects
+    (e.g., variable-length arrays) are pickled.
+
+    The process that created the instance owns the shared memory; it
+    must call `unlink` (or use the instance as a context manager) once
+    the other processes are done with it.  Instances are usually obtained
+    from `~pyvo.dal.DALResults.to_shared_memory`.
+
+    Before Python 3.13, attaching to shared memory registers it with the
+    resource tracker of the process, which unlinks it when the process
+    exits.  Processes started by `multiprocessing` share the tracker of
+    their parent, so this does not matter for them; other processes
+    unregister the shared memory again after attaching to it.
+
+    Parameters
+    ----------
+    results : `~pyvo.dal.DALResults`
+        the results to share.
+    """
+    def __init__(self, results):
+        self._cls = type(results)
+        self._kwargs, self._state = results._pickle_state()
+        self._skeleton, arrays = split_votable(results.votable)
+        self._pid = os.getpid()
+
+        # the layout is, for each table, the spec of its data and its
+        # mask: a _Block or a _Record, or the array itself where it cannot
+        # be put into shared memory.
+        self._size, pending = 0, []
+        self._layout = [
+            [self._plan(array, pending) for array in (data, mask)]
+            for data, mask in arrays]
+
+        self._shm = shared_memory.SharedMemory(create=True, size=max(self._size, 1))
+        self._owner = True
+        for block, array, names in pending:
+            view = self._view(block)
+            if names is None:
+                view[...] = array
+            else:
+                for name in names:
+                    view[name] = array[name]
+
+    def _block(self, dtype, shape, pending, array, names=None):
+        """
+        returns a _Block for an array of dtype and shape, scheduling the
+        fields names (all if None) of array to be written there.
+        """
+        block = _Block(self._size, dtype, shape)
+        self._size += -(-dtype.itemsize * int(np.prod(shape)) // _ALIGNMENT) * _ALIGNMENT
+        pending.append((block, array, names))
+        return block
+
+    def _plan(self, array, pending):
+        """
+        returns the spec of array in shared memory, scheduling what is to
+        be written there in pending.
+        """
+        if array is None:
+            return None
+        if not array.dtype.hasobject:
+            return self._block(array.dtype, array.shape, pending, array)
+        if array.dtype.names is None or array.ndim != 1:
+            return array
+
+        objects = [name for name in array.dtype.names if array.dtype[name].hasobject]
+        plain = [name for name in array.dtype.names if name not in objects]
+        plain_block = None
+        if plain:
+            plain_dtype = np.dtype([(name, array.dtype[name]) for name in plain])
+            plain_block = self._block(plain_dtype, array.shape, pending, array, plain)
+        columns = {name: self._plan_strings(array[name], pending) for name in objects}
+        return _Record(array.dtype, len(array), plain_block, columns)
+
+    def _plan_strings(self, column, pending):
+        """
+        returns the _Strings spec of a column of python strings, or the
+        column itself if it holds other objects.
+        """
+        values = column.tolist()
+        types = {type(value) for value in values}
+        if types == {str}:
+            values = [value.encode("utf-8", "surrogatepass") for value in values]
+        elif types and types != {bytes}:
+            return column
+
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, values), dtype=np.int64, count=len(values)),
+                  out=offsets[1:])
+        content = np.frombuffer(b"".join(values), dtype=np.uint8)
+        return _Strings(
+            str if str in types else bytes,
+            self._block(offsets.dtype, offsets.shape, pending, offsets),
+            self._block(content.dtype, content.shape, pending, content))
+
+    def _view(self, block):
+        return np.ndarray(block.shape, dtype=block.dtype, buffer=self._shm.buf,
+                          offset=block.offset)
+
+    def _load(self, spec):
+        """
+        returns a copy of the array with spec out of shared memory.
+        """
+        if isinstance(spec, _Block):
+            return self._view(spec).copy()
+        if not isinstance(spec, _Record):
+            return spec
+
+        array = np.empty(spec.length, dtype=spec.dtype)
+        if spec.plain is not None:
+            plain = self._view(spec.plain)
+            for name in spec.plain.dtype.names:
+                array[name] = plain[name]
+        for name, column in spec.columns.items():
+            array[name] = self._load_strings(column)
+        return array
+
+    def _load_strings(self, spec):
+        if not isinstance(spec, _Strings):
+            return spec
+        offsets = self._view(spec.offsets).tolist()
+        content = self._view(spec.content).tobytes()
+        values = [content[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+        if spec.type is str:
+            values = [value.decode("utf-8", "surrogatepass") for value in values]
+        column = np.empty(len(values), dtype=object)
+        column[:] = values
+        return column
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shm"] = self._shm.name
+        state["_owner"] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        name = self._shm
+        if sys.version_info >= (3, 13):
+            self._shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            if multiprocessing.parent_process() is None and os.getpid() != self._pid:
+                # the resource tracker of this process would unlink it
+                resource_tracker.unregister(self._shm._name, "shared_memory")
+
+    @property
+    def name(self):
+        """
+        the name of the shared memory block.
+        """
+        return self._shm.name
+
+    def load(self):
+        """
+        returns a copy of the shared results.
+
+        The table rows are copied out of shared memory, so the results
+        remain valid after the shared memory is released.
+        """
+        arrays = [tuple(self._load(spec) for spec in entry) for entry in self._layout]
+        return restore_results(
+            self._cls, self._skeleton, arrays, self._kwargs, self._state)
+
+    def close(self):
+        """
+        detaches this process from the shared memory.
+        """
+        self._shm.close()
+
+    def unlink(self):
+        """
+        releases the shared memory.  Only the owning process should call
+        this.
+        """
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.unlink()
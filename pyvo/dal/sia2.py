@@ -18,12 +18,14 @@ from astropy.time import Time
 from astropy.utils.decorators import deprecated
 from astropy.utils.exceptions import AstropyDeprecationWarning
 
-from .query import DALResults, DALQuery, DALService, Record
+from .query import (DALResults, DALQuery, DALService, Record, MAX_GET_URL_LENGTH,
+                    _concatenate_results)
 from .adhoc import DatalinkResultsMixin, AxisParamMixin, SodaRecordMixin, DatalinkRecordMixin
 from .exceptions import DALServiceError
 from .params import IntervalQueryParam, StrQueryParam, EnumQueryParam
 from .vosi import AvailabilityMixin, CapabilityMixin
 from ..dam import ObsCoreMetadata, CALIBRATION_LEVELS
+from ..utils.concurrency import DEFAULT_MAX_WORKERS, ordered_map
 
 
 __all__ = ["search", "SIA2Service", "SIA2Query", "SIA2Results", "ObsCoreRecord"]
@@ -41,11 +43,18 @@ pos : single or list of tuples
     (long1, long2, lat1, lat2) - for RANGE (angle units required)
     (ra, dec, ra, dec, ra, dec ... ) ra/dec points for POLYGON all
     in angle units
+    Many regions can also be given as a 2-D array or Quantity with one
+    region per row, or as a tuple of a `~astropy.coordinates.SkyCoord`
+    array and one radius or an array of radii for CIRCLEs.
 band : scalar, tuple(interval) or list of tuples
     (spectral units (default: meter)
     the energy interval(s) to be searched for data.
+    Many intervals can also be given as an (n, 2) array or Quantity;
+    this also holds for the other interval parameters below.
 time : single or list of `~astropy.time.Time` or compatible strings
     the time interval(s) to be searched for data.
+    A `~astropy.time.Time` array gives one instant per element, or, with
+    shape (n, 2), one interval per row.
 pol : single or list of str from ``pyvo.dam.obscore.POLARIZATION_STATES``
     the polarization state(s) to be searched for data.
 field_of_view : single or list of tuples
@@ -147,6 +156,15 @@ def _tolist(value):
     return [value]
 
 
+def _add_values(param, value):
+    # adds a value, a list of values or an array of values to param;
+    # arrays are validated and formatted in one go
+    if param.is_array(value):
+        param.update(value)
+    else:
+        param.update(_tolist(value))
+
+
 class SIA2Service(DALService, AvailabilityMixin, CapabilityMixin):
     """
     a representation of an SIA2 service
@@ -235,7 +253,12 @@ class SIA2Query(DALQuery, AxisParamMixin):
     """
     a class very similar to :py:attr:`~pyvo.dal.SIAQuery` class but
     used to interact with SIA2 services.
+
+    Queries with many values that would not fit into a GET request are
+    split into several queries when executed (see
+    :py:meth:`~pyvo.dal.DALQuery.split`).
     """
+    max_get_url_length = MAX_GET_URL_LENGTH
 
     def __init__(self, url, pos=None, *, band=None, time=None, pol=None,
                  field_of_view=None, spatial_resolution=None,
@@ -289,32 +312,24 @@ class SIA2Query(DALQuery, AxisParamMixin):
         """
         super().__init__(url, session=session)
 
-        for pp in _tolist(pos):
-            self.pos.add(pp)
+        _add_values(self.pos, pos)
 
-        for bb in _tolist(band):
-            self.band.add(bb)
+        _add_values(self.band, band)
 
-        for tt in _tolist(time):
-            self.time.add(tt)
+        _add_values(self.time, time)
 
         for pp in _tolist(pol):
             self.pol.add(pp)
 
-        for ff in _tolist(field_of_view):
-            self.field_of_view.add(ff)
+        _add_values(self.field_of_view, field_of_view)
 
-        for sp in _tolist(spatial_resolution):
-            self.spatial_resolution.add(sp)
+        _add_values(self.spatial_resolution, spatial_resolution)
 
-        for sr in _tolist(spectral_resolving_power):
-            self.spectral_resolving_power.add(sr)
+        _add_values(self.spectral_resolving_power, spectral_resolving_power)
 
-        for et in _tolist(exptime):
-            self.exptime.add(et)
+        _add_values(self.exptime, exptime)
 
-        for tr in _tolist(timeres):
-            self.timeres.add(tr)
+        _add_values(self.timeres, timeres)
 
         for ii in _tolist(publisher_did):
             self.publisher_did.add(ii)
@@ -460,10 +475,16 @@ class SIA2Query(DALQuery, AxisParamMixin):
         self._maxrec = val
         self['MAXREC'] = str(val)
 
-    def execute(self):
+    def execute(self, *, max_workers=DEFAULT_MAX_WORKERS):
         """
         submit the query and return the results as a SIA2Results instance
 
+        If the query is too long for a GET request, it is split into
+        several queries, which are run with up to ``max_workers`` of them
+        in flight at a time.  Their results are merged, keeping only the
+        first row for each ``obs_publisher_did``; if this leaves more than
+        maxrec rows, the rest is dropped and the status is OVERFLOW.
+
         Raises
         ------
         DALServiceError
@@ -474,7 +495,20 @@ class SIA2Query(DALQuery, AxisParamMixin):
         DALFormatError
            for errors parsing the VOTable response
         """
-        result = SIA2Results(self.execute_votable(), url=self.queryurl, session=self._session)
+        queries = self.split()
+        if len(queries) == 1:
+            result = SIA2Results(self.execute_votable(), url=self.queryurl, session=self._session)
+            result.check_overflow_warning(self._maxrec)
+            return result
+
+        def execute_part(query):
+            # overflows of the parts are reported with the merged results
+            return SIA2Results(query.execute_votable(), url=query.queryurl, session=self._session)
+
+        votable = _concatenate_results(
+            list(ordered_map(execute_part, queries, max_workers=max_workers)),
+            unique_column="obs_publisher_did", maxrec=self._maxrec)
+        result = SIA2Results(votable, url=self.queryurl, session=self._session)
         result.check_overflow_warning(self._maxrec)
         return result
 
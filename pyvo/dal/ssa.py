@@ -30,6 +30,7 @@ The SSAService class can represent a specific service available at a URL
 endpoint.
 """
 import re
+from io import BytesIO
 
 from pyvo.io.vosi.vodataservice import TableParam
 
@@ -37,6 +38,8 @@ from astropy.coordinates import SkyCoord
 from astropy.time import Time
 from astropy.units import Quantity, Unit
 from astropy.units import spectral as spectral_equivalencies
+from astropy.io import fits
+from astropy.io.votable import parse as votableparse
 from astropy.io.votable.tree import Field
 from astropy.table import Table
 import numpy as np
@@ -44,10 +47,19 @@ import numpy as np
 from .query import DALResults, DALQuery, DALService, Record
 from .mimetype import mime2extension
 from .adhoc import DatalinkResultsMixin, DatalinkRecordMixin, SodaRecordMixin
+from .exceptions import DALServiceError
 
 from .. import samp
+from ..utils.concurrency import DEFAULT_MAX_WORKERS, ordered_map
 
-__all__ = ["search", "SSAService", "SSAQuery", "SSAResults", "SSARecord"]
+__all__ = ["search", "SSAService", "SSAQuery", "SSAResults", "SSARecord",
+           "SpectrumStack"]
+
+# column names (lowercased) taken as the spectral and flux axes of a
+# spectrum when neither utypes nor UCDs identify them
+_SPECTRAL_NAMES = {"spectral", "wave", "wavelength", "lambda", "freq",
+                   "frequency", "energy"}
+_FLUX_NAMES = {"flux", "flux_density", "intensity", "counts"}
 
 
 def search(
@@ -648,6 +660,242 @@ class SSAResults(DatalinkResultsMixin, DALResults):
         """
         return SSARecord(self, index, session=self._session)
 
+    def fetch_spectra(self, *, max_workers=DEFAULT_MAX_WORKERS, dtype=np.float64,
+                      timeout=None):
+        """
+        retrieve the spectra of all records concurrently and stack them
+        into 2-D arrays.
+
+        Spectra in VOTable format (following the Spectrum data model
+        where it is used) and FITS spectra (binary tables, or
+        one-dimensional images with a linear spectral WCS) are
+        understood.  All spectra are converted to the units of the first
+        one retrieved.
+
+        Parameters
+        ----------
+        max_workers : int
+            the maximum number of concurrent downloads.
+        dtype : data-type
+            the data type of the stacked arrays; a narrower type such as
+            ``numpy.float32`` halves the memory needed.
+        timeout : float
+            the time in seconds to allow for connecting to the server of
+            each spectrum.
+
+        Returns
+        -------
+        SpectrumStack
+            the spectra, in the order of the records.  A spectrum that
+            could not be retrieved, parsed or converted has length 0, and
+            the exception is in the ``errors`` attribute.
+        """
+        def fetch(record):
+            try:
+                stream = record.getdataset(timeout=timeout)
+                try:
+                    content = stream.read()
+                finally:
+                    stream.close()
+                return _parse_spectrum(content)
+            except (DALServiceError, OSError, ValueError, KeyError) as ex:
+                return ex
+
+        return SpectrumStack._from_spectra(
+            list(ordered_map(fetch, self, max_workers=max_workers)), dtype)
+
+
+class SpectrumStack:
+    """
+    A set of spectra stacked into 2-D arrays, as returned by
+    :py:meth:`~pyvo.dal.ssa.SSAResults.fetch_spectra`.
+
+    Each row of ``spectral`` and ``flux`` holds one spectrum, padded beyond
+    its length with NaN (or with zeros for integer data types).
+
+    Indexing a ``SpectrumStack`` with an integer returns the spectral and
+    flux values of that spectrum as quantities.
+
+    Attributes
+    ----------
+    spectral : `numpy.ndarray`
+        the spectral coordinates of the spectra.
+    flux : `numpy.ndarray`
+        the flux values of the spectra.
+    lengths : `numpy.ndarray`
+        the number of points of each spectrum.
+    spectral_unit : `~astropy.units.UnitBase` or None
+        the unit of ``spectral``.
+    flux_unit : `~astropy.units.UnitBase` or None
+        the unit of ``flux``.
+    errors : list
+        for each spectrum, the exception that kept it from being
+        retrieved, or None.
+    """
+    def __init__(self, spectral, flux, lengths, *, spectral_unit=None,
+                 flux_unit=None, errors=None):
+        self.spectral = spectral
+        self.flux = flux
+        self.lengths = lengths
+        self.spectral_unit = spectral_unit
+        self.flux_unit = flux_unit
+        self.errors = errors if errors is not None else [None] * len(lengths)
+
+    @classmethod
+    def _from_spectra(cls, spectra, dtype):
+        """
+        stacks a list of (spectral, flux, spectral_unit, flux_unit) tuples
+        or exceptions.
+        """
+        spectral_unit = flux_unit = None
+        for spectrum in spectra:
+            if not isinstance(spectrum, Exception):
+                _, _, spectral_unit, flux_unit = spectrum
+                break
+
+        errors, converted = [], []
+        for spectrum in spectra:
+            if not isinstance(spectrum, Exception):
+                try:
+                    spectrum = (
+                        _convert(spectrum[0], spectrum[2], spectral_unit,
+                                 spectral_equivalencies()),
+                        _convert(spectrum[1], spectrum[3], flux_unit, []))
+                except ValueError as ex:
+                    spectrum = ex
+
+            if isinstance(spectrum, Exception):
+                errors.append(spectrum)
+                converted.append((np.zeros(0), np.zeros(0)))
+            else:
+                errors.append(None)
+                converted.append(spectrum)
+
+        dtype = np.dtype(dtype)
+        lengths = np.array([len(flux) for _, flux in converted], dtype=int)
+        shape = (len(converted), lengths.max(initial=0))
+        fill = np.nan if dtype.kind in "fc" else 0
+        spectral = np.full(shape, fill, dtype=dtype)
+        flux = np.full(shape, fill, dtype=dtype)
+        for row, (spectrum_spectral, spectrum_flux) in enumerate(converted):
+            spectral[row, :lengths[row]] = spectrum_spectral
+            flux[row, :lengths[row]] = spectrum_flux
+
+        return cls(spectral, flux, lengths, spectral_unit=spectral_unit,
+                   flux_unit=flux_unit, errors=errors)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, index):
+        length = self.lengths[index]
+        return (Quantity(self.spectral[index, :length], self.spectral_unit),
+                Quantity(self.flux[index, :length], self.flux_unit))
+
+
+def _convert(values, unit, target_unit, equivalencies):
+    """
+    returns values in unit converted to target_unit.
+    """
+    if unit == target_unit:
+        return values
+    if unit is None or target_unit is None:
+        raise ValueError(f"Cannot convert spectrum values in {unit} to {target_unit}")
+    return (values * unit).to_value(target_unit, equivalencies=equivalencies)
+
+
+def _as_unit(unit):
+    """
+    returns unit as an astropy unit, or None if there is none.
+    """
+    if not unit:
+        return None
+    return Unit(str(unit), parse_strict="silent")
+
+
+def _find_spectrum_columns(columns):
+    """
+    returns the indices of the spectral and the flux column among columns,
+    a list of (name, utype, ucd) tuples.
+
+    Utypes from the Spectrum data model are preferred over UCDs, which are
+    preferred over well-known column names.
+    """
+    def find(utype_part, ucd_prefixes, names):
+        for index, (_, utype, _) in enumerate(columns):
+            if utype and utype_part in utype.lower():
+                return index
+        for index, (_, _, ucd) in enumerate(columns):
+            if ucd and ucd.lower().startswith(ucd_prefixes):
+                return index
+        for index, (name, _, _) in enumerate(columns):
+            if name and name.lower() in names:
+                return index
+        return None
+
+    spectral = find("spectralaxis.value", ("em.wl", "em.freq", "em.energy", "em.wavenumber"),
+                    _SPECTRAL_NAMES)
+    flux = find("fluxaxis.value", ("phot.flux", "phot.count", "phot.mag"), _FLUX_NAMES)
+    if spectral is None or flux is None:
+        raise ValueError("No spectral and flux columns found in spectrum")
+    return spectral, flux
+
+
+def _parse_votable_spectrum(content):
+    table = votableparse(BytesIO(content), verify="ignore").get_first_table()
+    spectral, flux = _find_spectrum_columns(
+        [(field.name, field.utype, field.ucd) for field in table.fields])
+    names = table.array.dtype.names
+    return (
+        np.ravel(np.ma.filled(table.array[names[spectral]].astype(float), np.nan)),
+        np.ravel(np.ma.filled(table.array[names[flux]].astype(float), np.nan)),
+        _as_unit(table.fields[spectral].unit),
+        _as_unit(table.fields[flux].unit))
+
+
+def _parse_fits_spectrum(content):
+    with fits.open(BytesIO(content)) as hdus:
+        for hdu in hdus:
+            if isinstance(hdu, (fits.BinTableHDU, fits.TableHDU)) and hdu.data is not None:
+                header = hdu.header
+                spectral, flux = _find_spectrum_columns([
+                    (column.name, header.get(f"TUTYP{index}"), header.get(f"TUCD{index}"))
+                    for index, column in enumerate(hdu.columns, 1)])
+                return (
+                    np.ravel(hdu.data.field(spectral)).astype(float),
+                    np.ravel(hdu.data.field(flux)).astype(float),
+                    _as_unit(hdu.columns[spectral].unit),
+                    _as_unit(hdu.columns[flux].unit))
+
+        for hdu in hdus:
+            if hdu.is_image and hdu.data is not None and hdu.data.squeeze().ndim == 1:
+                header = hdu.header
+                flux = hdu.data.squeeze().astype(float)
+                step = header.get("CDELT1", header.get("CD1_1", 1))
+                spectral = header.get("CRVAL1", 0) + (
+                    np.arange(1, len(flux) + 1) - header.get("CRPIX1", 1)) * step
+                return (spectral, flux, _as_unit(header.get("CUNIT1")),
+                        _as_unit(header.get("BUNIT")))
+
+    raise ValueError("No spectrum found in FITS file")
+
+
+def _parse_spectrum(content):
+    """
+    parses a spectrum in VOTable or FITS format.
+
+    Returns
+    -------
+    tuple
+        the spectral and the flux values as float arrays, and their units
+        (or None).
+    """
+    if content.startswith(b"SIMPLE"):
+        return _parse_fits_spectrum(content)
+    if b"<VOTABLE" in content[:2048]:
+        return _parse_votable_spectrum(content)
+    raise ValueError("Unrecognized spectrum format")
+
 
 class SSARecord(SodaRecordMixin, DatalinkRecordMixin, Record):
     """
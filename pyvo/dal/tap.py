@@ -2,35 +2,52 @@
 """
 A module for accessing remote source and observation catalogs
 """
+from collections import namedtuple
+from concurrent import futures
 from functools import partial
 from datetime import datetime
+from io import BytesIO
+import hashlib
+import json
+import math
 import time
 from time import sleep
 import random
 
+import numpy as np
 import requests
 from urllib.parse import urlparse, urljoin
 
-from astropy.io.votable import parse as votableparse
+from astropy.io.votable import from_table
+from astropy.table import MaskedColumn, Table, vstack
+from astropy.time import Time
+from astropy import units as u
 
 from .query import (
     DALResults, DALQuery, DALService, Record, UploadList,
     DALServiceError, DALQueryError)
+from .exceptions import DALRateLimitError
 from .vosi import AvailabilityMixin, CapabilityMixin, VOSITables
 from .adhoc import DatalinkResultsMixin, DatalinkRecordMixin, SodaRecordMixin
+from .adql import add_condition, make_literal, tokenize
+from .incremental import IncrementalStore, schema_fingerprint
+from .jobjournal import get_job_journal
+from .localquery import get_local_query_cache
 
 from ..io import vosi, uws
 from ..io.vosi import tapregext as tr
+from ..io.votable import parse as parse_votable
 
+from ..utils.concurrency import DEFAULT_MAX_WORKERS, ordered_map
 from ..utils.formatting import para_format_desc
-from ..utils.http import use_session
+from ..utils.http import single_flight, use_session
 from ..utils.prototype import prototype_feature
 import xml.etree.ElementTree
 import io
 
 __all__ = [
     "search", "escape", "TAPService", "TAPQuery", "AsyncTAPJob", "TAPResults",
-    "DEFAULT_JOB_POLL_TIMEOUT", "DEFAULT_JOB_WAIT_TIMEOUT"]
+    "TAPPipeline", "TAPPipelineStage", "UploadPlan", "DEFAULT_JOB_POLL_TIMEOUT", "DEFAULT_JOB_WAIT_TIMEOUT"]
 
 IVOA_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 
@@ -52,6 +69,220 @@ DEFAULT_JOB_POLL_TIMEOUT = 10
 # Default timeout (in seconds) for overall job wait.
 DEFAULT_JOB_WAIT_TIMEOUT = 600.
 
+# the fraction of a byte upload limit chunks are planned to fill, leaving
+# room for the uncertainty of the estimate
+UPLOAD_LIMIT_FILL = 0.9
+
+# the number of keys TAPService.lookup puts into the IN list of a query
+LOOKUP_BATCH_SIZE = 500
+
+# the number of keys above which TAPService.lookup uploads the keys
+# rather than writing them into queries, if the service supports uploads
+LOOKUP_UPLOAD_THRESHOLD = 5000
+
+# the time (in seconds) the results of a completed job must still be kept
+# on the service for the job to be reused
+JOB_REUSE_MARGIN = 600
+
+# the number of recent completed jobs on the service examined for reuse
+JOB_REUSE_CANDIDATES = 20
+
+UploadPlan = namedtuple(
+    "UploadPlan",
+    ["nrows", "chunk_rows", "nchunks", "chunk_bytes", "upload_bytes", "limit",
+     "seconds", "max_seconds"])
+UploadPlan.__doc__ = """
+How `TAPService.run_chunked_upload` splits a table, as returned by
+`TAPService.plan_chunked_upload`.
+
+``nrows`` is the number of rows of the table, which is uploaded in
+``nchunks`` chunks of ``chunk_rows`` rows.  ``chunk_bytes`` and
+``upload_bytes`` estimate the size of the VOTable of a full chunk and
+of all chunks together.  ``limit`` is the upload limit of the service
+(a `~pyvo.io.vosi.tapregext.DataLimit`) or None if it does not declare
+one.  ``seconds`` estimates the time for all chunks from the time
+given for one, and ``max_seconds`` bounds it by the execution duration
+limit of the service; both are None if unknown.
+"""
+
+
+def _as_table(table):
+    """
+    returns table (an astropy table or DAL results) as an astropy table.
+    """
+    if isinstance(table, DALResults):
+        return table.to_table(copy=False)
+    if isinstance(table, Table):
+        return table
+    raise TypeError(f"Cannot upload {type(table).__name__} in chunks")
+
+
+def _votable_size(table, sample_size=1000):
+    """
+    returns the size in bytes of the VOTable of table without rows and
+    the average size of a row, estimated from a sample of the rows.
+    """
+    def size(rows):
+        out = BytesIO()
+        rows.write(output=out, format="votable")
+        return len(out.getvalue())
+
+    overhead = size(table[:0])
+    if not len(table):
+        return overhead, 1
+    sample = table[np.unique(np.linspace(0, len(table) - 1, sample_size).astype(int))]
+    return overhead, max((size(sample) - overhead) / len(sample), 1)
+
+
+def _is_transient(error):
+    """
+    returns True if a query failing with error may succeed when retried.
+    """
+    if isinstance(error, TRANSIENT_ERRORS) or isinstance(error, DALRateLimitError):
+        return True
+    return isinstance(error, DALServiceError) and (error.code is None or error.code >= 500)
+
+
+def _key_value(value):
+    """
+    returns value (a key given to or returned by a service) as a python
+    object comparable with the other keys, or None for null values.
+    """
+    if value is None or value is np.ma.masked:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bytes):
+        value = value.decode("utf-8")
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _column_name(identifier):
+    """
+    returns the name of the result column for the ADQL column reference
+    identifier and whether the name is case sensitive.
+    """
+    token = tokenize(identifier)[-1]
+    if token.kind == "identifier":
+        return token.text[1:-1].replace('""', '"'), True
+    return token.text, False
+
+
+def _qualified(column):
+    """
+    returns the column name column qualified with the table alias ``t``.
+
+    Raises
+    ------
+    ValueError
+        if column is not a single regular or delimited identifier.
+    """
+    tokens = tokenize(column)
+    if len(tokens) != 1 or tokens[0].kind not in ("word", "identifier"):
+        raise ValueError(f"Not a column name of the table looked up in: {column!r}")
+    return f"t.{column}"
+
+
+def _find_column(table, identifier):
+    """
+    returns the name of the column of table that identifier refers to.
+    """
+    name, delimited = _column_name(identifier)
+    if name in table.colnames:
+        return name
+    if not delimited:
+        for colname in table.colnames:
+            if colname.lower() == name.lower():
+                return colname
+    raise DALQueryError(f"The results lack the column {identifier}")
+
+
+def _upload_digest(upload):
+    """
+    returns the sha256 digest of the content of an inline upload.
+    """
+    fileobj = upload.fileobj()
+    position = fileobj.tell()
+    content = fileobj.read()
+    if isinstance(fileobj, (BytesIO, io.StringIO)):
+        fileobj.seek(position)
+    else:
+        fileobj.close()
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+def _request_digest(tapquery):
+    """
+    returns a digest of the parameters and uploaded content of tapquery.
+    """
+    parameters = {key: str(value) for key, value in tapquery.items()}
+    uploads = {
+        upload.name: _upload_digest(upload)
+        for upload in tapquery._uploads if upload.is_inline}
+    return hashlib.sha256(json.dumps(
+        [tapquery.queryurl, parameters, uploads], sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _job_gone(summary):
+    """
+    returns True if the job with summary (a
+    `~pyvo.io.uws.tree.JobSummary`) will not have results any more.
+    """
+    if summary.phase in ("ERROR", "ABORTED", "ARCHIVED"):
+        return True
+    return summary.destruction is not None and summary.destruction < Time.now()
+
+
+def _job_reusable(summary, max_age):
+    """
+    returns True if the results of the job with summary can be reused:
+    the job is completed, no older than max_age seconds (if given) and
+    its results are kept for at least `JOB_REUSE_MARGIN` seconds.
+    """
+    if summary.phase != "COMPLETED":
+        return False
+    now = Time.now()
+    if summary.destruction is not None and (summary.destruction - now).sec < JOB_REUSE_MARGIN:
+        return False
+    if max_age is not None:
+        finished = summary.endtime or summary.creationtime
+        if finished is None or (now - finished).sec > max_age:
+            return False
+    return True
+
+
+def _parameters_match(summary, tapquery):
+    """
+    returns True if the job with summary was submitted with the
+    parameters of tapquery.
+    """
+    parameters = {param.id_.upper(): param.content for param in summary.parameters}
+    expected = {key.upper(): str(value) for key, value in tapquery.items()}
+    expected.pop("REQUEST", None)
+    return all(parameters.get(key) == value for key, value in expected.items()) and all(
+        key in expected for key in ("MAXREC", "UPLOAD") if key in parameters)
+
+
+def _retry_transient(function, max_retries):
+    """
+    returns the result of calling function, retrying up to max_retries
+    times after errors that may go away (see `_is_transient`).
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return function()
+        except (DALServiceError,) + TRANSIENT_ERRORS as ex:
+            if attempt == max_retries or not _is_transient(ex):
+                raise
+            delay = getattr(ex, "retry_after_seconds", None)
+            if delay is None:
+                delay = (2 ** attempt) + random.uniform(0.8, 1)
+            time.sleep(delay)
+
 
 def _from_ivoa_format(datetime_str):
     """
@@ -165,20 +396,25 @@ class TAPService(DALService, AvailabilityMixin, CapabilityMixin):
         """
         if self._tables is None:
             tables_url = f'{self.baseurl}/tables'
+            self._tables = VOSITables(
+                single_flight(
+                    self._session, ("GET", tables_url, "detail=min"),
+                    lambda: self._fetch_tables(tables_url)),
+                tables_url, session=self._session)
+        return self._tables
 
-            response = self._session.get(tables_url, params={"detail": "min"}, stream=True)
+    def _fetch_tables(self, tables_url):
+        response = self._session.get(tables_url, params={"detail": "min"}, stream=True)
 
-            try:
-                response.raise_for_status()
-            except requests.RequestException as ex:
-                raise DALServiceError.from_except(ex, tables_url)
+        try:
+            response.raise_for_status()
+        except requests.RequestException as ex:
+            raise DALServiceError.from_except(ex, tables_url)
 
-            # requests doesn't decode the content by default
-            response.raw.read = partial(response.raw.read, decode_content=True)
+        # requests doesn't decode the content by default
+        response.raw.read = partial(response.raw.read, decode_content=True)
 
-            self._tables = VOSITables(
-                vosi.parse_tables(response.raw.read), tables_url, session=self._session)
-        return self._tables
+        return vosi.parse_tables(response.raw.read)
 
     def _parse_examples(self, examples_uri, *, depth=0):
         """returns the TAP queries from a DALI examples URI.
@@ -330,17 +566,29 @@ class TAPService(DALService, AvailabilityMixin, CapabilityMixin):
         See Also
         --------
         TAPResults
+        pyvo.dal.localquery.enable_local_query_cache
         """
-        return self.create_query(
+        cache = get_local_query_cache()
+        local = cache is not None and language == "ADQL" and not uploads and not keywords
+        if local:
+            result = cache.answer(
+                self.baseurl, query, maxrec=maxrec, cls=TAPResults, session=self._session)
+            if result is not None:
+                return result
+
+        result = self.create_query(
             query, language=language, maxrec=maxrec, uploads=uploads,
             **keywords).execute()
+        if local:
+            cache.remember(self.baseurl, query, result)
+        return result
 
     # alias for service discovery
     search = run_sync
 
     def run_async(
             self, query, *, language="ADQL", maxrec=None, uploads=None,
-            delete=True, timeout=None, **keywords):
+            delete=True, timeout=None, reuse=False, max_age=None, **keywords):
         """
         runs async query and returns its result
 
@@ -356,11 +604,19 @@ class TAPService(DALService, AvailabilityMixin, CapabilityMixin):
         uploads : dict
             a mapping from table names to objects containing a votable
         delete : bool
-            delete the job after fetching the results
+            delete the job after fetching the results.  This is ignored
+            with reuse, except for failed jobs.
         timeout : float or None
             maximum time to wait for job completion in seconds. If None,
             uses the service's advertised async executionDuration,
             (if available) otherwise use ``DEFAULT_JOB_WAIT_TIMEOUT``.
+        reuse : bool
+            if True, the results of a completed job for the same request
+            are returned if there is one (see `find_completed_job`).  The
+            job, whether reused or submitted by this call, is then kept
+            for later reuse rather than deleted, regardless of delete.
+        max_age : float, optional
+            with reuse, the maximum age in seconds of the job reused.
 
         Returns
         -------
@@ -388,10 +644,18 @@ class TAPService(DALService, AvailabilityMixin, CapabilityMixin):
             except DALServiceError:
                 timeout = DEFAULT_JOB_WAIT_TIMEOUT
 
-        job = AsyncTAPJob.create(
-            self.baseurl, query, language=language, maxrec=maxrec, uploads=uploads,
-            session=self._session, **keywords)
-        job = job.run().wait(timeout=timeout)
+        job = None
+        if reuse:
+            job = self.find_completed_job(
+                query, language=language, maxrec=maxrec, uploads=uploads,
+                max_age=max_age, **keywords)
+        if job is None:
+            job = self.submit_job(
+                query, language=language, maxrec=maxrec, uploads=uploads,
+                **keywords)
+            if reuse:
+                self._record_job(job, query, language, maxrec, uploads, keywords)
+            job = job.run().wait(timeout=timeout)
 
         try:
             job.raise_if_error()
@@ -402,14 +666,390 @@ class TAPService(DALService, AvailabilityMixin, CapabilityMixin):
 
         result = job.fetch_result(max_retries=keywords.get('max_retries', 0))
 
-        if delete:
+        if delete and not reuse:
             job.delete()
 
         return result
 
+    def run_incremental(
+            self, query, column, store, *, mode="sync", language="ADQL",
+            maxrec=None, uploads=None, **keywords):
+        """
+        runs a query on a growing table, only retrieving the rows added
+        since the last time it was run.
+
+        The rows retrieved are kept in store.  Unless the store has no rows
+        for the query yet, the query is amended to only select rows with
+        values of column at least as large as the largest one seen so far
+        (the watermark); the rows not stored yet are added to the store,
+        and the combined rows are returned.  If the schema of the result
+        changes, the whole result is retrieved again.
+
+        column must not decrease with rows added to the table, like an
+        ingestion timestamp or a serial number.  If results may be
+        truncated by maxrec, the query should be ordered by column, so
+        that the following refresh continues where the truncated one
+        ended; maxrec must then be larger than the number of rows sharing
+        a value of column.  Queries aggregating rows (e.g., with GROUP BY)
+        cannot be refreshed incrementally.
+
+        Parameters
+        ----------
+        query : str
+            the ADQL query.
+        column : str
+            the monotonic column, as it can be used in a condition in
+            query (e.g., ``"t.ingest_time"``).  The result column is the
+            one with the same unqualified name.
+        store : str or `~pyvo.dal.incremental.IncrementalStore`
+            the store for the rows (or the path of its directory).
+        mode : str
+            run the queries as ``"sync"`` (the default) or ``"async"``
+            queries.
+        language : str
+            the query language; only ADQL queries can be amended.
+        maxrec : int
+            the maximum number of records to retrieve per refresh.
+        uploads : dict
+            a mapping from table names to objects containing a votable.
+
+        Returns
+        -------
+        TAPResults
+            all rows of the query retrieved so far.
+        """
+        if language.upper().split("-")[0] != "ADQL":
+            raise ValueError("Only ADQL queries can be refreshed incrementally")
+        if mode not in ("sync", "async"):
+            raise ValueError(f"Unknown query mode: {mode}")
+        if any(token.kind == "word" and token.text.upper() == "GROUP"
+               for token in tokenize(query)):
+            raise ValueError("Queries with GROUP BY cannot be refreshed incrementally")
+        if not isinstance(store, IncrementalStore):
+            store = IncrementalStore(store)
+
+        def fetch(query):
+            if mode == "async":
+                return self.run_async(
+                    query, language=language, maxrec=maxrec, uploads=uploads, **keywords)
+            # not run_sync, which might answer from the local query cache
+            return self.create_query(
+                query, language=language, maxrec=maxrec, uploads=uploads, **keywords).execute()
+
+        result_column = tokenize(column)[-1].text.strip('"')
+        key = store.key(self.baseurl, query, column)
+        state = store.get_state(key)
+        if state is None or state["watermark"] is None:
+            store.save(key, fetch(query), result_column)
+        else:
+            # rows at the watermark are selected again, since a truncated
+            # result may have ended within them or more may have been added;
+            # the store skips those it already has.
+            increment = fetch(add_condition(
+                query, f"{column} >= {make_literal(state['watermark'])}"))
+            if schema_fingerprint(increment) == state["fingerprint"]:
+                store.save(key, increment, result_column, append=True)
+            else:
+                store.save(key, fetch(query), result_column)
+        return store.load(key, TAPResults, url=self.baseurl, session=self._session)
+
+    def plan_chunked_upload(
+            self, table, *, mode="async", chunk_rows=None,
+            max_workers=DEFAULT_MAX_WORKERS, chunk_seconds=None):
+        """
+        returns how `run_chunked_upload` would split table into chunks.
+
+        Chunks are made as large as the upload limit of the service for
+        mode allows.  For limits in bytes, the size of the VOTable
+        uploaded is estimated from a sample of the rows.
+
+        Parameters
+        ----------
+        table : `~astropy.table.Table` or `~pyvo.dal.DALResults`
+            the table to upload.
+        mode : str
+            ``"sync"`` or ``"async"``, the mode the queries are run in.
+        chunk_rows : int, optional
+            the maximum number of rows per chunk; the upload limit of the
+            service may make chunks smaller.
+        max_workers : int
+            the number of chunks run at the same time.
+        chunk_seconds : float, optional
+            the time a chunk takes, e.g., as measured with a first chunk;
+            it is used to estimate the time for the whole table.
+
+        Returns
+        -------
+        UploadPlan
+
+        Raises
+        ------
+        ValueError
+            if single rows of table are larger than the upload limit.
+        """
+        table = _as_table(table)
+        overhead, row_bytes = _votable_size(table)
+
+        limit = limit_rows = None
+        try:
+            capability = self.get_tap_capability()
+        except DALServiceError:
+            capability = None
+        if capability is not None:
+            limits = capability.get_uploadlimit(mode)
+            if limits is not None:
+                limit = limits.hard or limits.default
+        if limit is not None:
+            if limit.unit == "row":
+                limit_rows = limit.content
+            else:
+                limit_rows = int((limit.content * UPLOAD_LIMIT_FILL - overhead) // row_bytes)
+            if limit_rows < 1:
+                raise ValueError(f"Rows of the table exceed the upload limit of {limit}")
+
+        rows = min(size for size in (chunk_rows, limit_rows, len(table)) if size is not None)
+        rows = max(rows, 1)
+        nchunks = math.ceil(len(table) / rows)
+        waves = math.ceil(nchunks / max(max_workers, 1))
+
+        max_seconds = None
+        if capability is not None:
+            duration = capability.get_executionduration(mode)
+            if duration is not None and duration.hard:
+                max_seconds = waves * duration.hard
+
+        return UploadPlan(
+            nrows=len(table), chunk_rows=rows, nchunks=nchunks,
+            chunk_bytes=int(overhead + rows * row_bytes),
+            upload_bytes=int(nchunks * overhead + len(table) * row_bytes),
+            limit=limit,
+            seconds=None if chunk_seconds is None else waves * chunk_seconds,
+            max_seconds=max_seconds)
+
+    def iter_chunked_upload(
+            self, query, table, *, name="upload", mode="async", chunk_rows=None,
+            max_workers=DEFAULT_MAX_WORKERS, max_retries=2, offset_column="chunk_offset",
+            language="ADQL", maxrec=None, **keywords):
+        """
+        runs query for chunks of an uploaded table, yielding the result of
+        each chunk in the order of the chunks.
+
+        This is the streaming variant of `run_chunked_upload`, which
+        explains the parameters.
+
+        Yields
+        ------
+        `~astropy.table.Table`
+            the result of a chunk, with the ``offset_column`` added.
+        """
+        table = _as_table(table)
+        plan = self.plan_chunked_upload(
+            table, mode=mode, chunk_rows=chunk_rows, max_workers=max_workers)
+        run = self.run_sync if mode == "sync" else self.run_async
+
+        def run_chunk(offset):
+            chunk = table[offset:offset + plan.chunk_rows]
+            result = _retry_transient(
+                partial(run, query, language=language, maxrec=maxrec,
+                        uploads={name: chunk}, **keywords),
+                max_retries).to_table()
+            result[offset_column] = np.full(len(result), offset, dtype=np.int64)
+            return result
+
+        offsets = range(0, max(len(table), 1), plan.chunk_rows)
+        yield from ordered_map(run_chunk, offsets, max_workers=max_workers)
+
+    def run_chunked_upload(
+            self, query, table, *, name="upload", mode="async", chunk_rows=None,
+            max_workers=DEFAULT_MAX_WORKERS, max_retries=2, offset_column="chunk_offset",
+            language="ADQL", maxrec=None, **keywords):
+        """
+        runs query once for each chunk of a table too large to upload at
+        once, e.g., for crossmatching a large local catalog.
+
+        The table is split into chunks as large as the upload limit of the
+        service allows (see `plan_chunked_upload`), which are uploaded as
+        ``TAP_UPLOAD.<name>``; up to max_workers chunks are run at the same
+        time.  Chunks failing with server or network errors are retried.
+
+        Parameters
+        ----------
+        query : str
+            the query, referring to the chunk as ``TAP_UPLOAD.<name>``.
+        table : `~astropy.table.Table` or `~pyvo.dal.DALResults`
+            the table to upload.
+        name : str
+            the name of the uploaded table in query.
+        mode : str
+            run the queries as ``"async"`` (the default) or ``"sync"``
+            queries.
+        chunk_rows : int, optional
+            the maximum number of rows per chunk.
+        max_workers : int
+            the maximum number of chunks run at the same time.
+        max_retries : int
+            how often a chunk is retried after server errors (including
+            rate limits) or network errors.
+        offset_column : str
+            the name of the column added to the result, giving the index
+            in table of the first row of the chunk a row resulted from.
+        language : str
+            the query language.
+        maxrec : int
+            the maximum number of records to return for each chunk.
+        **keywords
+            further parameters of the queries.
+
+        Returns
+        -------
+        TAPResults
+            the results of all chunks in the order of the chunks.
+
+        Raises
+        ------
+        DALServiceError
+            if a chunk still fails after max_retries retries.
+        DALQueryError
+            if the service rejects the query.
+        """
+        merged = vstack(
+            list(self.iter_chunked_upload(
+                query, table, name=name, mode=mode, chunk_rows=chunk_rows,
+                max_workers=max_workers, max_retries=max_retries,
+                offset_column=offset_column, language=language, maxrec=maxrec,
+                **keywords)),
+            metadata_conflicts="silent")
+        return TAPResults(from_table(merged), url=self.baseurl, session=self._session)
+
+    def lookup(
+            self, table, key_column, keys, *, columns=None, method=None,
+            batch_size=LOOKUP_BATCH_SIZE, upload_threshold=LOOKUP_UPLOAD_THRESHOLD,
+            max_workers=DEFAULT_MAX_WORKERS, max_retries=2, maxrec=None):
+        """
+        returns the rows of table with the given keys, in the order of keys.
+
+        Row i of the result is the row of table whose key_column is keys[i];
+        all columns of row i are masked if there is no such row (or if
+        keys[i] is null).  Keys given more than once are only queried once,
+        and if table has several rows for a key, the first one returned
+        is used.
+
+        The keys are either written into ``IN`` lists of batch_size keys
+        each, or uploaded and joined with table.  Unless method says
+        otherwise, keys are uploaded if there are more than
+        upload_threshold of them and the service supports uploads.
+        Queries run at the same time, up to max_workers of them, and are
+        retried after server or network errors.
+
+        Parameters
+        ----------
+        table : str
+            the name of the table to look the keys up in.
+        key_column : str
+            the column of table holding the keys, a regular or delimited
+            identifier.
+        keys : sequence
+            the keys to look up (numbers or strings).
+        columns : list of str, optional
+            the columns to return; all columns of table if not given.
+            These are column names, not expressions or qualified names.
+            The key column is only returned if it is selected.
+        method : str, optional
+            ``"in"`` for ``IN`` lists or ``"upload"`` for upload joins.
+        batch_size : int
+            the maximum number of keys in the ``IN`` list of a query.
+        upload_threshold : int
+            the number of keys above which they are uploaded.
+        max_workers : int
+            the maximum number of queries run at the same time.
+        max_retries : int
+            how often a query is retried after server or network errors.
+        maxrec : int, optional
+            the maximum number of records each query returns.
+
+        Returns
+        -------
+        TAPResults
+            a row for each of keys.
+
+        Raises
+        ------
+        ValueError
+            if method is unknown, key_column or one of columns is not a
+            column name, or a key cannot be written in ADQL.
+        DALServiceError
+            if a query still fails after max_retries retries.
+        DALQueryError
+            if the service rejects a query.
+        """
+        key_reference = _qualified(key_column)
+        selected = ["t.*"] if columns is None else [_qualified(column) for column in columns]
+        keys = [_key_value(key) for key in keys]
+        unique = list(dict.fromkeys(key for key in keys if key is not None))
+        if method is None:
+            method = "in"
+            if len(unique) > upload_threshold:
+                try:
+                    if self.upload_methods:
+                        method = "upload"
+                except DALServiceError:
+                    pass
+        if method not in ("in", "upload"):
+            raise ValueError(f"Unknown lookup method {method!r}")
+
+        with_key = columns is None or _column_name(key_column) in map(_column_name, columns)
+        if not with_key:
+            selected.append(key_reference)
+        select = ", ".join(selected)
+
+        if not unique:
+            # there is nothing to look up, but the columns are needed
+            found = self.create_query(
+                f"SELECT TOP 0 {select} FROM {table} AS t").execute().to_table()
+        elif method == "upload":
+            query = (f"SELECT {select} FROM {table} AS t "
+                     f"JOIN TAP_UPLOAD.lookup_keys AS u ON {key_reference} = u.lookup_key")
+            found = self.run_chunked_upload(
+                query, Table({"lookup_key": unique}), name="lookup_keys", mode="sync",
+                max_workers=max_workers, max_retries=max_retries,
+                maxrec=maxrec).to_table()
+            del found["chunk_offset"]
+        else:
+            def run_batch(offset):
+                values = ", ".join(make_literal(key) for key in unique[offset:offset + batch_size])
+                query = f"SELECT {select} FROM {table} AS t WHERE {key_reference} IN ({values})"
+                return _retry_transient(
+                    self.create_query(query, maxrec=maxrec).execute, max_retries).to_table()
+
+            found = vstack(
+                list(ordered_map(
+                    run_batch, range(0, len(unique), batch_size),
+                    max_workers=max_workers)),
+                metadata_conflicts="silent")
+
+        key_name = _find_column(found, key_column)
+        index = {}
+        for row, key in enumerate(found[key_name]):
+            index.setdefault(_key_value(key), row)
+        rows = np.array([index.get(key, -1) if key is not None else -1 for key in keys],
+                        dtype=int)
+        hits = rows >= 0
+
+        aligned = Table(masked=True)
+        for name in found.colnames:
+            if name == key_name and not with_key:
+                continue
+            column = found[name]
+            data = np.ma.masked_all((len(rows),) + column.shape[1:], dtype=column.dtype)
+            data[hits] = column[rows[hits]]
+            aligned[name] = MaskedColumn(
+                data, name=name, unit=column.unit, description=column.description,
+                format=column.format, meta=column.meta)
+        return TAPResults(from_table(aligned), url=self.baseurl, session=self._session)
+
     def submit_job(
             self, query, *, language="ADQL", maxrec=None, uploads=None,
-            **keywords):
+            reuse=False, max_age=None, **keywords):
         """
         submit a async query without starting it and returns a AsyncTAPJob
         object
@@ -425,6 +1065,13 @@ class TAPService(DALService, AvailabilityMixin, CapabilityMixin):
             the maximum records to return. defaults to the service default
         uploads : dict
             a mapping from table names to objects containing a votable
+        reuse : bool
+            if True, a completed job for the same request is returned if
+            there is one (see `find_completed_job`); check its ``phase``
+            before running it.  Otherwise the job submitted is recorded
+            for reuse in the job journal.
+        max_age : float, optional
+            with reuse, the maximum age in seconds of the job reused.
 
         Returns
         -------
@@ -435,9 +1082,110 @@ class TAPService(DALService, AvailabilityMixin, CapabilityMixin):
         --------
         AsyncTAPJob
         """
-        return AsyncTAPJob.create(
+        if reuse:
+            job = self.find_completed_job(
+                query, language=language, maxrec=maxrec, uploads=uploads,
+                max_age=max_age, **keywords)
+            if job is not None:
+                return job
+
+        job = AsyncTAPJob.create(
             self.baseurl, query, language=language, maxrec=maxrec, uploads=uploads,
             session=self._session, **keywords)
+        if reuse:
+            self._record_job(job, query, language, maxrec, uploads, keywords)
+        return job
+
+    def _record_job(self, job, query, language, maxrec, uploads, keywords):
+        tapquery = TAPQuery(
+            self.baseurl, query, mode="async", language=language, maxrec=maxrec,
+            uploads=uploads, session=self._session, **keywords)
+        get_job_journal().record(_request_digest(tapquery), job.url)
+
+    def find_completed_job(
+            self, query, *, language="ADQL", maxrec=None, uploads=None,
+            max_age=None, **keywords):
+        """
+        returns a completed async job on this service for the same
+        request, or None if there is none.
+
+        Jobs submitted with ``reuse=True`` are recorded in the job journal
+        (see `~pyvo.dal.jobjournal.get_job_journal`), together with a
+        digest of their parameters and uploaded content; these are
+        checked first.  Then the most recent completed jobs of the service
+        (see `get_job_list`) are examined for jobs with the same QUERY,
+        LANG, MAXREC and further parameters; as the content of inline
+        uploads is not available from the service, this is skipped for
+        requests with inline uploads.
+
+        Jobs are only returned if their results are kept for at least
+        `JOB_REUSE_MARGIN` more seconds.
+
+        Parameters
+        ----------
+        query : str
+            the query string
+        language : str
+            the query language.
+        maxrec : int
+            the maximum records to return.
+        uploads : dict
+            a mapping from table names to objects containing a votable
+        max_age : float, optional
+            the maximum age in seconds of the job, counted from the end of
+            its execution.
+        **keywords
+            further parameters of the request.
+
+        Returns
+        -------
+        AsyncTAPJob or None
+        """
+        tapquery = TAPQuery(
+            self.baseurl, query, mode="async", language=language, maxrec=maxrec,
+            uploads=uploads, session=self._session, **keywords)
+        digest = _request_digest(tapquery)
+        journal = get_job_journal()
+
+        recorded = journal.lookup(digest)
+        for url in recorded:
+            try:
+                job = AsyncTAPJob(url, session=self._session)
+            except DALServiceError:
+                journal.forget(digest, url)
+                continue
+            if _job_reusable(job._job, max_age):
+                return job
+            if _job_gone(job._job):
+                journal.forget(digest, url)
+
+        if any(upload.is_inline for upload in tapquery._uploads):
+            return None
+
+        after = None
+        if max_age is not None:
+            after = (Time.now() - max_age * u.s).datetime
+        try:
+            # the complete job descriptions are fetched concurrently
+            summaries = self.get_job_list(
+                phases=["COMPLETED"], after=after, last=JOB_REUSE_CANDIDATES,
+                short_description=False)
+        except (DALServiceError, requests.RequestException, ValueError):
+            # services need not list their jobs; the XML parser raises
+            # ValueError on documents that are not job lists
+            return None
+        for summary in summaries[:JOB_REUSE_CANDIDATES]:
+            url = f"{self.baseurl}/async/{summary.jobid}"
+            if url in recorded:
+                continue
+            if _job_reusable(summary, max_age) and _parameters_match(summary, tapquery):
+                try:
+                    job = AsyncTAPJob(url, session=self._session)
+                except DALServiceError:
+                    continue
+                journal.record(digest, url)
+                return job
+        return None
 
     def create_query(
             self, query=None, *, mode="sync", language="ADQL", maxrec=None,
@@ -488,7 +1236,8 @@ class TAPService(DALService, AvailabilityMixin, CapabilityMixin):
         return uws.parse_job(response.raw.read)
 
     def get_job_list(self, *, phases=None, after=None, last=None,
-                     short_description=True):
+                     short_description=True,
+                     max_workers=DEFAULT_MAX_WORKERS):
         """
         lists jobs that the caller can see in the current security context.
         The list can be filtered on the server side by the phases of the jobs,
@@ -508,12 +1257,55 @@ class TAPService(DALService, AvailabilityMixin, CapabilityMixin):
             corresponding to the TAP ShortJobDescription object (job ID, phase,
             run ID, owner ID and creation ID) whereas if False, a separate GET
             call to each job is performed for the complete job description.
+        max_workers: int
+            the maximum number of concurrent requests for the complete job
+            descriptions.
 
         Returns
         -------
         list of `~pyvo.io.uws.tree.JobSummary`
+
+        See Also
+        --------
+        iter_job_list
         """
+        return list(self.iter_job_list(
+            phases=phases, after=after, last=last,
+            short_description=short_description, max_workers=max_workers))
 
+    def iter_job_list(self, *, phases=None, after=None, last=None,
+                      short_description=True,
+                      max_workers=DEFAULT_MAX_WORKERS):
+        """
+        iterates over the jobs that the caller can see in the current
+        security context.
+
+        This takes the same filters as `get_job_list`, but the job list is
+        parsed while it is being downloaded and the jobs are yielded one at
+        a time, so arbitrarily long job histories can be walked in constant
+        memory.  With ``short_description=False``, the complete job
+        descriptions are fetched concurrently with at most ``max_workers``
+        requests in flight; they are still yielded in job list order.
+
+        Parameters
+        ----------
+        phases: list of str
+            Union of job phases to filter the results by.
+        after: datetime
+            Return only jobs created after this datetime
+        last: int
+            Return only the most recent number of jobs
+        short_description: flag - True or False
+            If True, yield only the TAP ShortJobDescription of the jobs,
+            otherwise retrieve the complete job description for each job.
+        max_workers: int
+            the maximum number of concurrent requests for the complete job
+            descriptions.
+
+        Yields
+        ------
+        `~pyvo.io.uws.tree.JobSummary`
+        """
         params = {'PHASE': phases, 'LAST': last}
 
         if after:
@@ -526,14 +1318,16 @@ class TAPService(DALService, AvailabilityMixin, CapabilityMixin):
                                      stream=True)
         response.raw.read = partial(response.raw.read, decode_content=True)
 
-        jobs = uws.parse_job_list(response.raw.read)
-        if not short_description:
-            dj = []
-            for job in jobs:
-                dj.append(self.get_job(job.jobid))
-            return dj
-        else:
-            return list(jobs)
+        try:
+            jobs = uws.iter_job_list(response.raw.read)
+            if short_description:
+                yield from jobs
+            else:
+                yield from ordered_map(
+                    lambda job: self.get_job(job.jobid), jobs,
+                    max_workers=max_workers)
+        finally:
+            response.close()
 
     def describe(self, width=None):
         """
@@ -1102,7 +1896,7 @@ class AsyncTAPJob:
             msg = msg or "<No useful error from server>"
             raise DALQueryError("Query Error: " + msg, self.url)
 
-    def fetch_result(self, max_retries=0):
+    def fetch_result(self, max_retries=0, *, columns=None, max_rows=None):
         """
         returns the result votable if query is finished
 
@@ -1111,6 +1905,11 @@ class AsyncTAPJob:
         max_retries : int, optional
             Maximum number of retry attempts for transient network errors.
             Default is 0 (no retries).
+        columns : sequence of str or int, optional
+            the IDs, names or indices of the columns to read.  The values of other
+            columns are not decoded.  By default, all columns are read.
+        max_rows : int, optional
+            the maximum number of rows to read.
         """
         result_uri = self.result_uri
         if result_uri is None:
@@ -1142,11 +1941,196 @@ class AsyncTAPJob:
                 raise DALServiceError.from_except(ex, self.url)
 
         response.raw.read = partial(response.raw.read, decode_content=True)
-        result = TAPResults(votableparse(response.raw.read), url=self.result_uri, session=self._session)
+        result = TAPResults(
+            parse_votable(response.raw.read, columns=columns, max_rows=max_rows),
+            url=self.result_uri, session=self._session)
         result.check_overflow_warning(self._client_set_maxrec)
         return result
 
 
+class TAPPipelineStage:
+    """
+    A query of a `TAPPipeline`, created by `TAPPipeline.add`.
+
+    Stages are passed as upload values to later stages of their pipeline.
+    While the pipeline runs, ``job`` is the `AsyncTAPJob` of the stage.
+    """
+    def __init__(self, query, *, uploads=None, language="ADQL", maxrec=None, **keywords):
+        self.query = query
+        self.uploads = dict(uploads or {})
+        self.language = language
+        self.maxrec = maxrec
+        self.keywords = keywords
+        self.job = None
+
+    @property
+    def dependencies(self):
+        """
+        the stages whose results this stage uploads.
+        """
+        return [value for value in self.uploads.values() if isinstance(value, TAPPipelineStage)]
+
+
+class TAPPipeline:
+    """
+    A chain of async queries on a TAP service, where queries upload the
+    results of earlier queries.
+
+    Each query (stage) uploads the results of earlier stages by reference:
+    the service is passed the result URI of the job of the earlier stage,
+    so intermediate results never go through the client.  Each stage is
+    submitted as soon as the stages it depends on have completed, whatever
+    its position in the pipeline; the jobs running are waited for at the
+    same time.  Only the results of the last stage are retrieved.
+
+    This requires the service to accept uploads from its own result URIs
+    (see `TAPService.upload_methods`).
+
+    Parameters
+    ----------
+    service : TAPService
+        the service running the queries.
+
+    Examples
+    --------
+    >>> pipeline = TAPPipeline(service)  # doctest: +SKIP
+    >>> bright = pipeline.add("SELECT source_id, ra, dec FROM gaia.dr3lite "
+    ...                       "WHERE phot_g_mean_mag < 10")  # doctest: +SKIP
+    >>> pipeline.add("SELECT * FROM TAP_UPLOAD.bright AS b JOIN ...",
+    ...              uploads={"bright": bright})  # doctest: +SKIP
+    >>> result = pipeline.run()  # doctest: +SKIP
+    """
+    def __init__(self, service):
+        self._service = service
+        self.stages = []
+
+    def add(self, query, *, uploads=None, language="ADQL", maxrec=None, **keywords):
+        """
+        adds a stage running query to the pipeline and returns it.
+
+        Parameters
+        ----------
+        query : str
+            the query.
+        uploads : dict
+            a mapping from table names to upload contents as for
+            `TAPService.run_async`, or to earlier stages of this pipeline.
+        language : str
+            the query language.
+        maxrec : int
+            the maximum number of records to return.
+        **keywords
+            further parameters of the query.
+
+        Returns
+        -------
+        TAPPipelineStage
+        """
+        stage = TAPPipelineStage(
+            query, uploads=uploads, language=language, maxrec=maxrec, **keywords)
+        for dependency in stage.dependencies:
+            if dependency not in self.stages:
+                raise ValueError("Stages can only upload earlier stages of their pipeline")
+        self.stages.append(stage)
+        return stage
+
+    def run(self, *, delete=True, timeout=None):
+        """
+        runs all stages and returns the results of the last one.
+
+        Parameters
+        ----------
+        delete : bool
+            whether the jobs of all stages are deleted at the end, whether
+            or not the pipeline succeeded.  If False, the jobs are left on
+            the service and remain available as the ``job`` of the stages.
+            If a stage fails, the jobs of the stages still running are
+            aborted in either case.
+        timeout : float, optional
+            the maximum time to wait for each stage, see `AsyncTAPJob.wait`.
+
+        Returns
+        -------
+        TAPResults
+            the results of the last stage.
+
+        Raises
+        ------
+        ValueError
+            if the pipeline has no stages.
+        DALServiceError
+           for errors connecting to or communicating with the service
+        DALQueryError
+           if the service rejects one of the queries
+        """
+        if not self.stages:
+            raise ValueError("The pipeline has no stages")
+
+        pending = list(self.stages)
+        finished = set()
+        executor = futures.ThreadPoolExecutor(max_workers=len(self.stages))
+        running = {}
+
+        def wait_for(stage, job):
+            job.wait(timeout=timeout)
+            job.raise_if_error()
+            return stage
+
+        try:
+            while True:
+                # submit every stage whose dependencies have completed
+                for stage in list(pending):
+                    if all(id(dependency) in finished for dependency in stage.dependencies):
+                        pending.remove(stage)
+                        self._submit(stage)
+                        running[executor.submit(wait_for, stage, stage.job)] = stage
+                if not running:
+                    break
+                done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+                    finished.add(id(future.result()))
+
+            return self.stages[-1].job.fetch_result()
+        finally:
+            # after a failure, abort the jobs still running so that their
+            # waits return before the jobs are deleted
+            for future, stage in running.items():
+                if not future.done():
+                    try:
+                        stage.job.abort()
+                    except DALServiceError:
+                        pass
+            executor.shutdown(wait=True)
+            if delete:
+                self.cleanup()
+
+    def _submit(self, stage):
+        """
+        submits and runs the job of stage, uploading the results of the
+        stages it depends on by their result URIs.
+        """
+        uploads = {
+            name: value.job if isinstance(value, TAPPipelineStage) else value
+            for name, value in stage.uploads.items()}
+        stage.job = self._service.submit_job(
+            stage.query, language=stage.language, maxrec=stage.maxrec,
+            uploads=uploads or None, **stage.keywords)
+        stage.job.run()
+
+    def cleanup(self):
+        """
+        deletes the jobs of all stages, ignoring errors.
+        """
+        for stage in self.stages:
+            if stage.job is not None and stage.job.url is not None:
+                try:
+                    stage.job.delete()
+                except DALServiceError:
+                    pass
+            stage.job = None
+
+
 class TAPQuery(DALQuery):
     """
     a class for preparing a query to a TAP service.  Query constraints
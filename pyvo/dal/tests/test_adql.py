@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Tests for pyvo.dal.adql
+"""
+import numpy as np
+import pytest
+
+from pyvo.dal.adql import add_condition, make_literal, parse_select, tokenize
+
+
+def test_tokenize():
+    tokens = tokenize("SELECT \"a b\", 'it''s' -- comment\n FROM t WHERE x>=1.5e3")
+    assert [(token.kind, token.text) for token in tokens] == [
+        ("word", "SELECT"), ("identifier", '"a b"'), ("operator", ","),
+        ("string", "'it''s'"), ("word", "FROM"), ("word", "t"), ("word", "WHERE"),
+        ("word", "x"), ("operator", ">="), ("number", "1.5e3")]
+
+    with pytest.raises(ValueError):
+        tokenize("SELECT 'unterminated FROM t")
+
+
+@pytest.mark.parametrize("query,amended", [
+    ("SELECT * FROM t",
+     "SELECT * FROM t WHERE id > 5"),
+    ("SELECT * FROM t  ",
+     "SELECT * FROM t WHERE id > 5"),
+    ("SELECT * FROM t WHERE a=1 OR b=2",
+     "SELECT * FROM t WHERE (a=1 OR b=2) AND (id > 5)"),
+    ("SELECT TOP 10 * FROM t ORDER BY id",
+     "SELECT TOP 10 * FROM t WHERE id > 5 ORDER BY id"),
+    ("SELECT * FROM t WHERE x IN (SELECT x FROM u ORDER BY x) ORDER BY id",
+     "SELECT * FROM t WHERE (x IN (SELECT x FROM u ORDER BY x)) AND (id > 5) ORDER BY id"),
+    ("SELECT * FROM t JOIN u ON t.x = u.x WHERE u.y = 'WHERE' GROUP BY id",
+     "SELECT * FROM t JOIN u ON t.x = u.x WHERE (u.y = 'WHERE') AND (id > 5) GROUP BY id"),
+])
+def test_add_condition(query, amended):
+    assert add_condition(query, "id > 5") == amended
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT a FROM t UNION SELECT a FROM u",
+    "DELETE FROM t",
+    "SELECT * FROM (t",
+])
+def test_add_condition_fails(query):
+    with pytest.raises(ValueError):
+        add_condition(query, "id > 5")
+
+
+def test_make_literal():
+    assert make_literal("it's") == "'it''s'"
+    assert make_literal(b"2024-01-01") == "'2024-01-01'"
+    assert make_literal(np.int16(3)) == "3"
+    assert make_literal(np.float64(0.1)) == "0.1"
+    for value in (True, np.nan, None):
+        with pytest.raises(ValueError):
+            make_literal(value)
+
+
+def test_parse_select():
+    select = parse_select(
+        'SELECT TOP 5 a, "B c", t.x FROM ivoa.obscore AS t '
+        "WHERE (a < 3 AND b BETWEEN 1 AND 2) OR 5 >= x AND c NOT IN ('x', -1.5) "
+        "AND d IS NOT NULL ORDER BY a DESC, x;")
+    assert select.top == 5
+    assert select.columns == (("column", "a", False), ("column", "B c", True),
+                              ("column", "x", False))
+    assert select.table == (("ivoa", False), ("obscore", False))
+    assert select.where == ("or", (
+        ("and", (
+            ("compare", "<", ("column", "a", False), ("literal", 3)),
+            ("compare", ">=", ("column", "b", False), ("literal", 1)),
+            ("compare", "<=", ("column", "b", False), ("literal", 2)))),
+        ("and", (
+            ("compare", "<=", ("column", "x", False), ("literal", 5)),
+            ("in", ("column", "c", False), ("x", -1.5), True),
+            ("null", ("column", "d", False), True)))))
+    assert select.order_by == ((("column", "a", False), True), (("column", "x", False), False))
+
+    select = parse_select("select * from T where NOT a <> 'it''s'")
+    assert select.columns is None
+    assert select.table == (("t", False),)
+    assert select.where == ("not", ("compare", "<>", ("column", "a", False), ("literal", "it's")))
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT DISTINCT * FROM t",
+    "SELECT a AS b FROM t",
+    "SELECT COUNT(*) FROM t",
+    "SELECT * FROM t JOIN u ON t.a = u.a",
+    "SELECT * FROM t, u",
+    "SELECT * FROM t WHERE a + 1 < 2",
+    "SELECT * FROM t WHERE a LIKE 'x%'",
+    "SELECT * FROM t WHERE a IN (SELECT a FROM u)",
+    "SELECT * FROM t GROUP BY a",
+    "SELECT * FROM t ORDER BY 1",
+    "SELECT * FROM t OFFSET 5",
+])
+def test_parse_select_unsupported(query):
+    with pytest.raises(ValueError):
+        parse_select(query)
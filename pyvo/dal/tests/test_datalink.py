@@ -4,17 +4,22 @@
 Tests for pyvo.dal.datalink
 """
 from functools import partial
+from io import BytesIO
 import re
+from urllib.parse import parse_qsl
 
 import pytest
+import requests_mock
 
 import pyvo as vo
+from astropy import units as u
 from pyvo.dal.adhoc import DatalinkResults, DALServiceError
 from pyvo.dal.sia2 import SIA2Results
 from pyvo.dal.tap import TAPResults
 from pyvo.utils import testing, vocabularies
 from pyvo.dal.sia import search
 
+from astropy.io.votable import parse as parse_votable
 from astropy.utils.data import get_pkg_data_contents, get_pkg_data_filename
 
 get_pkg_data_contents = partial(
@@ -88,13 +93,12 @@ def obscore_datalink(mocker):
 
 @pytest.fixture()
 def res_datalink(mocker):
-
-    first_batch = True
-
+    # the service answers at most the two IDs in cutout1.xml per call;
+    # the third one is in cutout2.xml.
     def callback(request, context):
-        nonlocal first_batch
-        if first_batch:
-            first_batch = False
+        ids = [value for key, value in parse_qsl(request.body) if key == 'ID']
+        if ('ivo://cadc.nrc.ca/MACHO?54150/cal054150r' in ids
+                or 'ivo://cadc.nrc.ca/MACHO?54151/cal054151b' in ids):
             return get_pkg_data_contents('data/datalink/cutout1.xml')
         else:
             return get_pkg_data_contents('data/datalink/cutout2.xml')
@@ -169,6 +173,373 @@ def test_datalink_batch():
         assert len(dls) == 3
         assert dls[0].original_row["obs_collection"] == "MACHO"
 
+    dls = list(results.iter_datalinks(preserve_order=True))
+    assert [dl.original_row["obs_publisher_did"] for dl in dls] == list(
+        results["obs_publisher_did"])
+    for dl in dls:
+        assert {rec.id for rec in dl} == {dl.original_row["obs_publisher_did"]}
+
+
+def _make_dlblock_results(ids, groups=None):
+    """returns TAPResults with the given publisher DIDs and a datalink
+    service block pointing to http://example.com/dlblock.
+
+    With groups, the results have a column of these values referenced by
+    a further GROUP input parameter.
+    """
+    if groups is None:
+        rows = "".join(f"<TR><TD>{id_}</TD></TR>" for id_ in ids)
+        group_field = group_param = ""
+    else:
+        rows = "".join(f"<TR><TD>{id_}</TD><TD>{group}</TD></TR>"
+                       for id_, group in zip(ids, groups))
+        group_field = '<FIELD name="grp" ID="grp" datatype="int"/>'
+        group_param = '<PARAM name="GROUP" datatype="int" ref="grp" value="0"/>'
+    votable = f"""<?xml version="1.0" encoding="utf-8"?>
+<VOTABLE version="1.4" xmlns="http://www.ivoa.net/xml/VOTable/v1.3">
+  <RESOURCE type="results">
+    <TABLE>
+      <FIELD name="obs_publisher_did" ID="did" datatype="char" arraysize="*"/>
+      {group_field}
+      <DATA><TABLEDATA>{rows}</TABLEDATA></DATA>
+    </TABLE>
+  </RESOURCE>
+  <RESOURCE type="meta" utype="adhoc:service">
+    <PARAM name="standardID" datatype="char" arraysize="*"
+      value="ivo://ivoa.net/std/DataLink#links-1.0"/>
+    <PARAM name="accessURL" datatype="char" arraysize="*"
+      value="http://example.com/dlblock"/>
+    <GROUP name="inputParams">
+      <PARAM name="ID" datatype="char" arraysize="*" ref="did" value=""/>
+      {group_param}
+    </GROUP>
+  </RESOURCE>
+</VOTABLE>"""
+    return TAPResults(parse_votable(BytesIO(votable.encode("utf-8"))))
+
+
+def _make_dlblock_response(ids):
+    rows = "".join(
+        f"<TR><TD>{id_}</TD><TD>http://example.com/{id_}.fits</TD>"
+        f"<TD>#this</TD></TR>"
+        f"<TR><TD>{id_}</TD><TD>http://example.com/{id_}.jpeg</TD>"
+        f"<TD>#preview</TD></TR>" for id_ in ids)
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<VOTABLE version="1.4" xmlns="http://www.ivoa.net/xml/VOTable/v1.3">
+  <RESOURCE type="results">
+    <TABLE>
+      <FIELD name="ID" datatype="char" arraysize="*"/>
+      <FIELD name="access_url" datatype="char" arraysize="*"/>
+      <FIELD name="semantics" datatype="char" arraysize="*"/>
+      <DATA><TABLEDATA>{rows}</TABLEDATA></DATA>
+    </TABLE>
+  </RESOURCE>
+</VOTABLE>""".encode("utf-8")
+
+
+@pytest.fixture()
+def dlblock(mocker):
+    # a service answering at most 7 IDs per call, in reverse order
+    calls = []
+
+    def callback(request, context):
+        ids = [value for key, value in parse_qsl(request.body or request.query)
+               if key == 'ID']
+        calls.append(ids)
+        return _make_dlblock_response(reversed(ids[:7]))
+
+    with mocker.register_uri(
+        requests_mock.ANY, 'http://example.com/dlblock', content=callback
+    ) as matcher:
+        matcher.calls = calls
+        yield matcher
+
+
+@pytest.mark.parametrize("preserve_order", [False, True])
+def test_datalink_batch_concurrent(dlblock, preserve_order):
+    ids = [f"ivo://example/obs?{i}" for i in range(100)]
+    results = _make_dlblock_results(ids)
+
+    dls = list(results.iter_datalinks(
+        preserve_order=preserve_order, max_workers=3))
+
+    assert len(dls) == 100
+    for dl in dls:
+        assert len(dl) == 2
+        assert {rec.id for rec in dl} == {dl.original_row["obs_publisher_did"]}
+    got = [dl.original_row["obs_publisher_did"] for dl in dls]
+    if preserve_order:
+        assert got == ids
+    else:
+        assert sorted(got) == sorted(ids)
+
+    # only the two initial batches were larger than the service limit;
+    # after the first response, the batch size adapted to it
+    assert [len(call) for call in dlblock.calls if len(call) > 7] == [
+        vo.dal.adhoc.DATALINK_BATCH_CALL_SIZE] * 2
+
+
+@pytest.mark.parametrize("preserve_order", [False, True])
+def test_datalink_batch_interleaved(mocker, preserve_order):
+    # a service not serving the links of an ID in consecutive rows
+    ids = [f"ivo://example/obs?{i}" for i in range(5)]
+    results = _make_dlblock_results(ids)
+
+    def callback(request, context):
+        requested = [value for key, value in parse_qsl(request.body) if key == 'ID']
+        response = _make_dlblock_response(requested).decode("utf-8")
+        rows = re.findall("<TR>.*?</TR>", response)
+        interleaved = "".join(rows[0::2] + rows[1::2])
+        return response.replace("".join(rows), interleaved).encode("utf-8")
+
+    with mocker.register_uri(
+        'POST', 'http://example.com/dlblock', content=callback
+    ):
+        dls = list(results.iter_datalinks(preserve_order=preserve_order))
+
+    assert len(dls) == 5
+    for dl in dls:
+        did = dl.original_row["obs_publisher_did"]
+        # links keep their order within an ID
+        assert [rec.semantics for rec in dl] == ["#this", "#preview"]
+        assert [rec.access_url for rec in dl] == [
+            f"http://example.com/{did}.fits", f"http://example.com/{did}.jpeg"]
+
+
+def test_datalink_batch_shares_buffer(dlblock):
+    ids = [f"ivo://example/obs?{i}" for i in range(5)]
+    results = _make_dlblock_results(ids)
+
+    dls = list(results.iter_datalinks(preserve_order=True))
+
+    # the per-ID results are views into one parsed batch
+    assert all(not dl.resultstable.array.data.flags.owndata for dl in dls)
+    assert len({id(dl.resultstable.array.data.base) for dl in dls}) == 1
+
+
+def test_clone_byid():
+    datalinks = DatalinkResults(parse_votable(
+        get_pkg_data_filename('data/datalink/cutout1.xml')))
+
+    clone = datalinks.clone_byid('ivo://cadc.nrc.ca/MACHO?54151/cal054151b')
+
+    assert len(datalinks) == 6
+    assert len(clone) == 3
+    assert {rec.id for rec in clone} == {'ivo://cadc.nrc.ca/MACHO?54151/cal054151b'}
+
+
+def test_datalink_batch_no_progress(mocker):
+    results = _make_dlblock_results(["ivo://example/obs?1"])
+
+    with mocker.register_uri(
+        'POST', 'http://example.com/dlblock',
+        content=_make_dlblock_response([])
+    ):
+        with pytest.raises(DALServiceError, match="Could not retrieve datalinks"):
+            list(results.iter_datalinks())
+
+
+def test_datalink_batch_sizer():
+    sizer = vo.dal.adhoc._DatalinkBatchSizer(size=10)
+
+    # fast and small responses let the batch size grow, by two at most
+    sizer.update(requested=10, answered=10, elapsed=0.01, nrows=20)
+    assert sizer.size == 20
+
+    # slow responses make it shrink towards target_duration
+    sizer.update(requested=20, answered=20, elapsed=sizer.target_duration * 4,
+                 nrows=40)
+    assert sizer.size == 5
+
+    # large responses make it shrink towards target_rows
+    sizer.update(requested=5, answered=5, elapsed=0.01,
+                 nrows=sizer.target_rows * 5)
+    assert sizer.size == 1
+
+    # partial answers cap the size at the service limit
+    sizer = vo.dal.adhoc._DatalinkBatchSizer(size=50)
+    sizer.update(requested=50, answered=7, elapsed=0.01, nrows=14)
+    assert sizer.size == 7
+    sizer.update(requested=7, answered=7, elapsed=0.01, nrows=14)
+    assert sizer.size == 7
+
+
+def _make_soda_results(ids):
+    """returns TAPResults with the given publisher DIDs and a SODA sync
+    service block pointing to http://example.com/soda.
+    """
+    rows = "".join(f"<TR><TD>{id_}</TD></TR>" for id_ in ids)
+    votable = f"""<?xml version="1.0" encoding="utf-8"?>
+<VOTABLE version="1.4" xmlns="http://www.ivoa.net/xml/VOTable/v1.3">
+  <RESOURCE type="results">
+    <TABLE>
+      <FIELD name="obs_publisher_did" ID="did" datatype="char" arraysize="*"/>
+      <DATA><TABLEDATA>{rows}</TABLEDATA></DATA>
+    </TABLE>
+  </RESOURCE>
+  <RESOURCE type="meta" utype="adhoc:service">
+    <PARAM name="standardID" datatype="char" arraysize="*"
+      value="ivo://ivoa.net/std/SODA#sync-1"/>
+    <PARAM name="accessURL" datatype="char" arraysize="*"
+      value="http://example.com/soda"/>
+    <GROUP name="inputParams">
+      <PARAM name="ID" datatype="char" arraysize="*" ref="did" value=""/>
+      <PARAM name="CIRCLE" datatype="double" arraysize="3" xtype="circle"
+        unit="deg" value=""/>
+    </GROUP>
+  </RESOURCE>
+</VOTABLE>"""
+    return TAPResults(parse_votable(BytesIO(votable.encode("utf-8"))))
+
+
+def test_cutout_all(mocker, tmp_path):
+    ids = [f"ivo://example/obs?{i}" for i in range(10)]
+    results = _make_soda_results(ids)
+    requested = []
+
+    def callback(request, context):
+        id_ = request.qs["ID"][0]
+        requested.append((id_, request.qs["CIRCLE"][0]))
+        if id_.endswith("?3"):
+            context.status_code = 404
+            return b"not found"
+        context.headers["Content-Type"] = "application/fits"
+        return f"cutout of {id_}".encode("utf-8")
+
+    with mocker.register_uri(
+        'GET', 'http://example.com/soda', content=callback
+    ):
+        manifest = results.cutout_all(
+            circle=[10, 20, 0.1] * u.deg, dir=tmp_path / "cutouts", max_workers=3)
+
+    assert len(requested) == 10
+    assert {circle for _, circle in requested} == {"10 20 0.1"}
+    assert [entry.original_row["obs_publisher_did"] for entry in manifest] == ids
+
+    failed = manifest[3]
+    assert failed.filename is None
+    assert isinstance(failed.error, DALServiceError)
+
+    for entry in manifest[:3] + manifest[4:]:
+        assert entry.error is None
+        assert entry.filename.endswith(".fits")
+        with open(entry.filename) as f:
+            assert f.read() == "cutout of " + entry.original_row["obs_publisher_did"]
+    assert len(list((tmp_path / "cutouts").iterdir())) == 9
+
+
+@pytest.fixture()
+def datalink_cache():
+    cache = vo.dal.adhoc.enable_datalink_cache(maxsize=100)
+    try:
+        yield cache
+    finally:
+        vo.dal.adhoc.disable_datalink_cache()
+
+
+@pytest.mark.parametrize("preserve_order", [False, True])
+def test_datalink_batch_cached(dlblock, datalink_cache, preserve_order):
+    ids = [f"ivo://example/obs?{i}" for i in range(20)]
+
+    list(_make_dlblock_results(ids[:10]).iter_datalinks())
+    assert len(datalink_cache) == 10
+    dlblock.calls.clear()
+
+    dls = list(_make_dlblock_results(ids).iter_datalinks(
+        preserve_order=preserve_order))
+
+    # only the IDs not seen before went to the service
+    assert {id_ for call in dlblock.calls for id_ in call} == set(ids[10:])
+    got = [dl.original_row["obs_publisher_did"] for dl in dls]
+    if preserve_order:
+        assert got == ids
+    else:
+        assert sorted(got) == sorted(ids)
+    for dl in dls:
+        assert {rec.id for rec in dl} == {dl.original_row["obs_publisher_did"]}
+
+    dlblock.calls.clear()
+    assert len(list(_make_dlblock_results(ids).iter_datalinks(
+        preserve_order=preserve_order))) == 20
+    assert dlblock.calls == []
+
+
+def test_getdatalink_cached(dlblock, datalink_cache):
+    results = _make_dlblock_results(["ivo://example/obs?1"])
+
+    first = results[0].getdatalink()
+    second = results[0].getdatalink()
+
+    assert dlblock.call_count == 1
+    assert [rec.access_url for rec in first] == [rec.access_url for rec in second]
+
+
+def test_batch_fills_getdatalink_cache(dlblock, datalink_cache):
+    ids = [f"ivo://example/obs?{i}" for i in range(5)]
+    results = _make_dlblock_results(ids, groups=range(10, 15))
+
+    assert len(list(results.iter_datalinks())) == 5
+    calls = len(dlblock.calls)
+
+    datalinks = results[3].getdatalink()
+    assert len(dlblock.calls) == calls
+    assert {rec.id for rec in datalinks} == {ids[3]}
+
+    # the keys only hold the values of their row
+    key = next(iter(datalink_cache._entries))
+    assert ("GROUP", "[10, 11, 12, 13, 14]") not in key[2]
+
+
+@pytest.mark.usefixtures('datalink_product')
+@pytest.mark.filterwarnings("ignore::astropy.io.votable.exceptions.E02")
+def test_from_result_url_cached(datalink_product, datalink_cache):
+    first = DatalinkResults.from_result_url("http://example.com/datalink.xml")
+    second = DatalinkResults.from_result_url(
+        "http://example.com/datalink.xml", original_row="row")
+
+    assert datalink_product.call_count == 1
+    assert len(first) == len(second)
+    assert second.original_row == "row"
+
+
+def test_datalink_cache_disk(dlblock, tmp_path):
+    ids = [f"ivo://example/obs?{i}" for i in range(3)]
+    try:
+        vo.dal.adhoc.enable_datalink_cache(directory=tmp_path)
+        list(_make_dlblock_results(ids).iter_datalinks())
+        assert len(list(tmp_path.glob("*.xml"))) == 3
+
+        # a new cache on the same directory starts out with the documents
+        cache = vo.dal.adhoc.enable_datalink_cache(directory=tmp_path)
+        assert len(cache) == 0
+        dlblock.calls.clear()
+        dls = list(_make_dlblock_results(ids).iter_datalinks(preserve_order=True))
+        assert dlblock.calls == []
+        assert [[rec.semantics for rec in dl] for dl in dls] == [
+            ["#this", "#preview"]] * 3
+
+        cache.clear()
+        assert list(tmp_path.glob("*.xml")) == []
+    finally:
+        vo.dal.adhoc.disable_datalink_cache()
+
+
+def test_datalink_cache_lru():
+    cache = vo.dal.adhoc.DatalinkCache(maxsize=2)
+    cache.put(cache.url_key("a"), "A")
+    cache.put(cache.url_key("b"), "B")
+    assert cache.get(cache.url_key("a")) == "A"
+    cache.put(cache.url_key("c"), "C")
+
+    # b was the least recently used
+    assert cache.url_key("b") not in cache
+    assert cache.get(cache.url_key("a")) == "A"
+    assert cache.get(cache.url_key("c")) == "C"
+
+    # parameter names are case-insensitive, their order does not matter
+    assert cache.query_key("http://x", {"ID": "1", "pos": "2"}) == cache.query_key(
+        "http://x", {"POS": "2", "id": "1"})
+
 
 @pytest.mark.usefixtures('proc', 'datalink_vocabulary')
 @pytest.mark.filterwarnings("ignore::astropy.io.votable.exceptions.W27")
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Tests for pyvo.dal.datasetcache
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests_mock
+
+from pyvo.dal.datasetcache import (
+    DatasetCache, enable_dataset_cache, disable_dataset_cache, get_dataset_cache)
+from pyvo.dal.exceptions import DALServiceError
+from pyvo.utils import testing
+
+
+@pytest.fixture()
+def datasets(mocker):
+    def callback(request, context):
+        name = request.path.rsplit("/", 1)[-1]
+        return (name * 100).encode("ascii")[:100]
+
+    with mocker.register_uri('GET', requests_mock.ANY, content=callback) as matcher:
+        with mocker.register_uri(
+                'GET', 'http://example.com/data/missing', status_code=404):
+            yield matcher
+
+
+@pytest.fixture()
+def cache(tmp_path):
+    yield enable_dataset_cache(str(tmp_path / "cache"))
+    disable_dataset_cache()
+
+
+def _make_results(rows):
+    return testing.create_dalresults([
+        dict(name="access_url", datatype="char", arraysize="*",
+             ucd="meta.ref.url;meta.dataset"),
+        dict(name="obs_publisher_did", datatype="char", arraysize="*")],
+        [(f"http://example.com/data/{name}", did) for name, did in rows])
+
+
+def test_enable_disable(tmp_path):
+    assert get_dataset_cache() is None
+    cache = enable_dataset_cache(str(tmp_path))
+    assert get_dataset_cache() is cache
+    disable_dataset_cache()
+    assert get_dataset_cache() is None
+
+
+def test_getdataset(datasets, cache):
+    results = _make_results([("a", "ivo://x/a"), ("b", "ivo://x/b")])
+
+    with results[0].getdataset() as f:
+        assert f.read() == b"a" * 100
+    with results[0].getdataset() as f:
+        assert f.read() == b"a" * 100
+    assert datasets.call_count == 1
+
+    results[1].getdataset().close()
+    assert datasets.call_count == 2
+    assert cache.size == 200
+
+
+def test_content_addressed(datasets, cache):
+    # the same bytes under two URLs are stored once
+    results = _make_results([("a", "ivo://x/a"), ("a?copy", "ivo://x/a2")])
+    for record in results:
+        record.getdataset().close()
+    assert datasets.call_count == 2
+    assert cache.size == 100
+
+
+def test_errors_not_cached(datasets, cache):
+    record = _make_results([("missing", "")])[0]
+    for _ in range(2):
+        with pytest.raises(DALServiceError):
+            record.getdataset()
+    assert cache.size == 0
+
+
+def test_cachedataset_links(datasets, cache, tmp_path):
+    record = _make_results([("a", "ivo://x/a")])[0]
+    target = tmp_path / "out"
+    record.cachedataset(dir=str(target))
+    record.cachedataset(filename=str(target / "again.dat"))
+    assert datasets.call_count == 1
+
+    assert sorted(os.listdir(target)) == ["again.dat", "dataset.dat"]
+    assert (target / "dataset.dat").read_bytes() == b"a" * 100
+    cached = cache.get_path(cache.keys_for(record))
+    assert os.path.samefile(cached, target / "dataset.dat")
+
+
+def test_cachedataset_copies(datasets, tmp_path):
+    cache = enable_dataset_cache(str(tmp_path / "cache"), link=False)
+    try:
+        record = _make_results([("a", "ivo://x/a")])[0]
+        record.cachedataset(filename=str(tmp_path / "copy.dat"))
+        record.cachedataset(filename=str(tmp_path / "copy.dat"))
+        assert datasets.call_count == 1
+        assert not os.path.samefile(
+            cache.get_path(cache.keys_for(record)), tmp_path / "copy.dat")
+        assert (tmp_path / "copy.dat").read_bytes() == b"a" * 100
+    finally:
+        disable_dataset_cache()
+
+
+def test_use_did(datasets, tmp_path):
+    enable_dataset_cache(str(tmp_path / "cache"), use_did=True)
+    try:
+        results = _make_results([("a", "ivo://x/a"), ("b", "ivo://x/a")])
+        with results[0].getdataset() as f:
+            assert f.read() == b"a" * 100
+        # same DID, different URL: served from the cache
+        with results[1].getdataset() as f:
+            assert f.read() == b"a" * 100
+        assert datasets.call_count == 1
+    finally:
+        disable_dataset_cache()
+
+
+def test_eviction(datasets, tmp_path):
+    cache = DatasetCache(str(tmp_path / "cache"), max_size=250)
+    results = _make_results([("a", ""), ("b", ""), ("c", "")])
+    for record in (results[0], results[1]):
+        cache.fetch(cache.keys_for(record), record._fetch_dataset)
+    # a was used more recently than b
+    assert cache.get_path(cache.keys_for(results[0])) is not None
+    cache.fetch(cache.keys_for(results[2]), results[2]._fetch_dataset)
+
+    assert cache.size == 200
+    assert cache.get_path(cache.keys_for(results[1])) is None
+    assert cache.get_path(cache.keys_for(results[0])) is not None
+    assert cache.get_path(cache.keys_for(results[2])) is not None
+
+    cache.clear()
+    assert cache.size == 0
+    assert cache.get_path(cache.keys_for(results[2])) is None
+
+
+def test_hits_leave_files_alone(datasets, tmp_path):
+    cache = DatasetCache(str(tmp_path / "cache"), max_size=250)
+    record = _make_results([("a", "")])[0]
+    path = cache.fetch(cache.keys_for(record), record._fetch_dataset)
+    os.utime(path, (0, 0))
+
+    assert cache.get_path(cache.keys_for(record)) == path
+    assert os.stat(path).st_mtime == 0
+
+
+def test_existing_cache(datasets, tmp_path):
+    cache = DatasetCache(str(tmp_path / "cache"), max_size=250)
+    results = _make_results([("a", ""), ("b", ""), ("c", "")])
+    for index, record in enumerate((results[0], results[1])):
+        path = cache.fetch(cache.keys_for(record), record._fetch_dataset)
+        os.utime(path, (index, index))
+    # as left by a version without an index
+    os.remove(tmp_path / "cache" / "index.json")
+
+    assert cache.size == 200
+    cache.fetch(cache.keys_for(results[2]), results[2]._fetch_dataset)
+    assert cache.get_path(cache.keys_for(results[0])) is None
+    assert cache.get_path(cache.keys_for(results[1])) is not None
+
+
+def test_concurrent_puts(datasets, cache):
+    results = _make_results([(name, "") for name in "abcd"])
+
+    def read(index):
+        with results[index % 4].getdataset() as f:
+            return f.read()
+
+    with ThreadPoolExecutor(4) as executor:
+        contents = list(executor.map(read, range(16)))
+    assert contents == [(name * 100).encode("ascii") for name in "abcd"] * 4
+    assert cache.size == 400
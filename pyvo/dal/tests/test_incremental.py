@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Tests for pyvo.dal.incremental
+"""
+import numpy as np
+import pytest
+
+from pyvo.dal import TAPResults
+from pyvo.dal import incremental
+from pyvo.dal.incremental import IncrementalStore
+from pyvo.utils import testing
+
+FIELDS = [
+    {"name": "ingested", "datatype": "char", "arraysize": "*"},
+    {"name": "code", "datatype": "char", "arraysize": "4"},
+    {"name": "mag", "datatype": "float"},
+]
+
+
+def make_results(rows, masked=()):
+    results = testing.create_dalresults(FIELDS, rows, resultsClass=TAPResults)
+    for index, name in masked:
+        results.resultstable.array.mask[name][index] = True
+    return results
+
+
+def test_store(tmp_path):
+    store = IncrementalStore(str(tmp_path))
+    key = store.key("http://example.com/tap", "SELECT * FROM t", "ingested")
+    assert store.get_state(key) is None
+
+    state = store.save(key, make_results(
+        [("2024-01-02", "ab", 1.5), ("2024-01-01", "cd", 2.5)], masked=[(1, "mag")]),
+        "ingested")
+    assert state["watermark"] == "2024-01-02"
+    assert state["nrows"] == 2
+
+    state = store.save(
+        key, make_results([("2024-01-03", "ef", 3.5)]), "ingested", append=True)
+    assert state["watermark"] == "2024-01-03"
+
+    results = store.load(key, TAPResults, url="http://example.com/tap")
+    assert isinstance(results, TAPResults)
+    assert results["ingested"].tolist() == ["2024-01-02", "2024-01-01", "2024-01-03"]
+    assert results["code"].tolist() == ["ab", "cd", "ef"]
+    np.testing.assert_array_equal(np.ma.getmaskarray(results["mag"]), [False, True, False])
+    assert results.resultstable.array.dtype == make_results([]).resultstable.array.dtype
+
+    state = store.save(key, make_results([("2023-12-01", "gh", 0.5)]), "ingested")
+    assert state["nrows"] == 1
+    assert state["watermark"] == "2023-12-01"
+
+
+def test_schema_mismatch(tmp_path):
+    store = IncrementalStore(str(tmp_path))
+    store.save("key", make_results([("2024-01-01", "ab", 1.5)]), "ingested")
+
+    other = testing.create_dalresults(FIELDS[:2], [("2024-01-02", "cd")], resultsClass=TAPResults)
+    with pytest.raises(ValueError):
+        store.save("key", other, "ingested", append=True)
+
+
+def test_null_watermark(tmp_path):
+    store = IncrementalStore(str(tmp_path))
+    state = store.save("key", make_results([], masked=()), "mag")
+    assert state["watermark"] is None
+
+    store.clear()
+    assert store.get_state("key") is None
+
+
+def test_ties(tmp_path):
+    store = IncrementalStore(str(tmp_path))
+    store.save("key", make_results([("2024-01-01", "ab", 1.5), ("2024-01-02", "cd", 2.5)]),
+               "ingested")
+    state = store.save("key", make_results(
+        [("2024-01-02", "cd", 2.5), ("2024-01-02", "ef", 3.5)]), "ingested", append=True)
+    assert state["nrows"] == 3
+    assert len(state["ties"]) == 2
+
+    results = store.load("key", TAPResults)
+    assert results["code"].tolist() == ["ab", "cd", "ef"]
+
+
+def test_ties_digests(tmp_path, monkeypatch):
+    store = IncrementalStore(str(tmp_path))
+    store.save("key", make_results([("2024-01-01", "ab", 1.5), ("2024-01-02", "cd", np.nan)]),
+               "mag")
+
+    digested = []
+    original = incremental._row_digest
+
+    def _row_digest(data, mask, index):
+        digested.append(data[index]["code"])
+        return original(data, mask, index)
+
+    monkeypatch.setattr(incremental, "_row_digest", _row_digest)
+    state = store.save("key", make_results(
+        [("2024-01-01", "ab", 1.5), ("2024-01-03", "ef", 0.5), ("2024-01-04", "gh", 3.5)]),
+        "mag", append=True)
+    # only the rows at the old and the new watermark are digested
+    assert digested == ["ab", "gh"]
+    assert state["watermark"] == 3.5
+    assert state["nrows"] == 4
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Tests for pyvo.dal.jobjournal
+"""
+from pyvo.dal.jobjournal import JobJournal
+
+
+def test_journal(tmp_path):
+    path = str(tmp_path / "journal.json")
+    journal = JobJournal(path, max_jobs=2)
+    assert journal.lookup("a") == []
+
+    for job in ("1", "2", "3", "2"):
+        journal.record("a", f"http://example.com/tap/async/{job}")
+    journal.record("b", "http://example.com/tap/async/4")
+    assert journal.lookup("a") == [
+        "http://example.com/tap/async/2", "http://example.com/tap/async/3"]
+
+    journal.forget("b", "http://example.com/tap/async/4")
+    assert len(journal) == 1
+
+    restored = JobJournal(path)
+    assert restored.lookup("a") == journal.lookup("a")
+    assert restored.lookup("b") == []
+
+    restored.clear()
+    assert len(JobJournal(path)) == 0
+
+
+def test_memory():
+    journal = JobJournal()
+    journal.record("a", "http://example.com/tap/async/1")
+    journal.forget("a", "http://example.com/tap/async/2")
+    assert journal.lookup("a") == ["http://example.com/tap/async/1"]
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Tests for pyvo.dal.localquery
+"""
+import pickle
+
+import numpy as np
+import pytest
+
+from pyvo.dal import TAPResults
+from pyvo.dal.adql import parse_select
+from pyvo.dal import localquery
+from pyvo.dal.localquery import LocalQueryCache, evaluate, is_refinement
+from pyvo.utils import testing
+
+FIELDS = [
+    {"name": "id", "datatype": "long"},
+    {"name": "Name", "datatype": "char", "arraysize": "*"},
+    {"name": "mag", "datatype": "float"},
+]
+
+ROWS = [
+    (1, "a", 12.5),
+    (2, "b", 9.0),
+    (3, "c", 15.0),
+    (4, "d", 0.0),
+    (5, "e", 11.0),
+]
+
+
+def make_results():
+    results = testing.create_dalresults(FIELDS, ROWS, resultsClass=TAPResults)
+    # the magnitude of d is null
+    results.resultstable.array.mask["mag"][3] = True
+    return results
+
+
+def run(query, results=None):
+    return evaluate(parse_select(query), results or make_results())
+
+
+@pytest.mark.parametrize("condition,ids", [
+    ("mag < 12", [2, 5]),
+    ("mag >= 12.5", [1, 3]),
+    ("mag BETWEEN 9 AND 11", [2, 5]),
+    ("mag NOT BETWEEN 9 AND 11", [1, 3]),
+    ("id IN (1, 4, 7)", [1, 4]),
+    ("id NOT IN (1, 4)", [2, 3, 5]),
+    ("name = 'c' OR name = 'e'", [3, 5]),
+    ("name <> 'c'", [1, 2, 4, 5]),
+    ("NOT mag > 10", [2]),
+    ("NOT (mag > 10 AND id > 2)", [1, 2]),
+    ("mag > 10 OR id = 4", [1, 3, 4, 5]),
+    ("mag IS NULL", [4]),
+    ("mag IS NOT NULL AND id < 3", [1, 2]),
+    ("id < mag", [1, 2, 3, 5]),
+])
+def test_conditions(condition, ids):
+    assert run(f"SELECT * FROM t WHERE {condition}")["id"].tolist() == ids
+
+
+def test_order_and_top():
+    assert run("SELECT * FROM t ORDER BY mag")["id"].tolist() == [2, 5, 1, 3, 4]
+    assert run("SELECT * FROM t ORDER BY mag DESC")["id"].tolist() == [4, 3, 1, 5, 2]
+    assert run("SELECT TOP 2 * FROM t WHERE id > 1 ORDER BY mag DESC")["id"].tolist() == [4, 3]
+    assert run("SELECT TOP 0 * FROM t")["id"].tolist() == []
+
+
+def test_projection():
+    results = run('SELECT mag, "Name" FROM t WHERE id < 3')
+    assert isinstance(results, TAPResults)
+    assert results.fieldnames == ("mag", "Name")
+    assert results["Name"].tolist() == ["a", "b"]
+    assert results.to_table().colnames == ["mag", "Name"]
+
+    restored = pickle.loads(pickle.dumps(results))
+    assert restored.fieldnames == ("mag", "Name")
+    assert restored["mag"].tolist() == [12.5, 9.0]
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM t WHERE name > 'a'",
+    "SELECT * FROM t WHERE mag = 'a'",
+    "SELECT * FROM t ORDER BY name",
+    "SELECT * FROM t WHERE flux > 1",
+    'SELECT * FROM t WHERE "name" = \'a\'',
+    "SELECT id, id FROM t",
+])
+def test_not_evaluated(query):
+    with pytest.raises(ValueError):
+        run(query)
+
+
+@pytest.mark.parametrize("query,cached,expected", [
+    ("SELECT * FROM t WHERE mag < 10", "SELECT * FROM t", True),
+    ("SELECT id FROM t", "SELECT id, mag FROM t", True),
+    ("SELECT * FROM t", "SELECT id FROM t", False),
+    ("SELECT * FROM u", "SELECT * FROM t", False),
+    ("SELECT * FROM t", "SELECT * FROM t WHERE mag < 10", False),
+    ("SELECT * FROM t", "SELECT TOP 10 * FROM t", False),
+    ("SELECT * FROM t WHERE mag < 10 AND id > 2", "SELECT * FROM t WHERE id > 2", True),
+    ("SELECT * FROM t WHERE mag < 10", "SELECT * FROM t WHERE mag < 12", True),
+    ("SELECT * FROM t WHERE mag <= 12", "SELECT * FROM t WHERE mag < 12", False),
+    ("SELECT * FROM t WHERE mag < 12", "SELECT * FROM t WHERE mag <= 12", True),
+    ("SELECT * FROM t WHERE mag > 12", "SELECT * FROM t WHERE mag < 14", False),
+    ("SELECT * FROM t WHERE mag BETWEEN 10 AND 11", "SELECT * FROM t WHERE mag < 12", True),
+    ("SELECT * FROM t WHERE id IN (1, 2)", "SELECT * FROM t WHERE id < 3", True),
+    ("SELECT * FROM t WHERE id = 3", "SELECT * FROM t WHERE id < 3", False),
+    ("SELECT * FROM t WHERE id = 2", "SELECT * FROM t WHERE id IN (1, 2)", True),
+    ("SELECT * FROM t WHERE name = 'a'", "SELECT * FROM t WHERE name IN ('a', 'b')", True),
+    ("SELECT * FROM t WHERE name = 'a'", "SELECT * FROM t WHERE name IN (1, 2)", False),
+    ("SELECT * FROM t WHERE mag < 1", "SELECT * FROM t WHERE mag IS NOT NULL", True),
+    ("SELECT * FROM t WHERE mag < 1", "SELECT * FROM t WHERE id < 3 OR mag < 1", False),
+    ("SELECT * FROM t WHERE (id < 3 OR mag < 1) AND id > 0",
+     "SELECT * FROM t WHERE mag < 1 OR id < 3", False),
+    ("SELECT * FROM t WHERE (id < 3 OR mag < 1) AND id > 0",
+     "SELECT * FROM t WHERE id < 3 OR mag < 1", True),
+])
+def test_is_refinement(query, cached, expected):
+    assert is_refinement(parse_select(query), parse_select(cached)) is expected
+
+
+def test_cache():
+    cache = LocalQueryCache(max_entries=2)
+    results = make_results()
+    assert cache.remember("http://example.com/tap", "SELECT * FROM t WHERE id > 0", results)
+    assert not cache.remember("http://example.com/tap", "SELECT TOP 5 * FROM t", results)
+    assert not cache.remember("http://example.com/tap", "SELECT COUNT(*) FROM t", results)
+
+    answer = cache.answer("http://example.com/tap", "SELECT id FROM t WHERE id > 3")
+    assert answer["id"].tolist() == [4, 5]
+    assert cache.answer("http://example.com/tap", "SELECT * FROM t WHERE id > 3", maxrec=1) is None
+    assert cache.answer("http://example.com/tap", "SELECT * FROM t") is None
+    assert cache.answer("http://example.org/tap", "SELECT id FROM t WHERE id > 3") is None
+    assert cache.answer("http://example.com/tap", "SELECT x FROM t WHERE id > 3") is None
+
+    cache.remember("http://example.com/tap", "SELECT * FROM u", results)
+    cache.remember("http://example.com/tap", "SELECT * FROM v", results)
+    assert len(cache) == 2
+    assert cache.answer("http://example.com/tap", "SELECT id FROM t WHERE id > 3") is None
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_overflow_not_remembered():
+    results = make_results()
+    results._status = ("OVERFLOW", "")
+    assert not LocalQueryCache().remember("http://example.com/tap", "SELECT * FROM t", results)
+
+
+def test_max_age(monkeypatch):
+    now = [100.]
+    monkeypatch.setattr(localquery.time, "monotonic", lambda: now[0])
+    cache = LocalQueryCache(max_age=10)
+    cache.remember("http://example.com/tap", "SELECT * FROM t", make_results())
+
+    now[0] = 110.
+    assert len(cache.answer("http://example.com/tap", "SELECT * FROM t WHERE id > 3")) == 2
+    now[0] = 110.5
+    assert cache.answer("http://example.com/tap", "SELECT * FROM t WHERE id > 3") is None
+    assert len(cache) == 0
+
+
+def test_remembered_rows_copied():
+    cache = LocalQueryCache()
+    results = make_results()
+    cache.remember("http://example.com/tap", "SELECT * FROM t", results)
+    results.resultstable.array["id"][:] = 0
+    results.resultstable.array["Name"][0] = "x"
+    results.compact()
+
+    answer = cache.answer("http://example.com/tap", "SELECT * FROM t WHERE id > 3")
+    assert answer["id"].tolist() == [4, 5]
+    assert cache.answer("http://example.com/tap", "SELECT Name FROM t WHERE id = 1")["Name"][0] == "a"
+
+
+def test_results_unchanged():
+    results = make_results()
+    run("SELECT TOP 1 id FROM t WHERE mag > 1 ORDER BY mag", results)
+    assert results.fieldnames == ("id", "Name", "mag")
+    assert len(results) == len(ROWS)
+    np.testing.assert_array_equal(
+        np.ma.getmaskarray(results["mag"]), [False, False, False, True, False])
@@ -5,9 +5,14 @@ Tests for pyvo.dal.mimetype
 """
 
 from functools import partial
+from io import BytesIO
+import re
+
+import numpy as np
 import pytest
 import requests_mock
 
+from astropy.io import fits
 from astropy.utils.data import get_pkg_data_contents
 
 from pyvo.dal.mimetype import mime_object_maker
@@ -51,11 +56,60 @@ def test_mime_object_maker():
     assert img
     assert 'JPEG' == img.format
 
-    fits = mime_object_maker(mime_url + 'fits', 'application/fits')
-    assert 2 == len(fits)
+    with mime_object_maker(mime_url + 'fits', 'application/fits') as fits:
+        assert 2 == len(fits)
 
     # error cases
     with pytest.raises(ValueError):
         mime_object_maker(None, "not/a/mime/type")
     with pytest.raises(ValueError):
         mime_object_maker(None, None)
+
+
+@pytest.fixture()
+def big_fits():
+    image = np.arange(1000 * 1000, dtype=np.float64).reshape(1000, 1000)
+    primary = fits.PrimaryHDU()
+    primary.header["OBJECT"] = "big"
+    output = BytesIO()
+    fits.HDUList([primary, fits.ImageHDU(image, name="SCI")]).writeto(output)
+    return output.getvalue()
+
+
+@pytest.fixture()
+def range_server(mocker, big_fits):
+    served = []
+
+    def callback(request, context):
+        match = re.match(r"bytes=(\d+)-(\d+)", request.headers.get("Range", ""))
+        if request.url.endswith("ranges") and match:
+            start, end = int(match.group(1)), min(int(match.group(2)), len(big_fits) - 1)
+            context.status_code = 206
+            context.headers["Content-Range"] = f"bytes {start}-{end}/{len(big_fits)}"
+            content = big_fits[start:end + 1]
+        else:
+            content = big_fits
+        served.append(len(content))
+        return content
+
+    with mocker.register_uri('GET', requests_mock.ANY, content=callback):
+        yield served
+
+
+def test_fits_range_requests(range_server, big_fits):
+    with mime_object_maker(mime_url + 'ranges', 'application/fits') as hdus:
+        assert hdus[0].header["OBJECT"] == "big"
+        assert sum(range_server) < len(big_fits) / 10
+
+        assert hdus["SCI"].section[500, 10:20].tolist() == list(range(500010, 500020))
+        assert sum(range_server) < len(big_fits) / 10
+
+        assert hdus["SCI"].data[999, 999] == 999999
+        assert len(hdus) == 2
+
+
+def test_fits_no_range_support(range_server, big_fits):
+    with mime_object_maker(mime_url + 'plain', 'application/fits') as hdus:
+        assert hdus[0].header["OBJECT"] == "big"
+        assert hdus[1].data[999, 999] == 999999
+    assert range_server == [len(big_fits)]
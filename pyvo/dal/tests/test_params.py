@@ -7,13 +7,16 @@ from functools import partial
 from urllib.parse import parse_qsl
 
 from pyvo.dal.adhoc import DatalinkResults
-from pyvo.dal.params import find_param_by_keyword, get_converter, AbstractDalQueryParam, IntervalQueryParam
+from pyvo.dal.params import (find_param_by_keyword, get_converter, AbstractDalQueryParam, IntervalQueryParam,
+                             PosQueryParam, TimeQueryParam)
 from pyvo.dal.exceptions import DALServiceError
 
 import pytest
 
 import numpy as np
 import astropy.units as u
+from astropy.coordinates import SkyCoord
+from astropy.time import Time
 from astropy.utils.data import get_pkg_data_contents, get_pkg_data_fileobj
 
 get_pkg_data_contents = partial(
@@ -224,3 +227,117 @@ def test_dal_format():
     # But unitless intervals are not
     with pytest.raises(ValueError):
         iqp.get_dal_format((2, 1))
+
+
+class TestArrayValues:
+    """
+    Arrays of values must give exactly what adding their values one by one
+    gives.
+    """
+    rng = np.random.default_rng(42)
+
+    def test_pos_circles(self):
+        circles = np.stack([self.rng.uniform(0, 360, 50),
+                            self.rng.uniform(-90, 90, 50),
+                            self.rng.uniform(0.001, 1, 50)], axis=1)
+        param = PosQueryParam()
+        param.update(circles)
+        assert param.dal == [PosQueryParam().get_dal_format(tuple(c)) for c in circles]
+        assert len(param) == 50
+        assert tuple(list(param)[3]) == tuple(circles[3])
+
+        param = PosQueryParam()
+        param.update(circles * u.deg)
+        assert param.dal == [PosQueryParam().get_dal_format(tuple(c)) for c in circles * u.deg]
+
+    def test_pos_skycoord(self):
+        coords = SkyCoord(self.rng.uniform(0, 360, 20), self.rng.uniform(-90, 90, 20), unit='deg')
+        radii = self.rng.uniform(1, 100, 20) * u.arcsec
+        param = PosQueryParam()
+        param.update((coords, radii))
+        assert param.dal == [PosQueryParam().get_dal_format((coord, radius))
+                             for coord, radius in zip(coords, radii)]
+
+        param = PosQueryParam()
+        param.update((coords, 0.1))
+        assert param.dal == [PosQueryParam().get_dal_format((coord, 0.1)) for coord in coords]
+        assert list(param)[0] == (coords[0], 0.1)
+
+    def test_pos_ranges_polygons(self):
+        param = PosQueryParam()
+        param.update(np.array([[1, 2, 3, 4], [10, 20, -30, 40], [1, 2, 3, 4]]))
+        assert param.dal == ['RANGE 1.0 2.0 3.0 4.0', 'RANGE 10.0 20.0 -30.0 40.0']
+
+        param = PosQueryParam()
+        param.update(np.array([[1, 2, 3, 4, 5, 6]]) * u.deg)
+        assert param.dal == [PosQueryParam().get_dal_format((1, 2, 3, 4, 5, 6))]
+
+    @pytest.mark.parametrize('values, message', [
+        (np.array([[1, 2, 0.1], [400, 2, 0.1]]), 'Invalid ra: 400.0 deg'),
+        (np.array([[1, 2, 0.1], [1, 95, 0.1]]), 'Invalid dec: 95.0 deg'),
+        (np.array([[1, 2, 0]]), 'Invalid circle radius: 0.0 deg'),
+        (np.array([[2, 1, 3, 4]]), 'min > max in ra range'),
+        (np.array([[1, 2, 4, 3]]), 'min > max in dec range'),
+        (np.array([[1, 2]]), 'a 2-length pos should be a coordinate and a radius'),
+        (np.array([[1, 2, 3, 4, 5]]), 'Invalid shape')])
+    def test_pos_invalid(self, values, message):
+        param = PosQueryParam()
+        with pytest.raises(ValueError, match=message):
+            param.update(values)
+        assert not param.dal
+
+    def test_default(self):
+        class Test(AbstractDalQueryParam):
+            def is_array(self, values):
+                return isinstance(values, np.ndarray)
+
+            def get_dal_format(self, item):
+                return str(item)
+
+        param = Test()
+        param.update(np.array([3, 1, 3, 2]))
+        assert param.dal == ['3', '1', '2']
+        assert list(param) == [3, 1, 2]
+
+    def test_intervals(self):
+        intervals = np.stack([self.rng.uniform(1, 10, 30), self.rng.uniform(10, 20, 30)], axis=1)
+        param = IntervalQueryParam(unit=u.m, equivalencies=u.spectral())
+        param.update(intervals * u.GHz)
+        assert param.dal == [param.get_dal_format(tuple(i)) for i in intervals * u.GHz]
+
+        param = IntervalQueryParam(unit=u.m)
+        param.update(intervals)
+        assert param.dal == [param.get_dal_format(tuple(i)) for i in intervals]
+
+        param = IntervalQueryParam()
+        param.update(np.array([[1, 2], [3, 4]]))
+        assert param.dal == ['1 2', '3 4']
+        assert list(param) == [(1, 2), (3, 4)]
+
+        with pytest.raises(ValueError, match='Invalid interval'):
+            param.update(np.array([[2, 1]]))
+
+    def test_times(self):
+        mjds = np.sort(self.rng.uniform(50000, 60000, (10, 2)), axis=1)
+        times = Time(mjds, format='mjd')
+        param = TimeQueryParam()
+        param.update(times)
+        assert param.dal == [param.get_dal_format(tuple(t)) for t in times]
+
+        param = TimeQueryParam()
+        param.update(times[:, 0])
+        assert param.dal == [param.get_dal_format(t) for t in times[:, 0]]
+        assert list(param)[0] == times[0, 0]
+
+        with pytest.raises(ValueError, match='Invalid time interval'):
+            param.update(times[:, ::-1])
+
+    def test_duplicates(self):
+        param = IntervalQueryParam(unit=u.m)
+        param.add((1, 2))
+        param.update(np.array([[1, 2], [2, 3], [2, 3]]) * u.m)
+        assert param.dal == ['1.0 2.0', '2.0 3.0']
+        assert (2, 3) * u.m in param
+        param.discard((2, 3))
+        assert (2, 3) * u.m not in param
+        assert param.dal == ['1.0 2.0']
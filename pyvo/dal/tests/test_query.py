@@ -3,6 +3,10 @@
 """
 Tests for pyvo.dal.query
 """
+import pickle
+import re
+import subprocess
+import sys
 import warnings
 from functools import partial
 
@@ -16,10 +20,16 @@ import numpy as np
 
 import platform
 
-from pyvo.dal.query import DALService, DALQuery, DALResults, Record, Upload
+from pyvo.dal.query import DALService, DALQuery, DALResults, Record, Upload, table_conversion_count
+from pyvo.dal.adhoc import DatalinkResults
+from pyvo.dal.tap import TAPResults
 from pyvo.dal.exceptions import DALServiceError, DALQueryError, DALFormatError, DALOverflowWarning
+from pyvo.dal.serialization import _Record, _Strings
+from pyvo.utils import testing
 from pyvo.version import version
 
+from astropy import units as u
+from astropy.coordinates import SkyCoord
 from astropy.table import Table, QTable
 from astropy.io.votable import parse as votableparse
 from astropy.io.votable.tree import VOTableFile
@@ -327,6 +337,13 @@ class TestDALQuery:
             with pytest.raises(DALFormatError):
                 query.execute_votable()
 
+    def test_execute_votable_columns(self):
+        query = DALQuery('http://example.com/query/basic')
+        table = query.execute_votable(columns=['2'], max_rows=2).get_first_table()
+
+        assert [field.name for field in table.fields] == ['2']
+        assert len(table.array) == 2
+
 
 @pytest.mark.filterwarnings('ignore::astropy.io.votable.exceptions.W03')
 @pytest.mark.filterwarnings('ignore::astropy.io.votable.exceptions.W06')
@@ -352,6 +369,16 @@ class TestDALResults:
             'http://example.com/query/basic')
         assert dalresults.status == ('OK', 'OK')
 
+    def test_from_result_url_columns(self):
+        dalresults = DALResults.from_result_url(
+            'http://example.com/query/basic', columns=[0], max_rows=1)
+        assert dalresults.fieldnames == ('1',)
+        assert len(dalresults) == 1
+
+        with pytest.raises(ValueError):
+            DALResults.from_result_url(
+                'http://example.com/query/basic', columns=['nonexistent'])
+
     def test_init_errorstatus(self):
         with pytest.raises(DALQueryError):
             DALResults.from_result_url('http://example.com/query/errorstatus')
@@ -424,6 +451,36 @@ class TestDALResults:
         assert len(dalresults) == len(dalresults.to_table())
         assert len(dalresults) == len(dalresults.to_qtable())
 
+    def test_table_view(self):
+        dalresults = DALResults.from_result_url(
+            'http://example.com/query/basic')
+        conversions = table_conversion_count()
+
+        view = dalresults.to_table(copy=False)
+        repr(dalresults)
+        dalresults.to_table()
+        dalresults.to_qtable()
+        assert dalresults.to_table(copy=False) is view
+        assert table_conversion_count() == conversions + 1
+
+        assert np.shares_memory(view['1'], dalresults.resultstable.array)
+        with pytest.raises(ValueError):
+            view['1'][0] = 0
+
+        table = dalresults.to_table()
+        table['1'][0] = 0
+        assert dalresults['1'][0] != 0
+        assert view.pformat() == dalresults.to_table().pformat()
+
+    def test_table_view_replaced_table(self):
+        dalresults = DALResults.from_result_url(
+            'http://example.com/query/basic')
+        view = dalresults.to_table(copy=False)
+
+        dalresults.resultstable.array = dalresults.resultstable.array[:1]
+        assert len(dalresults.to_table(copy=False)) == 1
+        assert len(view) == 3
+
     def test_id_over_name(self):
         dalresults = DALResults.from_result_url(
             'http://example.com/query/basic')
@@ -524,6 +581,258 @@ class TestDALResults:
         assert result2._client_set_maxrec is None
 
 
+class TestDALResultsSpatial:
+    def _make_results(self, ra_desc, dec_desc, records):
+        return testing.create_dalresults([
+            dict(name="id", datatype="char", arraysize="*"),
+            dict(ra_desc, datatype="double"),
+            dict(dec_desc, datatype="double")], records)
+
+    def test_position_columns(self):
+        results = self._make_results(
+            dict(name="alpha", ucd="pos.eq.ra;meta.main", unit="deg"),
+            dict(name="delta", ucd="pos.eq.dec;meta.main", unit="deg"),
+            [("a", 10, 10), ("b", 10.1, 10), ("c", 20, -5)])
+        assert results._find_position_fieldnames() == ("alpha", "delta")
+
+        results = self._make_results(
+            dict(name="s_ra", unit="deg"), dict(name="s_dec", unit="deg"), [])
+        assert results._find_position_fieldnames() == ("s_ra", "s_dec")
+
+        results = testing.create_dalresults(
+            [dict(name="id", datatype="char", arraysize="*")], [("a",)])
+        with pytest.raises(KeyError):
+            results.spatial_index
+
+    def test_lookups(self):
+        results = self._make_results(
+            dict(name="ra", ucd="POS_EQ_RA_MAIN", unit="arcmin"),
+            dict(name="dec", ucd="POS_EQ_DEC_MAIN", unit="arcmin"),
+            [("a", 600, 600), ("b", 606, 600), ("c", 1200, -300)])
+
+        indices, separations = results.nearest(SkyCoord([10, 19], [10.2, -5], unit="deg"))
+        assert list(indices) == [0, 2]
+        assert separations[0].to_value(u.deg) == pytest.approx(0.2)
+
+        indices, separations = results.within((10, 10), 0.5 * u.deg)
+        assert list(indices) == [0, 1]
+
+        assert results.spatial_index is results.spatial_index
+
+        indices, other_indices, separations = results.crossmatch(results, 0.2)
+        assert sorted(zip(indices, other_indices)) == [
+            (0, 0), (0, 1), (1, 0), (1, 1), (2, 2)]
+
+
+class TestIterDatasets:
+    @pytest.fixture()
+    def datasets(self, mocker):
+        def callback(request, context):
+            return request.path.encode("ascii")
+
+        with ExitStack() as stack:
+            matcher = stack.enter_context(mocker.register_uri(
+                'GET', re.compile('http://example.com/datasets/ds.*'), content=callback))
+            stack.enter_context(mocker.register_uri(
+                'GET', 'http://example.com/datasets/missing', status_code=404))
+            yield matcher
+
+    def _make_results(self, names):
+        return testing.create_dalresults([
+            dict(name="access_url", datatype="char", arraysize="*",
+                 ucd="meta.ref.url;meta.dataset")],
+            [(f"http://example.com/datasets/{name}",) for name in names])
+
+    @pytest.mark.parametrize("prefetch", [0, 1, 3])
+    @pytest.mark.parametrize("to", ["memory", "tempfile"])
+    def test_iter(self, datasets, prefetch, to):
+        results = self._make_results(["ds0", "ds1", "missing", "ds3"])
+        downloads = list(results.iter_datasets(prefetch=prefetch, to=to))
+
+        assert [download.record.getdataurl() for download in downloads] == [
+            record.getdataurl() for record in results]
+        assert downloads[0].data.read() == b"/datasets/ds0"
+        assert downloads[3].data.read() == b"/datasets/ds3"
+        assert downloads[2].data is None
+        assert isinstance(downloads[2].error, DALServiceError)
+        if to == "tempfile":
+            assert downloads[1].data.name.endswith(".dat")
+        for download in downloads:
+            if download.data is not None:
+                download.data.close()
+
+    def test_close(self, datasets):
+        results = self._make_results([f"ds{index}" for index in range(20)])
+        iterator = results.iter_datasets(prefetch=2)
+        assert next(iterator).data.read() == b"/datasets/ds0"
+        iterator.close()
+        # the current dataset and at most prefetch more were requested
+        assert datasets.call_count <= 3
+
+    def test_invalid_to(self):
+        with pytest.raises(ValueError):
+            next(self._make_results(["ds0"]).iter_datasets(to="disk"))
+
+
+@pytest.mark.filterwarnings('ignore::astropy.io.votable.exceptions.W03')
+@pytest.mark.filterwarnings('ignore::astropy.io.votable.exceptions.W06')
+@pytest.mark.usefixtures('register_mocks')
+class TestPickling:
+    def _make_results(self, results_class=TAPResults):
+        results = testing.create_dalresults([
+            dict(name="id", datatype="char", arraysize="*"),
+            dict(name="n", datatype="int"),
+            dict(name="ra", datatype="double", unit="deg")],
+            [("a", 1, 10.5), ("bb", 2, np.nan), ("ccc", 3, 12.)],
+            resultsClass=results_class)
+        results.resultstable.array.mask[1]["n"] = True
+        return results
+
+    def _check_copy(self, results, copy):
+        assert type(copy) is type(results)
+        assert copy.fieldnames == results.fieldnames
+        assert copy.queryurl == results.queryurl
+        assert copy.status == results.status
+        for name in results.fieldnames:
+            assert copy.getdesc(name).unit == results.getdesc(name).unit
+            column, expected = copy.getcolumn(name), results.getcolumn(name)
+            np.testing.assert_array_equal(column.data, expected.data)
+            np.testing.assert_array_equal(np.ma.getmaskarray(column), np.ma.getmaskarray(expected))
+
+    @pytest.mark.parametrize("results_class", [DALResults, TAPResults, DatalinkResults])
+    def test_roundtrip(self, results_class):
+        results = self._make_results(results_class)
+        results._session = object()
+        copy = pickle.loads(pickle.dumps(results))
+
+        self._check_copy(results, copy)
+        assert copy.resultstable.array.mask[1]["n"]
+        assert copy._session_value is None
+        assert copy.getrecord(0)._session is copy._session
+
+    def test_parsed(self):
+        results = DALResults.from_result_url('http://example.com/query/basic')
+        self._check_copy(results, pickle.loads(pickle.dumps(results)))
+
+        with pytest.warns(DALOverflowWarning):
+            results = DALResults.from_result_url(
+                'http://example.com/query/overflowstatus')
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DALOverflowWarning)
+            copy = pickle.loads(pickle.dumps(results))
+        assert copy.status == results.status
+
+    def test_records(self):
+        results = self._make_results()
+        records = pickle.loads(pickle.dumps([results[0], results[2]]))
+        assert records[0]["id"] == "a"
+        assert records[1]["id"] == "ccc"
+        assert records[0]._results is records[1]._results
+
+    def test_datalink_original_row(self):
+        parent = self._make_results()
+        results = self._make_results(DatalinkResults)
+        results.original_row = parent[1]
+        copy = pickle.loads(pickle.dumps(results))
+        assert copy.original_row["id"] == "bb"
+
+    def test_shared_memory(self):
+        results = self._make_results()
+        with results.to_shared_memory() as shared:
+            received = pickle.loads(pickle.dumps(shared))
+            assert received.name == shared.name
+            copy = received.load()
+            received.close()
+        self._check_copy(results, copy)
+        assert copy.resultstable.array.mask[1]["n"]
+
+    def test_shared_memory_strings(self):
+        results = self._make_results()
+        results.resultstable.array["id"][1] = "\u00e4\ud800"
+        with results.to_shared_memory() as shared:
+            spec = shared._layout[0][0]
+            assert isinstance(spec, _Record)
+            assert isinstance(spec.columns["id"], _Strings)
+            copy = pickle.loads(pickle.dumps(shared)).load()
+        self._check_copy(results, copy)
+
+    def test_shared_memory_objects(self):
+        results = self._make_results()
+        results.resultstable.array["id"][1] = np.arange(3)
+        with results.to_shared_memory() as shared:
+            # pickled with the layout
+            assert isinstance(shared._layout[0][0].columns["id"], np.ndarray)
+            copy = pickle.loads(pickle.dumps(shared)).load()
+        assert copy["id"][0] == "a"
+        assert copy["id"][1].tolist() == [0, 1, 2]
+
+    def test_shared_memory_other_process(self):
+        results = self._make_results()
+        with results.to_shared_memory() as shared:
+            # a process not started by multiprocessing must not unlink it
+            code = ("import pickle, sys; "
+                    "shared = pickle.loads(sys.stdin.buffer.read()); "
+                    "print(len(shared.load())); shared.close()")
+            process = subprocess.run(
+                [sys.executable, "-c", code], input=pickle.dumps(shared),
+                capture_output=True, check=True)
+            assert process.stdout.strip() == b"3"
+            assert b"leaked" not in process.stderr
+            self._check_copy(results, pickle.loads(pickle.dumps(shared)).load())
+
+
+class TestCompact:
+    def _make_results(self, nrows=300):
+        results = testing.create_dalresults([
+            dict(name="obs_collection", datatype="char", arraysize="*"),
+            dict(name="dataproduct_type", datatype="char", arraysize="16"),
+            dict(name="obs_id", datatype="char", arraysize="4"),
+            dict(name="calib_level", datatype="short"),
+            dict(name="s_ra", datatype="double")],
+            [(f"ivo://org.example/collection{index % 3}", "image" if index % 2 else "cube",
+              f"{index:04d}", 2, index * 0.1) for index in range(nrows)])
+        results.resultstable.array.mask[5]["obs_collection"] = True
+        return results
+
+    def test_values_kept(self):
+        results = self._make_results()
+        columns = {name: results.getcolumn(name).copy() for name in results.fieldnames}
+        record = dict(results[7])
+        table = results.to_table()
+
+        assert results.compact() is results
+
+        for name in results.fieldnames:
+            assert results.getcolumn(name).tolist() == columns[name].tolist()
+        assert dict(results[7]) == record
+        assert results["dataproduct_type", 3] == "image"
+        assert results.getcolumn("obs_collection").mask[5]
+        assert results.to_table().pformat() == table.pformat()
+
+    def test_encoding(self):
+        results = self._make_results().compact()
+        array = results.resultstable.array
+        for name in ("obs_collection", "dataproduct_type"):
+            assert array.dtype[name] == object
+            assert len({id(value) for value in array[name].data}) == len(set(array[name].data))
+        # short distinct values are cheaper to keep as they are
+        assert array.dtype["obs_id"] == np.dtype("U4")
+        assert array.dtype["s_ra"] == np.dtype("f8")
+
+    def test_downcast(self):
+        results = self._make_results(nrows=10)
+        table = results.resultstable
+        table.array = np.ma.array(np.ma.getdata(table.array).astype(
+            [(name, "i8" if name == "calib_level" else table.array.dtype[name])
+             for name in table.array.dtype.names]))
+
+        array = results.compact(downcast=False).resultstable.array
+        assert array.dtype["calib_level"] == np.dtype("i8")
+        array = results.compact().resultstable.array
+        assert array.dtype["calib_level"] == np.dtype("i2")
+        assert array["calib_level"].tolist() == [2] * 10
+
+
 @pytest.mark.filterwarnings('ignore::astropy.io.votable.exceptions.W03')
 @pytest.mark.filterwarnings('ignore::astropy.io.votable.exceptions.W06')
 @pytest.mark.usefixtures('register_mocks')
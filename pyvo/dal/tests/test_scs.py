@@ -6,10 +6,13 @@ Tests for pyvo.dal.scs
 from functools import partial
 import re
 
+import numpy as np
 import pytest
 
 from pyvo.dal.scs import search, SCSService
 
+from astropy.coordinates import SkyCoord
+from astropy import units as u
 from astropy.utils.data import get_pkg_data_contents
 
 get_pkg_data_contents = partial(
@@ -37,6 +40,71 @@ def test_search():
     assert len(results) == 1273
 
 
+@pytest.fixture()
+def scs_catalog(mocker):
+    # a synthetic catalog: a source every 0.1 degrees around (10, 10)
+    ra, dec = np.meshgrid(np.arange(9, 11, 0.1), np.arange(9, 11, 0.1))
+    catalog = SkyCoord(ra=ra.ravel(), dec=dec.ravel(), unit="deg")
+
+    def callback(request, context):
+        center = SkyCoord(
+            ra=float(request.qs["RA"][0]), dec=float(request.qs["DEC"][0]),
+            unit="deg")
+        matches = np.flatnonzero(
+            center.separation(catalog).deg <= float(request.qs["SR"][0]))
+        rows = "".join(
+            f"<TR><TD>src{i}</TD><TD>{catalog[i].ra.deg}</TD>"
+            f"<TD>{catalog[i].dec.deg}</TD></TR>" for i in matches)
+        return f"""<?xml version="1.0" encoding="utf-8"?>
+<VOTABLE version="1.4" xmlns="http://www.ivoa.net/xml/VOTable/v1.3">
+  <RESOURCE type="results">
+    <TABLE>
+      <FIELD name="id" ucd="ID_MAIN" datatype="char" arraysize="*"/>
+      <FIELD name="ra" ucd="POS_EQ_RA_MAIN" datatype="double" unit="deg"/>
+      <FIELD name="dec" ucd="POS_EQ_DEC_MAIN" datatype="double" unit="deg"/>
+      <DATA><TABLEDATA>{rows}</TABLEDATA></DATA>
+    </TABLE>
+  </RESOURCE>
+</VOTABLE>""".encode("utf-8")
+
+    with mocker.register_uri(
+        'GET', 'http://example.com/scs-many', content=callback
+    ) as matcher:
+        yield matcher
+
+
+class TestSearchMany:
+    positions = SkyCoord(
+        ra=[10, 10.02, 10.5, 9.99, 9.5], dec=[10, 10.01, 10.5, 10, 9.5],
+        unit="deg")
+
+    def test_coalesced(self, scs_catalog):
+        service = SCSService('http://example.com/scs-many')
+
+        coalesced = service.search_many(self.positions, 0.15, max_workers=2)
+        calls = scs_catalog.call_count
+        separate = service.search_many(self.positions, 0.15, coalesce=False)
+
+        # the three positions around (10, 10) were queried together
+        assert calls == 3
+        assert scs_catalog.call_count - calls == 5
+        assert list(coalesced["input_index"]) == sorted(coalesced["input_index"])
+        assert list(zip(coalesced["input_index"], coalesced["id"])) == list(
+            zip(separate["input_index"], separate["id"]))
+
+        for record in coalesced:
+            position = self.positions[record["input_index"]]
+            assert position.separation(record.pos).deg <= 0.15
+
+    def test_array_input(self, scs_catalog):
+        service = SCSService('http://example.com/scs-many')
+
+        results = service.search_many(np.array([[10, 10], [9.5, 9.5]]), 0.05 * u.deg)
+
+        assert set(results["input_index"]) == {0, 1}
+        assert scs_catalog.call_count == 2
+
+
 class TestSCSService:
     def test_init(self):
         service = SCSService('http://example.com/scs', capability_description="SCS")
@@ -40,7 +40,8 @@ def sia(mocker):
 
 def _test_result(result):
     assert result.getdataurl() == 'http://example.com/querydata/image.fits'
-    assert isinstance(result.getdataobj(), HDUList)
+    with result.getdataobj() as hdus:
+        assert isinstance(hdus, HDUList)
     assert result.filesize == 153280
 
 
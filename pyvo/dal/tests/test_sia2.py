@@ -5,17 +5,24 @@ Tests for pyvo.dal.sia
 """
 from functools import partial
 from pathlib import Path
+from urllib.parse import parse_qsl
 import re
 import requests_mock
 import warnings
 
 import pytest
 
-from pyvo.dal.sia2 import search, SIA2Service, SIA2Query, SIAService, SIAQuery
+from pyvo.dal import MAX_GET_URL_LENGTH
+from pyvo.dal.adhoc import SodaQuery
+from pyvo.dal.query import _concatenate_results
+from pyvo.dal.sia2 import search, SIA2Service, SIA2Query, SIA2Results, SIAService, SIAQuery
 from pyvo.dal.exceptions import DALServiceError, DALOverflowWarning
+from pyvo.utils import testing
 
+import numpy as np
 import astropy.units as u
 from astropy.coordinates import SkyCoord
+from astropy.time import Time
 from astropy.utils.data import get_pkg_data_contents
 from astropy.utils.exceptions import AstropyDeprecationWarning
 
@@ -221,6 +228,142 @@ class TestSIA2Query():
             deprecated_query.field_of_view.add((10, 20))
             assert deprecated_query['FOV'] == ['10.0 20.0']
 
+    def test_query_arrays(self):
+        positions = np.array([[10, 20, 0.1], [30, 40, 0.2]])
+        times = Time([[55000, 55001], [56000, 56002]], format='mjd')
+        query = SIA2Query('someurl', pos=positions, band=np.array([[1, 2], [3, 4]]) * u.um,
+                          time=times, exptime=np.array([[1, 2]]))
+        assert query['POS'] == SIA2Query('someurl', pos=[tuple(p) for p in positions])['POS']
+        assert query['POS'] == ['CIRCLE 10.0 20.0 0.1', 'CIRCLE 30.0 40.0 0.2']
+        assert query['BAND'] == ['1e-06 2e-06', '3e-06 4e-06']
+        assert query['TIME'] == ['55000.0 55001.0', '56000.0 56002.0']
+        assert query['EXPTIME'] == ['1.0 2.0']
+
+
+def _make_obscore_response(dids):
+    rows = "".join(f"<TR><TD>{did}</TD></TR>" for did in dids)
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<VOTABLE version="1.4" xmlns="http://www.ivoa.net/xml/VOTable/v1.3">
+  <RESOURCE type="results">
+    <INFO name="QUERY_STATUS" value="OK"/>
+    <TABLE>
+      <FIELD name="obs_publisher_did" datatype="char" arraysize="*"/>
+      <DATA><TABLEDATA>{rows}</TABLEDATA></DATA>
+    </TABLE>
+  </RESOURCE>
+</VOTABLE>""".encode("utf-8")
+
+
+class TestSplitQueries:
+    @pytest.fixture()
+    def obscore(self, mocker):
+        # a service returning a row per requested ID and one matching always
+        requests = []
+
+        def callback(request, context):
+            params = parse_qsl(request.body or request.query)
+            requests.append((request.method, len(request.url), params))
+            dids = [value for key, value in params if key == "ID"]
+            return _make_obscore_response(dids + ["ivo://example/always"])
+
+        with mocker.register_uri(
+            requests_mock.ANY, 'http://example.com/obscore', content=callback
+        ) as matcher:
+            matcher.requests = requests
+            yield matcher
+
+    def test_split(self, obscore):
+        dids = [f"ivo://example/obs?{i:05d}" for i in range(1000)]
+
+        results = SIA2Query(
+            'http://example.com/obscore', publisher_did=dids, collection="TEST"
+        ).execute(max_workers=3)
+
+        assert len(obscore.requests) > 1
+        for method, length, params in obscore.requests:
+            assert method == "GET"
+            assert length <= MAX_GET_URL_LENGTH
+            assert ("COLLECTION", "TEST") in params
+        # one row per ID, the one always returned only once, after the
+        # rows of the first part
+        first_part = next(
+            sum(key == "ID" for key, _ in params)
+            for _, _, params in obscore.requests if ("ID", dids[0]) in params)
+        assert list(results["obs_publisher_did"]) == dids[:first_part] + [
+            "ivo://example/always"] + dids[first_part:]
+
+    def test_maxrec(self, obscore):
+        dids = [f"ivo://example/obs?{i:05d}" for i in range(1000)]
+        query = SIA2Query('http://example.com/obscore', publisher_did=dids)
+        query.maxrec = 10
+
+        results = query.execute()
+
+        assert len(obscore.requests) > 1
+        assert list(results["obs_publisher_did"]) == dids[:10]
+        assert results.status[0] == "OVERFLOW"
+
+    def test_concatenate(self):
+        fields = [{"name": "obs_publisher_did", "datatype": "char", "arraysize": "*"}]
+        parts = [testing.create_dalresults(fields, rows, resultsClass=SIA2Results)
+                 for rows in ([("a",), ("b",)], [("b",), ("c",)])]
+
+        votable = _concatenate_results(parts, unique_column="obs_publisher_did", maxrec=2)
+
+        assert votable.get_first_table().array["obs_publisher_did"].tolist() == ["a", "b"]
+        assert SIA2Results(votable).status[0] == "OVERFLOW"
+        assert list(parts[0]["obs_publisher_did"]) == ["a", "b"]
+        assert parts[0].status[0] == "OK"
+
+    def test_concatenate_nulls(self):
+        fields = [{"name": "obs_publisher_did", "datatype": "char", "arraysize": "*"},
+                  {"name": "n", "datatype": "int"}]
+        parts = [testing.create_dalresults(fields, rows, resultsClass=SIA2Results)
+                 for rows in ([("a", 1), ("", 2)], [("", 3), ("a", 4), ("b", 5)])]
+        for part in parts:
+            array = part.resultstable.array
+            array.mask["obs_publisher_did"] = array["obs_publisher_did"] == ""
+
+        votable = _concatenate_results(parts, unique_column="obs_publisher_did")
+
+        assert votable.get_first_table().array["n"].tolist() == [1, 2, 3, 5]
+
+    def test_single_overflow_warning(self, mocker):
+        def callback(request, context):
+            dids = [value for key, value in parse_qsl(request.query) if key == "ID"]
+            return _make_obscore_response(dids).replace(b'value="OK"', b'value="OVERFLOW"')
+
+        dids = [f"ivo://example/obs?{i:05d}" for i in range(1000)]
+        with mocker.register_uri(requests_mock.ANY, 'http://example.com/obscore', content=callback):
+            with pytest.warns(DALOverflowWarning) as caught:
+                SIA2Query('http://example.com/obscore', publisher_did=dids).execute()
+        assert len(caught) == 1
+
+    def test_post(self, obscore):
+        did = "ivo://example/" + "x" * MAX_GET_URL_LENGTH
+
+        results = SIA2Query('http://example.com/obscore', publisher_did=did).execute()
+
+        assert [method for method, _, _ in obscore.requests] == ["POST"]
+        assert len(results) == 2
+
+    def test_short_query(self, obscore):
+        SIA2Query('http://example.com/obscore', publisher_did=["a", "b"]).execute()
+
+        assert [method for method, _, _ in obscore.requests] == ["GET"]
+
+    def test_soda_split(self):
+        ids = [f"ivo://example/obs?{i:05d}" for i in range(1000)]
+        query = SodaQuery('http://example.com/soda', circle=(1, 2, 3), ID=ids)
+
+        parts = query.split()
+
+        assert len(parts) > 1
+        assert all(part._get_url_length() <= MAX_GET_URL_LENGTH for part in parts)
+        assert [id_ for part in parts for id_ in part["ID"]] == ids
+        assert all(part["CIRCLE"] == query["CIRCLE"] for part in parts)
+        assert query["ID"] == ids
+
 
 def test_variable_deprecation():
     # Test this while we are in the deprecation period, as the variable is durectly
@@ -3,13 +3,20 @@
 """
 Tests for pyvo.dal.ssa
 """
+from contextlib import ExitStack
 from functools import partial
+from io import BytesIO
 import re
 
+import numpy as np
 import pytest
 
-from pyvo.dal.ssa import search, SSAService
+from pyvo.dal.exceptions import DALServiceError
+from pyvo.dal.ssa import search, SSAService, SSAResults
 
+from astropy import units as u
+from astropy.io import fits
+from astropy.io.votable import parse as votableparse
 from astropy.utils.data import get_pkg_data_contents
 
 get_pkg_data_contents = partial(
@@ -48,3 +55,109 @@ class TestSSAService:
 
         assert len(results) == 36
         assert results[35].dateobs is None
+
+
+def _make_ssa_results(urls):
+    rows = "".join(
+        f"<TR><TD>{url}</TD><TD>spectrum {index}</TD></TR>" for index, url in enumerate(urls))
+    return SSAResults(votableparse(BytesIO(f"""<?xml version="1.0" encoding="utf-8"?>
+<VOTABLE version="1.4" xmlns="http://www.ivoa.net/xml/VOTable/v1.3">
+  <RESOURCE type="results">
+    <TABLE>
+      <FIELD name="acref" datatype="char" arraysize="*" utype="ssa:Access.Reference"/>
+      <FIELD name="title" datatype="char" arraysize="*" utype="ssa:DataID.Title"/>
+      <DATA><TABLEDATA>{rows}</TABLEDATA></DATA>
+    </TABLE>
+  </RESOURCE>
+</VOTABLE>""".encode("utf-8"))))
+
+
+VOTABLE_SPECTRUM = b"""<?xml version="1.0" encoding="utf-8"?>
+<VOTABLE version="1.4" xmlns="http://www.ivoa.net/xml/VOTable/v1.3">
+  <RESOURCE type="results">
+    <TABLE>
+      <FIELD name="flux" datatype="double" unit="Jy" utype="spec:Spectrum.Data.FluxAxis.Value"/>
+      <FIELD name="err" datatype="double" unit="Jy" ucd="stat.error;phot.flux"/>
+      <FIELD name="lam" datatype="double" unit="nm" utype="spec:Spectrum.Data.SpectralAxis.Value"/>
+      <DATA><TABLEDATA>
+        <TR><TD>1</TD><TD>0.1</TD><TD>500</TD></TR>
+        <TR><TD>2</TD><TD>0.1</TD><TD>501</TD></TR>
+        <TR><TD>3</TD><TD>0.1</TD><TD>502</TD></TR>
+        <TR><TD></TD><TD>0.1</TD><TD>503</TD></TR>
+        <TR><TD>5</TD><TD>0.1</TD><TD>504</TD></TR>
+      </TABLEDATA></DATA>
+    </TABLE>
+  </RESOURCE>
+</VOTABLE>"""
+
+
+def _to_bytes(hdus):
+    output = BytesIO()
+    hdus.writeto(output)
+    return output.getvalue()
+
+
+@pytest.fixture()
+def spectra(mocker):
+    table_spectrum = _to_bytes(fits.HDUList([fits.PrimaryHDU(), fits.BinTableHDU.from_columns([
+        fits.Column(name="WAVE", format="D", unit="Angstrom", array=[6000, 6010, 6020]),
+        fits.Column(name="FLUX", format="D", unit="mJy", array=[1000, 2000, 3000])])]))
+    image = fits.PrimaryHDU(np.array([4., 5., 6., 7.]))
+    image.header.update(CRVAL1=7000, CRPIX1=1, CDELT1=20, CUNIT1="Angstrom", BUNIT="Jy")
+    image_spectrum = _to_bytes(fits.HDUList([image]))
+
+    with ExitStack() as stack:
+        for name, content in [("vot", VOTABLE_SPECTRUM), ("tab", table_spectrum),
+                              ("img", image_spectrum), ("junk", b"not a spectrum")]:
+            stack.enter_context(mocker.register_uri(
+                "GET", f"http://example.com/spec/{name}", content=content))
+        stack.enter_context(mocker.register_uri(
+            "GET", "http://example.com/spec/missing", status_code=404))
+        yield
+
+
+@pytest.mark.usefixtures("spectra")
+class TestFetchSpectra:
+    def test_fetch(self):
+        results = _make_ssa_results(
+            [f"http://example.com/spec/{name}" for name in ("vot", "tab", "missing", "img", "junk")])
+        stack = results.fetch_spectra(max_workers=3)
+
+        assert len(stack) == 5
+        assert stack.spectral.shape == stack.flux.shape == (5, 5)
+        assert stack.lengths.tolist() == [5, 3, 0, 4, 0]
+        assert stack.spectral_unit == u.nm
+        assert stack.flux_unit == u.Jy
+
+        np.testing.assert_array_equal(stack.spectral[0], [500, 501, 502, 503, 504])
+        np.testing.assert_array_equal(stack.flux[0], [1, 2, 3, np.nan, 5])
+        np.testing.assert_allclose(stack.spectral[1, :3], [600, 601, 602])
+        np.testing.assert_allclose(stack.flux[1, :3], [1, 2, 3])
+        assert np.isnan(stack.flux[1, 3:]).all()
+        np.testing.assert_allclose(stack.spectral[3, :4], [700, 702, 704, 706])
+        np.testing.assert_array_equal(stack.flux[3, :4], [4, 5, 6, 7])
+
+        assert [error is None for error in stack.errors] == [True, True, False, True, False]
+        assert isinstance(stack.errors[2], DALServiceError)
+        assert isinstance(stack.errors[4], ValueError)
+
+        spectral, flux = stack[1]
+        assert spectral.unit == u.nm
+        assert len(flux) == 3
+
+    def test_dtype(self):
+        results = _make_ssa_results(["http://example.com/spec/vot", "http://example.com/spec/img"])
+        stack = results.fetch_spectra(max_workers=1, dtype=np.float32)
+        assert stack.spectral.dtype == stack.flux.dtype == np.float32
+        assert stack.lengths.tolist() == [5, 4]
+        assert np.isnan(stack.flux[1, 4])
+
+    def test_incompatible_units(self, mocker):
+        bad = _to_bytes(fits.HDUList([fits.PrimaryHDU(), fits.BinTableHDU.from_columns([
+            fits.Column(name="WAVE", format="D", unit="s", array=[1, 2]),
+            fits.Column(name="FLUX", format="D", unit="Jy", array=[1, 2])])]))
+        with mocker.register_uri("GET", "http://example.com/spec/bad", content=bad):
+            stack = _make_ssa_results(
+                ["http://example.com/spec/vot", "http://example.com/spec/bad"]).fetch_spectra()
+        assert stack.lengths.tolist() == [5, 0]
+        assert isinstance(stack.errors[1], u.UnitsError)
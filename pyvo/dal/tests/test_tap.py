@@ -11,22 +11,31 @@ import re
 from io import BytesIO, StringIO
 from unittest.mock import Mock
 from urllib.parse import parse_qsl
+import math
 import tempfile
+import threading
 
+import numpy as np
 import pytest
 import requests
 import requests_mock
 
 from pyvo import dal
-from pyvo.dal.tap import escape, search, AsyncTAPJob, TAPService
+from pyvo.dal import tap
+from pyvo.dal.tap import escape, search, AsyncTAPJob, TAPPipeline, TAPService, TAPResults
+from pyvo.dal.localquery import disable_local_query_cache, enable_local_query_cache
+from pyvo.dal.jobjournal import JobJournal, get_job_journal, set_job_journal
 from pyvo.dal import DALQueryError, DALServiceError, DALOverflowWarning, DALRateLimitError
 from pyvo.io.uws import JobFile
+from pyvo.io.uws import tree as uws_tree
 from pyvo.io.uws.tree import Parameter, Result, ErrorSummary, Message
 from pyvo.auth.authsession import AuthSession
 from pyvo.io.vosi.exceptions import VOSIError
 from pyvo.utils import prototype
 from pyvo.io.vosi.tapregext import TimeLimits, TableAccess
 
+from astropy.io.votable import parse as votableparse
+from astropy.table import Table
 from astropy.time import Time, TimeDelta
 
 from astropy.utils.data import get_pkg_data_contents
@@ -792,6 +801,48 @@ class TestTAPService:
         assert len(service.get_job_list(phases=['EXECUTING'], last=3,
                                         after=datetime.datetime.now(tz=datetime.timezone.utc))) == 6
 
+    def test_iter_job_list_full_description(self, mocker):
+        mock_server = MockAsyncTAPServer()
+        job_ids = [f'abc{i}' for i in range(8)]
+
+        def job_list(request, context):
+            doc = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                   '<uws:jobs xmlns:uws="http://www.ivoa.net/xml/UWS/v1.0" '
+                   'xmlns:xlink="http://www.w3.org/1999/xlink" version="1.1">\n')
+            for job_id in job_ids:
+                doc += mock_server._get_jobref_rep(
+                    job_id, 'EXECUTING', 'run', '21', '2018-12-20T00:23:15.79')
+            doc += '</uws:jobs>'
+            return doc.encode('utf-8')
+
+        def job(request, context):
+            job = JobFile()
+            job.jobid = request.path.split('/')[-1]
+            job.phase = 'COMPLETED'
+            job.ownerid = 'full'
+            io = BytesIO()
+            job.to_xml(io)
+            return io.getvalue()
+
+        with ExitStack() as stack:
+            stack.enter_context(mocker.register_uri(
+                'GET', 'http://example.com/tap/async', content=job_list))
+            stack.enter_context(mocker.register_uri(
+                'GET', re.compile('^http://example.com/tap/async/abc[0-9]+$'),
+                content=job))
+
+            service = TAPService('http://example.com/tap')
+
+            jobs = service.iter_job_list(short_description=False, max_workers=3)
+            assert not isinstance(jobs, list)
+            jobs = list(jobs)
+            assert [job.jobid for job in jobs] == job_ids
+            assert all(job.ownerid == 'full' for job in jobs)
+
+            jobs = service.get_job_list()
+            assert [job.jobid for job in jobs] == job_ids
+            assert all(job.ownerid == '21' for job in jobs)
+
     @pytest.mark.usefixtures('create_fixture')
     def test_create_table(self):
         prototype.activate_features('cadc-tb-upload')
@@ -1349,6 +1400,40 @@ class TestTAPService:
 
         job.delete()
 
+    @pytest.mark.usefixtures('async_fixture')
+    @pytest.mark.filterwarnings("ignore::astropy.io.votable.exceptions.W27")
+    @pytest.mark.filterwarnings("ignore::astropy.io.votable.exceptions.W48")
+    @pytest.mark.filterwarnings("ignore::astropy.io.votable.exceptions.W06")
+    def test_fetch_result_columns(self):
+        service = TAPService('http://example.com/tap')
+        job = service.submit_job("SELECT * FROM ivoa.obscore")
+        job.run()
+        job.wait()
+
+        status_response = '''<?xml version="1.0" encoding="UTF-8"?>
+            <uws:job xmlns:uws="http://www.ivoa.net/xml/UWS/v1.0"
+                xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+                <uws:jobId>1</uws:jobId>
+                <uws:phase>COMPLETED</uws:phase>
+                <uws:results>
+                    <uws:result id="result" xsi:type="vot:VOTable"
+                        href="http://example.com/tap/async/1/results/result"/>
+                </uws:results>
+            </uws:job>'''
+
+        with requests_mock.Mocker() as rm:
+            rm.get(f'http://example.com/tap/async/{job.job_id}', text=status_response)
+            rm.get(
+                f'http://example.com/tap/async/{job.job_id}/results/result',
+                content=get_pkg_data_contents('data/tap/obscore-image.xml')
+            )
+
+            result = job.fetch_result(columns=['access_url', 'dataproduct_type'], max_rows=4)
+            assert result.fieldnames == ('dataproduct_type', 'access_url')
+            assert len(result) == 4
+
+        job.delete()
+
 
 @pytest.mark.usefixtures("tapservice")
 class TestTAPCapabilities:
@@ -1927,7 +2012,635 @@ class TestRateLimitError:
             assert error.code == 429
 
 
+class MockGrowingTable:
+    """
+    A TAP service on a table with rows (id, name, flux) to which rows can
+    be added; it understands ``id > n`` and ``id >= n`` conditions only,
+    and returns the rows in the order of id.
+    """
+    def __init__(self, mocker, nrows):
+        self.rows = [(index, f"source {index}", 0.5 * index) for index in range(nrows)]
+        self.queries = []
+        self.unit = "Jy"
+        self.matcher = mocker.register_uri(
+            'POST', 'http://example.com/tap/sync', content=self.callback)
+
+    def callback(self, request, context):
+        params = dict(parse_qsl(request.body))
+        query = params['QUERY']
+        self.queries.append(query)
+        match = re.search(r"id (>=?) ([0-9]+)", query)
+        rows = sorted(self.rows, key=lambda row: row[0])
+        if match:
+            bound = int(match.group(2))
+            rows = [row for row in rows if row[0] > bound or match.group(1) == ">=" and row[0] == bound]
+        status = "OK"
+        if 'MAXREC' in params and len(rows) > int(params['MAXREC']):
+            rows, status = rows[:int(params['MAXREC'])], "OVERFLOW"
+        return f'''<?xml version="1.0" encoding="UTF-8"?>
+<VOTABLE version="1.3" xmlns="http://www.ivoa.net/xml/VOTable/v1.3">
+  <RESOURCE type="results">
+    <INFO name="QUERY_STATUS" value="{status}"/>
+    <TABLE>
+      <FIELD name="id" datatype="long"/>
+      <FIELD name="name" datatype="char" arraysize="*"/>
+      <FIELD name="flux" datatype="double" unit="{self.unit}"/>
+      <DATA><TABLEDATA>{"".join(
+            f"<TR><TD>{id}</TD><TD>{name}</TD><TD>{flux}</TD></TR>" for id, name, flux in rows)}
+      </TABLEDATA></DATA>
+    </TABLE>
+  </RESOURCE>
+</VOTABLE>'''.encode('utf-8')
+
+
+class TestIncremental:
+    def test_refresh(self, mocker, tmp_path):
+        service = TAPService('http://example.com/tap')
+        query = "SELECT * FROM t WHERE flux > 1"
+        with ExitStack() as stack:
+            table = MockGrowingTable(mocker, 5)
+            stack.enter_context(table.matcher)
+
+            result = service.run_incremental(query, "id", tmp_path)
+            assert result['id'].tolist() == [0, 1, 2, 3, 4]
+
+            table.rows.append((5, "source 5", 2.5))
+            result = service.run_incremental(query, "id", tmp_path)
+            assert result['id'].tolist() == [0, 1, 2, 3, 4, 5]
+            assert result['name'].tolist()[-1] == "source 5"
+            assert table.queries[-1] == "SELECT * FROM t WHERE (flux > 1) AND (id >= 4)"
+
+            result = service.run_incremental(query, "id", tmp_path)
+            assert len(result) == 6
+            assert result.fielddescs[2].unit == "Jy"
+            assert table.queries[-1] == "SELECT * FROM t WHERE (flux > 1) AND (id >= 5)"
+
+    def test_schema_change(self, mocker, tmp_path):
+        service = TAPService('http://example.com/tap')
+        query = "SELECT * FROM t"
+        with ExitStack() as stack:
+            table = MockGrowingTable(mocker, 3)
+            stack.enter_context(table.matcher)
+
+            service.run_incremental(query, "t.id", tmp_path)
+            table.unit = "mJy"
+            result = service.run_incremental(query, "t.id", tmp_path)
+
+            assert table.queries == [query, query + " WHERE t.id >= 2", query]
+            assert len(result) == 3
+            assert result.fielddescs[2].unit == "mJy"
+
+    def test_truncated_tie(self, mocker, tmp_path):
+        service = TAPService('http://example.com/tap')
+        query = "SELECT * FROM t ORDER BY id"
+        with ExitStack() as stack:
+            table = MockGrowingTable(mocker, 0)
+            table.rows = [(0, "a", 1.0), (0, "b", 1.0), (1, "c", 1.0), (1, "d", 1.0), (2, "e", 1.0)]
+            stack.enter_context(table.matcher)
+
+            # the first result ends within the rows with id 1
+            result = service.run_incremental(query, "id", tmp_path, maxrec=3)
+            assert result['name'].tolist() == ["a", "b", "c"]
+
+            result = service.run_incremental(query, "id", tmp_path, maxrec=3)
+            assert result['name'].tolist() == ["a", "b", "c", "d", "e"]
+
+            # more rows arrive with the last id
+            table.rows.append((2, "f", 1.0))
+            result = service.run_incremental(query, "id", tmp_path, maxrec=3)
+            assert result['name'].tolist() == ["a", "b", "c", "d", "e", "f"]
+            assert table.queries[-1] == "SELECT * FROM t WHERE id >= 2 ORDER BY id"
+
+            result = service.run_incremental(query, "id", tmp_path, maxrec=3)
+            assert len(result) == 6
+
+    def test_unsupported(self, tmp_path):
+        service = TAPService('http://example.com/tap')
+        with pytest.raises(ValueError):
+            service.run_incremental("SELECT COUNT(*) FROM t GROUP BY id", "id", tmp_path)
+        with pytest.raises(ValueError):
+            service.run_incremental("SELECT * FROM t", "id", tmp_path, language="PQL")
+
+
 def test_public_constants_accessible_from_dal():
     assert isinstance(dal.DEFAULT_JOB_POLL_TIMEOUT, (int, float))
     assert isinstance(dal.DEFAULT_JOB_WAIT_TIMEOUT, (int, float))
     assert isinstance(dal.DATALINK_BATCH_CALL_SIZE, int)
+
+
+class TestLocalQueries:
+    @pytest.fixture(autouse=True)
+    def local_query_cache(self):
+        yield enable_local_query_cache()
+        disable_local_query_cache()
+
+    def test_refinement(self, mocker):
+        service = TAPService('http://example.com/tap')
+        with ExitStack() as stack:
+            table = MockGrowingTable(mocker, 5)
+            stack.enter_context(table.matcher)
+
+            service.run_sync("SELECT * FROM t WHERE flux > 0.5")
+            result = service.run_sync(
+                "SELECT TOP 2 id, flux FROM t WHERE flux > 0.5 AND id <> 3 ORDER BY flux DESC")
+            assert isinstance(result, TAPResults)
+            assert result['id'].tolist() == [4, 2]
+            assert result.fieldnames == ('id', 'flux')
+            assert len(table.queries) == 1
+
+            service.run_sync("SELECT * FROM t WHERE flux > 0.5", maxrec=2)
+            service.run_sync("SELECT * FROM t WHERE flux > 0.5", language="PostgreSQL")
+            service.run_sync("SELECT * FROM t")
+            assert len(table.queries) == 4
+
+    def test_incremental_not_local(self, mocker, tmp_path):
+        service = TAPService('http://example.com/tap')
+        with ExitStack() as stack:
+            table = MockGrowingTable(mocker, 3)
+            stack.enter_context(table.matcher)
+
+            service.run_sync("SELECT * FROM t")
+            service.run_incremental("SELECT * FROM t", "id", tmp_path)
+            table.rows.append((3, "source 3", 1.5))
+            result = service.run_incremental("SELECT * FROM t", "id", tmp_path)
+            assert result['id'].tolist() == [0, 1, 2, 3]
+
+
+class MockUploadEcho:
+    """
+    A TAP service returning the ids of the uploaded table; the first
+    request fails with a 503.
+    """
+    def __init__(self, mocker):
+        self.chunks = []
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.matcher = mocker.register_uri(
+            'POST', 'http://example.com/tap/sync', content=self.callback)
+
+    def callback(self, request, context):
+        with self.lock:
+            self.requests += 1
+            if self.requests == 1:
+                context.status_code = 503
+                return b"Try again"
+        body = request.body
+        upload = body[body.index(b"<?xml"):body.index(b"</VOTABLE>") + len(b"</VOTABLE>")]
+        ids = votableparse(BytesIO(upload)).get_first_table().array["id"].tolist()
+        with self.lock:
+            self.chunks.append(ids)
+        return f'''<?xml version="1.0" encoding="UTF-8"?>
+<VOTABLE version="1.3" xmlns="http://www.ivoa.net/xml/VOTable/v1.3">
+  <RESOURCE type="results">
+    <INFO name="QUERY_STATUS" value="OK"/>
+    <TABLE>
+      <FIELD name="id" datatype="long"/>
+      <DATA><TABLEDATA>{"".join(f"<TR><TD>{id}</TD></TR>" for id in ids)}
+      </TABLEDATA></DATA>
+    </TABLE>
+  </RESOURCE>
+</VOTABLE>'''.encode('utf-8')
+
+
+@pytest.mark.usefixtures('capabilities')
+class TestChunkedUpload:
+    def test_plan(self):
+        service = TAPService('http://example.com/tap')
+        table = Table({"id": np.arange(1000), "name": [f"source {i}" for i in range(1000)]})
+        plan = service.plan_chunked_upload(table)
+        assert (plan.nrows, plan.nchunks, plan.chunk_rows) == (1000, 1, 1000)
+        assert plan.limit.content == 100000000
+        assert plan.seconds is None and plan.max_seconds is None
+
+        service.get_tap_capability().uploadlimit.hard.content = 20000
+        plan = service.plan_chunked_upload(table, max_workers=2, chunk_seconds=3)
+        assert plan.nchunks > 1
+        assert plan.nchunks * plan.chunk_rows >= 1000
+        out = BytesIO()
+        table[:plan.chunk_rows].write(out, format="votable")
+        assert len(out.getvalue()) <= 20000
+        assert abs(plan.chunk_bytes - len(out.getvalue())) < 0.1 * len(out.getvalue())
+        assert plan.seconds == 3 * math.ceil(plan.nchunks / 2)
+
+        assert service.plan_chunked_upload(table, chunk_rows=10).chunk_rows == 10
+
+        service.get_tap_capability().uploadlimit.hard.content = 100
+        with pytest.raises(ValueError):
+            service.plan_chunked_upload(table)
+
+    def test_run(self, mocker, monkeypatch):
+        monkeypatch.setattr(tap.time, "sleep", lambda seconds: None)
+        service = TAPService('http://example.com/tap')
+        limit = service.get_tap_capability().uploadlimit.hard
+        limit.unit, limit.content = "row", 4
+
+        with ExitStack() as stack:
+            server = MockUploadEcho(mocker)
+            stack.enter_context(server.matcher)
+            result = service.run_chunked_upload(
+                "SELECT id FROM TAP_UPLOAD.upload", Table({"id": np.arange(10)}), mode="sync")
+
+        assert isinstance(result, TAPResults)
+        assert result["id"].tolist() == list(range(10))
+        assert result["chunk_offset"].tolist() == [0, 0, 0, 0, 4, 4, 4, 4, 8, 8]
+        assert sorted(server.chunks) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+        assert server.requests == 4
+
+    def test_failure(self, mocker, monkeypatch):
+        monkeypatch.setattr(tap.time, "sleep", lambda seconds: None)
+        service = TAPService('http://example.com/tap')
+        with ExitStack() as stack:
+            server = MockUploadEcho(mocker)
+            stack.enter_context(server.matcher)
+            with pytest.raises(DALServiceError):
+                service.run_chunked_upload(
+                    "SELECT id FROM TAP_UPLOAD.upload", Table({"id": np.arange(10)}),
+                    mode="sync", max_retries=0)
+
+
+class MockLookup:
+    """
+    A TAP service holding a table of sources with ids 0 to 99, except
+    for 50, answering key lookups with IN lists or upload joins.
+    """
+    def __init__(self, mocker):
+        self.queries = []
+        self.lock = threading.Lock()
+        self.matcher = mocker.register_uri(
+            'POST', 'http://example.com/tap/sync', content=self.callback)
+
+    def callback(self, request, context):
+        body = request.body
+        if isinstance(body, bytes):
+            query = re.search(rb'name="QUERY"\r\n\r\n(.*?)\r\n', body).group(1).decode()
+            upload = body[body.index(b"<?xml"):body.index(b"</VOTABLE>") + len(b"</VOTABLE>")]
+            keys = votableparse(BytesIO(upload)).get_first_table().array["lookup_key"].tolist()
+        else:
+            query = dict(parse_qsl(body))['QUERY']
+            match = re.search(r"IN \((.*)\)", query)
+            keys = [int(key) for key in match.group(1).split(", ")] if match else []
+        with self.lock:
+            self.queries.append(query)
+
+        rows = "".join(
+            f"<TR><TD>source {key}</TD><TD>{key}</TD></TR>"
+            for key in reversed(keys) if 0 <= key < 100 and key != 50)
+        return f'''<?xml version="1.0" encoding="UTF-8"?>
+<VOTABLE version="1.3" xmlns="http://www.ivoa.net/xml/VOTable/v1.3">
+  <RESOURCE type="results">
+    <INFO name="QUERY_STATUS" value="OK"/>
+    <TABLE>
+      <FIELD name="name" datatype="char" arraysize="*"/>
+      <FIELD name="ID" datatype="long"/>
+      <DATA><TABLEDATA>{rows}
+      </TABLEDATA></DATA>
+    </TABLE>
+  </RESOURCE>
+</VOTABLE>'''.encode('utf-8')
+
+
+@pytest.mark.usefixtures('capabilities')
+class TestLookup:
+    def test_in_lists(self, mocker):
+        service = TAPService('http://example.com/tap')
+        keys = [7, 50, 3, np.int64(7), 120, None, 99]
+        with ExitStack() as stack:
+            server = MockLookup(mocker)
+            stack.enter_context(server.matcher)
+            result = service.lookup("src", "id", keys, batch_size=2)
+
+        assert isinstance(result, TAPResults)
+        assert result.fieldnames == ("name", "ID")
+        assert result["ID"].tolist() == [7, None, 3, 7, None, None, 99]
+        assert result["name"].tolist() == [
+            "source 7", None, "source 3", "source 7", None, None, "source 99"]
+        assert sorted(server.queries) == [
+            "SELECT t.* FROM src AS t WHERE t.id IN (3, 120)",
+            "SELECT t.* FROM src AS t WHERE t.id IN (7, 50)",
+            "SELECT t.* FROM src AS t WHERE t.id IN (99)"]
+
+    def test_columns(self, mocker):
+        service = TAPService('http://example.com/tap')
+        with ExitStack() as stack:
+            server = MockLookup(mocker)
+            stack.enter_context(server.matcher)
+            result = service.lookup("src", "id", [5, 50], columns=["name"])
+
+        assert result.fieldnames == ("name",)
+        assert result["name"].tolist() == ["source 5", None]
+        assert server.queries == ["SELECT t.name, t.id FROM src AS t WHERE t.id IN (5, 50)"]
+
+    @pytest.mark.parametrize("key_column,columns", [
+        ("t.id", None),
+        ("id", ["name", "ra + 1"]),
+        ("id", ["COUNT(*)"]),
+        ("id", ["*"]),
+    ])
+    def test_not_column_names(self, mocker, key_column, columns):
+        service = TAPService('http://example.com/tap')
+        with ExitStack() as stack:
+            server = MockLookup(mocker)
+            stack.enter_context(server.matcher)
+            with pytest.raises(ValueError):
+                service.lookup("src", key_column, [5], columns=columns)
+        assert server.queries == []
+
+    def test_delimited_column_names(self, mocker):
+        service = TAPService('http://example.com/tap')
+        with ExitStack() as stack:
+            server = MockLookup(mocker)
+            stack.enter_context(server.matcher)
+            result = service.lookup("src", "id", [5], columns=['"name"'])
+        assert server.queries == ['SELECT t."name", t.id FROM src AS t WHERE t.id IN (5)']
+        assert result["name"].tolist() == ["source 5"]
+
+    def test_upload(self, mocker):
+        service = TAPService('http://example.com/tap')
+        keys = list(range(120, -1, -1))
+        with ExitStack() as stack:
+            server = MockLookup(mocker)
+            stack.enter_context(server.matcher)
+            result = service.lookup("src", "id", keys, upload_threshold=100)
+
+        assert server.queries == [
+            "SELECT t.* FROM src AS t JOIN TAP_UPLOAD.lookup_keys AS u ON t.id = u.lookup_key"]
+        assert result.fieldnames == ("name", "ID")
+        expected = [key if key < 100 and key != 50 else None for key in keys]
+        assert result["ID"].tolist() == expected
+
+    def test_no_keys(self, mocker):
+        service = TAPService('http://example.com/tap')
+        with ExitStack() as stack:
+            server = MockLookup(mocker)
+            stack.enter_context(server.matcher)
+            result = service.lookup("src", "id", [None])
+
+        assert server.queries == ["SELECT TOP 0 t.* FROM src AS t"]
+        assert result["ID"].tolist() == [None]
+
+        with pytest.raises(ValueError):
+            service.lookup("src", "id", [1], method="join")
+
+
+class TestPipeline:
+    def test_run(self, async_fixture):
+        service = TAPService('http://example.com/tap')
+        pipeline = TAPPipeline(service)
+        first = pipeline.add("SELECT * FROM ivoa.obscore")
+        other = pipeline.add("SELECT * FROM ivoa.obscore WHERE 1=1")
+        last = pipeline.add(
+            "SELECT * FROM TAP_UPLOAD.first JOIN TAP_UPLOAD.other USING (obs_id)",
+            uploads={"first": first, "other": other})
+        assert last.dependencies == [first, other]
+
+        result = pipeline.run()
+        assert isinstance(result, TAPResults)
+
+        # only the results of the last stage are retrieved
+        assert [request.path for request in async_fixture['result'].request_history] == [
+            '/tap/async/3/results/result']
+        created = async_fixture['create'].request_history
+        assert [dict(parse_qsl(request.body)).get('UPLOAD') for request in created] == [
+            None, None,
+            'first,http://example.com/tap/async/1/results/result;'
+            'other,http://example.com/tap/async/2/results/result']
+        deleted = [request.path for request in async_fixture['job'].request_history
+                   if request.method == 'DELETE']
+        assert sorted(deleted) == ['/tap/async/1', '/tap/async/2', '/tap/async/3']
+        assert all(stage.job is None for stage in pipeline.stages)
+
+    def test_keep_jobs(self, async_fixture):
+        pipeline = TAPPipeline(TAPService('http://example.com/tap'))
+        first = pipeline.add("SELECT * FROM ivoa.obscore")
+        pipeline.run(delete=False)
+        assert first.job.phase == 'COMPLETED'
+        assert not [request for request in async_fixture['job'].request_history
+                    if request.method == 'DELETE']
+
+    def test_failure(self, async_fixture):
+        pipeline = TAPPipeline(TAPService('http://example.com/tap'))
+        first = pipeline.add("SELECT * FROM ivoa.obscore")
+        pipeline.add("invalid", uploads={"first": first})
+        with pytest.raises(DALQueryError):
+            pipeline.run()
+        deleted = [request.path for request in async_fixture['job'].request_history
+                   if request.method == 'DELETE']
+        assert deleted == ['/tap/async/1']
+
+    def test_independent_stages(self):
+        events = []
+        c_submitted = threading.Event()
+
+        class Job:
+            def __init__(self, query):
+                self.query, self.url = query, f"job {query}"
+
+            def run(self):
+                events.append(("run", self.query))
+                if self.query == "C":
+                    c_submitted.set()
+
+            def wait(self, timeout=None):
+                if self.query == "A":
+                    # A only completes once C has been submitted
+                    assert c_submitted.wait(5)
+                events.append(("completed", self.query))
+
+            def raise_if_error(self):
+                pass
+
+            def fetch_result(self):
+                return self.query
+
+            def delete(self):
+                self.url = None
+
+        class Service:
+            def submit_job(self, query, **kwargs):
+                return Job(query)
+
+        pipeline = TAPPipeline(Service())
+        a = pipeline.add("A")
+        pipeline.add("B", uploads={"a": a})
+        pipeline.add("C")
+        assert pipeline.run() == "C"
+        assert events.index(("run", "C")) < events.index(("completed", "A"))
+        assert events.index(("completed", "A")) < events.index(("run", "B"))
+
+    @pytest.mark.parametrize("delete", [True, False])
+    def test_stage_error(self, delete):
+        events = []
+        aborted = threading.Event()
+
+        class Job:
+            def __init__(self, query):
+                self.query, self.url = query, f"job {query}"
+
+            def run(self):
+                pass
+
+            def wait(self, timeout=None):
+                if self.query == "slow":
+                    # only returns once aborted
+                    assert aborted.wait(5)
+                    events.append("slow returned")
+
+            def abort(self):
+                events.append(("abort", self.query))
+                aborted.set()
+
+            def raise_if_error(self):
+                if self.query != "slow":
+                    raise DALQueryError("failed")
+                events.append("slow checked")
+
+            def delete(self):
+                events.append(("delete", self.query))
+                self.url = None
+
+        class Service:
+            def submit_job(self, query, **kwargs):
+                return Job(query)
+
+        pipeline = TAPPipeline(Service())
+        pipeline.add("slow")
+        pipeline.add("failing")
+        with pytest.raises(DALQueryError):
+            pipeline.run(delete=delete)
+
+        # the slow stage was aborted and waited for before the jobs were deleted
+        assert events[:3] == [("abort", "slow"), "slow returned", "slow checked"]
+        if delete:
+            assert sorted(events[3:]) == [("delete", "failing"), ("delete", "slow")]
+            assert all(stage.job is None for stage in pipeline.stages)
+        else:
+            assert events[3:] == []
+
+    def test_invalid(self):
+        pipeline = TAPPipeline(TAPService('http://example.com/tap'))
+        with pytest.raises(ValueError):
+            pipeline.run()
+        stage = TAPPipeline(pipeline._service).add("SELECT * FROM t")
+        with pytest.raises(ValueError):
+            pipeline.add("SELECT * FROM TAP_UPLOAD.t", uploads={"t": stage})
+
+
+@pytest.fixture()
+def job_journal(tmp_path):
+    previous = get_job_journal()
+    journal = JobJournal(str(tmp_path / "journal.json"))
+    set_job_journal(journal)
+    yield journal
+    set_job_journal(previous)
+
+
+@pytest.fixture()
+def async_server(mocker):
+    server = MockAsyncTAPServer()
+    matchers = server.use(mocker)
+    server.matchers = next(matchers)
+    yield server
+    matchers.close()
+
+
+@pytest.mark.usefixtures('capabilities')
+class TestJobReuse:
+    @pytest.fixture(autouse=True)
+    def no_job_list(self, monkeypatch):
+        # the job list of the mock service has jobs it cannot describe
+        monkeypatch.setattr(TAPService, "get_job_list", lambda self, **kwargs: [])
+
+    @pytest.fixture(autouse=True)
+    def full_job_times(self, monkeypatch):
+        # the reuse checks need the times of the mock jobs, not just their dates
+        monkeypatch.setattr(uws_tree, "XSOutDate", partial(Time, format='isot'))
+
+    def test_journal(self, async_server, job_journal):
+        service = TAPService('http://example.com/tap')
+        service.run_async("SELECT * FROM ivoa.obscore", reuse=True)
+        result = service.run_async("SELECT * FROM ivoa.obscore", reuse=True)
+        assert isinstance(result, TAPResults)
+        assert async_server.matchers['create'].call_count == 1
+        assert list(async_server._jobs) == [1]
+        assert async_server.matchers['result'].call_count == 2
+
+        assert len(JobJournal(job_journal.path)) == 1
+        job = service.submit_job("SELECT * FROM ivoa.obscore", reuse=True)
+        assert job.url == 'http://example.com/tap/async/1'
+        assert job.phase == 'COMPLETED'
+
+        service.run_async("SELECT * FROM ivoa.obscore", maxrec=10, reuse=True)
+        service.run_async("SELECT * FROM ivoa.obscore WHERE 1=1", reuse=True)
+        assert async_server.matchers['create'].call_count == 3
+
+    def test_freshness(self, async_server, job_journal):
+        service = TAPService('http://example.com/tap')
+        service.run_async("SELECT * FROM ivoa.obscore", reuse=True)
+        service.run_async("SELECT * FROM ivoa.obscore", reuse=True, max_age=0)
+        assert async_server.matchers['create'].call_count == 2
+
+        for job in async_server._jobs.values():
+            job.destruction = Time.now() + TimeDelta(60, format='sec')
+        service.run_async("SELECT * FROM ivoa.obscore", reuse=True)
+        assert async_server.matchers['create'].call_count == 3
+
+        # destroyed jobs are forgotten
+        async_server._jobs[1].destruction = Time.now() - TimeDelta(1, format='sec')
+        async_server._jobs[2].destruction = Time.now() - TimeDelta(1, format='sec')
+        async_server._jobs[3].phase = 'ABORTED'
+        assert service.find_completed_job("SELECT * FROM ivoa.obscore") is None
+        assert len(job_journal) == 0
+
+    def test_uploads(self, async_server, job_journal):
+        service = TAPService('http://example.com/tap')
+        query = "SELECT * FROM TAP_UPLOAD.t"
+        service.run_async(query, uploads={"t": Table({"id": [1, 2]})}, reuse=True)
+        service.run_async(query, uploads={"t": Table({"id": [1, 2]})}, reuse=True)
+        assert async_server.matchers['create'].call_count == 1
+        service.run_async(query, uploads={"t": Table({"id": [1, 3]})}, reuse=True)
+        assert async_server.matchers['create'].call_count == 2
+
+    @pytest.mark.parametrize("error", [
+        DALServiceError("forbidden"), requests.ConnectionError(), ValueError("1:0: syntax error")])
+    def test_job_list_unavailable(self, async_server, job_journal, monkeypatch, error):
+        service = TAPService('http://example.com/tap')
+
+        def get_job_list(**kwargs):
+            raise error
+
+        monkeypatch.setattr(service, "get_job_list", get_job_list)
+        assert service.find_completed_job("SELECT * FROM ivoa.obscore") is None
+
+    def test_job_list_bug(self, async_server, job_journal, monkeypatch):
+        service = TAPService('http://example.com/tap')
+
+        def get_job_list(**kwargs):
+            raise TypeError("not a job list problem")
+
+        monkeypatch.setattr(service, "get_job_list", get_job_list)
+        with pytest.raises(TypeError):
+            service.find_completed_job("SELECT * FROM ivoa.obscore")
+
+    def test_job_list(self, async_server, job_journal, monkeypatch):
+        service = TAPService('http://example.com/tap')
+        service.run_async("SELECT * FROM ivoa.obscore", delete=False)
+        service.run_async("SELECT * FROM ivoa.obscore", maxrec=10, delete=False)
+        assert len(job_journal) == 0
+
+        list_kwargs = {}
+
+        def get_job_list(**kwargs):
+            list_kwargs.update(kwargs)
+            return [service.get_job("2"), service.get_job("1")]
+
+        monkeypatch.setattr(service, "get_job_list", get_job_list)
+        job_gets = async_server.matchers['job'].call_count
+        job = service.submit_job("SELECT * FROM ivoa.obscore", reuse=True)
+        assert job.url == 'http://example.com/tap/async/1'
+        assert job_journal.lookup(next(iter(job_journal._entries))) == [job.url]
+        assert async_server.matchers['create'].call_count == 2
+
+        # the job list has the complete descriptions; only the matching
+        # job is fetched again
+        assert list_kwargs["short_description"] is False
+        assert async_server.matchers['job'].call_count == job_gets + 3
@@ -11,7 +11,7 @@ from .exceptions import DALServiceError, DALRateLimitError
 from ..io import vosi
 from ..utils.url import url_sibling
 from ..utils.decorators import stream_decode_content, response_decode_content
-from ..utils.http import use_session
+from ..utils.http import single_flight, use_session
 
 __all__ = ['CapabilityMixin', 'VOSITables']
 
@@ -171,7 +171,9 @@ class CapabilityMixin(EndpointMixin):
 
     @lazyproperty
     def capabilities(self):
-        return vosi.parse_capabilities(self._capabilities().read)
+        return single_flight(
+            self._session, ("capabilities", self.baseurl),
+            lambda: vosi.parse_capabilities(self._capabilities().read))
 
 
 class VOSITables:
@@ -208,18 +210,22 @@ class VOSITables:
 
         if not table.columns and not table.foreignkeys:
             tables_url = f'{self._endpoint_url}/{name}'
-            response = self._get_table_file(tables_url)
-
-            try:
-                response.raise_for_status()
-            except requests.RequestException as ex:
-                raise DALServiceError.from_except(ex, tables_url)
-
-            table = vosi.parse_tables(response.raw.read).get_first_table()
+            table = single_flight(
+                self._session, ("GET", tables_url), lambda: self._fetch_table(tables_url))
             self._cache[name] = table
 
         return table
 
+    def _fetch_table(self, tables_url):
+        response = self._get_table_file(tables_url)
+
+        try:
+            response.raise_for_status()
+        except requests.RequestException as ex:
+            raise DALServiceError.from_except(ex, tables_url)
+
+        return vosi.parse_tables(response.raw.read).get_first_table()
+
     @response_decode_content
     def _get_table_file(self, tables_url):
         return self._session.get(tables_url, stream=True)
@@ -117,7 +117,7 @@ class ImageFound(obscore.ObsCoreMetadata):
         if not obscore_result:
             return
 
-        ap_table = obscore_result.to_table()
+        ap_table = obscore_result.to_table(copy=False)
         our_keys = [n for n in ap_table.colnames if n in cls.attr_names]
         for row in obscore_result:
             yield cls(
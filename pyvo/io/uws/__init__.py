@@ -1,5 +1,5 @@
 # Licensed under a 3-clause BSD style license - see LICENSE.rst
-__all__ = ['parse_job', 'parse_job_list', 'JobFile']
+__all__ = ['parse_job', 'parse_job_list', 'iter_job_list', 'JobFile']
 
 from .endpoint import *
 from .tree import *
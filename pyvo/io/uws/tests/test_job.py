@@ -214,3 +214,26 @@ class TestJob:
         assert element.text == "100"
         assert element.value == 100
         assert isinstance(element.text, str)
+
+
+class TestJobList:
+    def test_parse_job_list(self):
+        jobs = uws.parse_job_list(get_pkg_data_filename("data/jobs.xml"))
+
+        assert [job.jobid for job in jobs] == ['abc1', 'abc2', 'abc3']
+
+    def test_iter_job_list(self):
+        jobs = uws.iter_job_list(get_pkg_data_filename("data/jobs.xml"))
+
+        assert not isinstance(jobs, list)
+
+        first = next(jobs)
+        assert first.jobid == 'abc1'
+        assert first.phase == 'COMPLETED'
+        assert first.runid == 'run1'
+        assert first.ownerid == '21'
+
+        rest = list(jobs)
+        assert [job.jobid for job in rest] == ['abc2', 'abc3']
+        assert rest[1].phase == 'ERROR'
+        assert rest[1].runid is None
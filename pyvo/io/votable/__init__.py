@@ -0,0 +1,4 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+__all__ = ['parse']
+
+from .reader import *
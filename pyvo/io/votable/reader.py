@@ -0,0 +1,648 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+A fast reader for VOTables with a single flat table.
+
+Almost all DAL responses are VOTables with one table of scalars and
+strings.  For these, the metadata is parsed by `astropy.io.votable` as
+usual, but the table rows (TABLEDATA or BINARY2) are decoded a column at
+a time rather than a cell at a time.  Everything else (several tables,
+array-valued columns, BINARY or FITS serializations, anything astropy
+would warn about while reading the rows) is left to
+`astropy.io.votable.parse`, so the result is always the same.
+"""
+import base64
+import contextlib
+import gzip
+import re
+import warnings
+from io import BytesIO
+
+import numpy as np
+
+from astropy.io.votable import parse as votableparse
+
+__all__ = ["parse"]
+
+#: the size of the largest (uncompressed) VOTable read by the fast reader;
+#: larger ones are streamed to astropy.
+FAST_READER_MAX_BYTES = 1 << 28
+
+_XML_SPACE = " \t\r\n"
+
+_XML_DECLARATION = re.compile(rb"""\s*<\?xml[^>]*?encoding\s*=\s*["']([^"']+)["']""")
+_TABLEDATA = re.compile(
+    rb"\s*(?:<TABLEDATA\s*>(.*)</TABLEDATA\s*>|<TABLEDATA\s*/>)\s*$", re.S)
+_BINARY2 = re.compile(
+    rb"""\s*<BINARY2\s*>\s*<STREAM\s+encoding\s*=\s*["']base64["']\s*>([^<]*)"""
+    rb"""</STREAM\s*>\s*</BINARY2\s*>\s*$""")
+# no '<' in cell contents, since neither comments nor CDATA are accepted
+_CELL = re.compile(r"<TD>([^<]*)</TD>|<TD\s*/>")
+_ENTITY = re.compile(r"&(?:#x([0-9a-fA-F]+);|#([0-9]+);|(lt|gt|amp|quot|apos);)")
+_NAMED_ENTITIES = {"lt": "<", "gt": ">", "amp": "&", "quot": '"', "apos": "'"}
+
+_NUMERIC = {"unsignedByte", "short", "int", "long", "float", "double"}
+_STRINGS = {"char", "unicodeChar"}
+
+
+class _Unsupported(Exception):
+    """
+    raised when a VOTable is not for the fast reader.
+    """
+
+
+def parse(source, *, engine="auto", columns=None, max_rows=None):
+    """
+    parses a VOTable.
+
+    This is a drop-in replacement for `astropy.io.votable.parse` with the
+    default options.  VOTables with a single table of scalar and string
+    columns in TABLEDATA or BINARY2 serialization are read several times
+    faster; all others are passed to astropy.
+
+    Columns not in ``columns`` and rows beyond ``max_rows`` are skipped
+    by the fast reader rather than decoded.
+
+    Parameters
+    ----------
+    source : str, readable file-like object or callable
+        the path of the VOTable, a file-like object to read it from, or a
+        function reading a given number of bytes from it.
+    engine : str
+        ``"auto"`` (the default) to use the fast reader where it applies,
+        ``"astropy"`` to always use `astropy.io.votable.parse`.
+    columns : sequence of str or int, optional
+        the IDs, names or indices of the columns to read.  By default, all
+        columns are read.
+    max_rows : int, optional
+        the maximum number of rows to read from each table.
+
+    Returns
+    -------
+    `~astropy.io.votable.tree.VOTableFile`
+        the parsed VOTable.
+    """
+    if engine not in ("auto", "astropy"):
+        raise ValueError(f"Unknown VOTable reader engine: {engine}")
+    if max_rows is not None and max_rows < 0:
+        raise ValueError("max_rows must not be negative")
+    with contextlib.ExitStack() as stack:
+        if engine == "auto":
+            source = _open(source, stack)
+            content, complete = _read_at_most(source, FAST_READER_MAX_BYTES)
+            if complete:
+                try:
+                    return _parse_fast(content, columns, max_rows)
+                except _Unsupported:
+                    pass
+            # astropy reads what was read already, then the rest
+            source.unread(content)
+            del content
+            source = source.read
+
+        # the columns are selected after parsing, as astropy mixes up the
+        # columns of BINARY and BINARY2 tables when selecting them itself.
+        votable = votableparse(source)
+    for table in votable.iter_tables():
+        _select(table, columns, max_rows)
+    return votable
+
+
+def _select(table, columns, max_rows):
+    """
+    reduces the rows of a parsed table to the first max_rows and its
+    fields to columns.
+    """
+    array = table.array
+    if max_rows is not None and len(array) > max_rows:
+        array = array[:max_rows]
+        if table.nrows is not None:
+            table._nrows = max_rows
+
+    colnumbers = _column_numbers(table.fields, columns)
+    if colnumbers is not None and len(colnumbers) < len(table.fields):
+        table.create_arrays(0, table._config, colnumbers=colnumbers)
+        dtype = table.array.dtype
+        data = np.empty(len(array), dtype=dtype)
+        mask = np.zeros(len(array), dtype=np.ma.make_mask_descr(dtype))
+        for name in dtype.names:
+            data[name] = np.ma.getdata(array[name])
+            mask[name] = np.ma.getmaskarray(array[name])
+        array = np.ma.array(data, mask=mask)
+    table.array = array
+
+
+def _column_numbers(fields, columns):
+    """
+    returns the sorted indices of the fields selected by columns (IDs,
+    names or indices), or None for all of them.
+    """
+    if columns is None or len(columns) == 0:
+        return None
+    if isinstance(columns, str):
+        columns = [columns]
+
+    indices = {field.name: index for index, field in enumerate(fields)}
+    indices.update((field.ID, index) for index, field in enumerate(fields))
+    selected, missing = set(), []
+    for column in columns:
+        if isinstance(column, (int, np.integer)):
+            if not 0 <= column < len(fields):
+                raise ValueError("Some specified column numbers out of range")
+            selected.add(int(column))
+        elif isinstance(column, str):
+            if column in indices:
+                selected.add(indices[column])
+            else:
+                missing.append(column)
+        else:
+            raise TypeError("Invalid columns list")
+    if missing:
+        raise ValueError(f"Columns {missing} were not found in fields list")
+    return sorted(selected)
+
+
+def _is_supported(field):
+    if field.datatype in _STRINGS:
+        return bool(re.fullmatch(r"\*|[0-9]+\*?", field.arraysize or ""))
+    return (field.datatype in _NUMERIC or field.datatype == "boolean") and field.arraysize is None
+
+
+class _Stream:
+    """
+    a binary stream reading from the function read, after the content
+    passed to `unread`.
+    """
+    def __init__(self, read):
+        self._read = read
+        self._pending = memoryview(b"")
+
+    def unread(self, content):
+        self._pending = memoryview(content)
+
+    def read(self, size=-1):
+        if len(self._pending):
+            if size is None or size < 0:
+                size = len(self._pending)
+            chunk = bytes(self._pending[:size])
+            self._pending = self._pending[len(chunk):]
+            return chunk
+        chunk = self._read(size)
+        return chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+
+
+def _open(source, stack):
+    """
+    returns a `_Stream` of the uncompressed VOTable in source, a path,
+    file-like object or read function; gzipped VOTables are decompressed
+    while they are read.
+    """
+    if isinstance(source, str):
+        source = stack.enter_context(open(source, "rb"))
+    stream = _Stream(source if callable(source) else source.read)
+    magic = stream.read(2)
+    stream.unread(magic)
+    if magic == b"\x1f\x8b":
+        stream = _Stream(stack.enter_context(gzip.GzipFile(fileobj=stream, mode="rb")).read)
+    return stream
+
+
+def _read_at_most(stream, limit):
+    """
+    returns the content read from stream, stopping once it is longer than
+    limit, and whether all of it was read.
+    """
+    content = bytearray()
+    while len(content) <= limit:
+        chunk = stream.read(1 << 20)
+        if not chunk:
+            return content, True
+        content += chunk
+    return content, False
+
+
+def _parse_fast(content, columns=None, max_rows=None):
+    declaration = _XML_DECLARATION.match(content)
+    if declaration and declaration.group(1).lower() not in (b"utf-8", b"utf8", b"us-ascii", b"ascii"):
+        raise _Unsupported()
+    if (content.count(b"<TABLE") - content.count(b"<TABLEDATA") != 1
+            or content.count(b"<DATA") != 1):
+        raise _Unsupported()
+    start, end = content.find(b"<DATA>"), content.find(b"</DATA>")
+    if start < 0 or end < start:
+        raise _Unsupported()
+    # comments and CDATA sections, and line ends the XML parser normalizes
+    if content.find(b"<!", start, end) >= 0 or content.find(b"\r", start, end) >= 0:
+        raise _Unsupported()
+    # a view, so that the rows are not copied before they are decoded
+    body = memoryview(content)[start + len(b"<DATA>"):end]
+
+    # the metadata is parsed by astropy; its warnings are only issued if
+    # the rows can be read here, too, as they are issued again otherwise.
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        try:
+            votable = votableparse(BytesIO(content[:start] + content[end + len(b"</DATA>"):]))
+        except Exception:
+            raise _Unsupported()
+    table = votable.get_first_table()
+    config = table._config
+
+    fields = list(table.fields)
+    if not fields:
+        raise _Unsupported()
+    colnumbers = _column_numbers(fields, columns)
+    if colnumbers is None:
+        colnumbers = range(len(fields))
+
+    tabledata, binary2 = _TABLEDATA.match(body), _BINARY2.match(body)
+    if tabledata:
+        # cells of the other columns are skipped, whatever their type
+        if not all(_is_supported(fields[index]) for index in colnumbers):
+            raise _Unsupported()
+        decoded = _read_tabledata(
+            tabledata.group(1) or b"", fields, config, colnumbers, max_rows)
+    elif binary2:
+        if not all(_is_supported(field) for field in fields):
+            raise _Unsupported()
+        decoded = _read_binary2(
+            base64.b64decode(binary2.group(1)), fields, colnumbers, max_rows)
+    else:
+        raise _Unsupported()
+
+    nrows = len(decoded[0][0])
+    if (table.nrows is not None and table.nrows >= 0 and table.nrows != nrows
+            and nrows != max_rows):
+        raise _Unsupported()
+
+    if len(colnumbers) < len(fields):
+        table.create_arrays(0, config, colnumbers=colnumbers)
+    dtype = table.array.dtype
+    array = np.empty(nrows, dtype=dtype)
+    mask = np.zeros(nrows, dtype=np.ma.make_mask_descr(dtype))
+    for name, (values, value_mask) in zip(dtype.names, decoded):
+        array[name] = values
+        mask[name] = value_mask
+    table.array = np.ma.array(array, mask=mask)
+    if tabledata or table.nrows is not None:
+        # as set by astropy
+        table._nrows = nrows
+
+    for warning in caught:
+        warnings.warn_explicit(
+            warning.message, warning.category, warning.filename, warning.lineno)
+    return votable
+
+
+def _read_tabledata(body, fields, config, colnumbers, max_rows):
+    """
+    returns (values, mask) for the columns colnumbers of the TABLEDATA
+    content body, reading at most max_rows rows.
+    """
+    # all '<' in the content are markup, so the rows and cells can be
+    # found (and counted) with vectorized byte comparisons.
+    buf = np.frombuffer(body, dtype=np.uint8)
+    tags = np.flatnonzero(buf[:-2] == ord("<"))
+    second, third = buf[tags + 1], buf[tags + 2]
+    row_tags = tags[(second == ord("T")) & (third == ord("R"))]
+    if max_rows is not None and len(row_tags) > max_rows:
+        # the following rows are not looked at
+        end = row_tags[max_rows]
+        body, buf = body[:end], buf[:end]
+        in_rows = tags < end
+        tags, second, third = tags[in_rows], second[in_rows], third[in_rows]
+        row_tags = row_tags[:max_rows]
+    cell_tags = tags[(second == ord("T")) & (third == ord("D"))]
+
+    try:
+        text = body.decode("utf-8")
+    except UnicodeDecodeError:
+        raise _Unsupported()
+    cells = _CELL.findall(text)
+    if len(cells) != len(cell_tags):
+        # TD elements with attributes, e.g., base64 encoded ones
+        raise _Unsupported()
+    row_of_cell = np.searchsorted(row_tags, cell_tags, side="right") - 1
+    if len(cells) and row_of_cell[0] < 0:
+        raise _Unsupported()
+    if np.any(np.bincount(row_of_cell, minlength=len(row_tags)) != len(fields)):
+        raise _Unsupported()
+    # whether any cell content starts or ends with white space
+    close_tags = tags[(second == ord("/")) & (third == ord("T"))]
+    close_tags = close_tags[buf[np.minimum(close_tags + 3, len(buf) - 1)] == ord("D")]
+    spaces = np.frombuffer(_XML_SPACE.encode("ascii"), dtype=np.uint8)
+    padded = bool(np.isin(buf[np.minimum(cell_tags + 4, len(buf) - 1)], spaces).any()
+                  or np.isin(buf[close_tags - 1], spaces).any())
+
+    columns = []
+    for index in colnumbers:
+        field = fields[index]
+        tokens = cells[index::len(fields)]
+        if padded:
+            # the XML parser strips the text of elements
+            tokens = [token.strip(_XML_SPACE) for token in tokens]
+        if field.datatype in _STRINGS:
+            columns.append(_strings_from_text(tokens, field))
+        elif field.datatype in ("float", "double"):
+            columns.append(_floats_from_text(tokens, field.converter))
+        elif field.datatype in _NUMERIC:
+            columns.append(_integers_from_text(tokens, field.converter, config))
+        else:
+            columns.append(_by_value(
+                np.array(tokens, dtype=object), field.converter,
+                lambda token, converter=field.converter: converter.parse(
+                    token, config, None)))
+    return columns
+
+
+def _unescape(text):
+    def replace(match):
+        hex_code, code, name = match.groups()
+        if name:
+            return _NAMED_ENTITIES[name]
+        return chr(int(hex_code, 16) if hex_code else int(code))
+
+    if text.count("&") != len(_ENTITY.findall(text)):
+        # not well-formed, or an entity astropy cannot resolve either
+        raise _Unsupported()
+    return _ENTITY.sub(replace, text)
+
+
+def _strings_from_text(tokens, field):
+    joined = "".join(tokens)
+    if field.datatype == "char" and not joined.isascii():
+        # astropy warns about these
+        raise _Unsupported()
+    if "&" in joined:
+        tokens = [_unescape(token) if "&" in token else token for token in tokens]
+    return _string_column(tokens, field.converter)
+
+
+def _string_column(values, converter):
+    if converter.arraysize != "*" and max(map(len, values), default=0) > converter.arraysize:
+        # astropy warns about these
+        raise _Unsupported()
+    column = np.empty(len(values), dtype=converter.format)
+    column[:] = values
+    return column, np.zeros(len(values), dtype=bool)
+
+
+def _floats_from_text(tokens, converter):
+    try:
+        values = np.fromiter(map(float, tokens), dtype=np.float64, count=len(tokens))
+    except ValueError:
+        # empty cells
+        try:
+            values = np.fromiter(
+                (float(token) if token else np.nan for token in tokens),
+                dtype=np.float64, count=len(tokens))
+        except ValueError:
+            # astropy warns about these
+            raise _Unsupported()
+    else:
+        tokens = None
+
+    values = values.astype(converter.format)
+    if converter.null is None:
+        return values, np.isnan(values)
+
+    mask = values == converter.null
+    if tokens is not None:
+        empty = np.fromiter((not token for token in tokens), dtype=bool, count=len(tokens))
+        values[empty] = converter.null
+        mask |= empty
+    return values, mask
+
+
+def _integers_from_text(tokens, converter, config):
+    empty = np.zeros(len(tokens), dtype=bool)
+    try:
+        values = np.fromiter(map(int, tokens), dtype=np.int64, count=len(tokens))
+    except (ValueError, OverflowError):
+        values, empty = _integers_from_text_slowly(tokens, converter, config)
+
+    dtype = np.dtype(converter.format)
+    info = np.iinfo(dtype)
+    if len(values) and (values.min() < info.min or values.max() > info.max):
+        # astropy clips these and warns
+        raise _Unsupported()
+    values = values.astype(dtype)
+
+    mask = empty
+    if converter.null is not None:
+        mask = mask | (values == converter.null)
+    return values, mask
+
+
+def _integers_from_text_slowly(tokens, converter, config):
+    """
+    returns values and mask of integer tokens including empty cells, NaN
+    and hexadecimal values.
+    """
+    values = np.zeros(len(tokens), dtype=np.int64)
+    empty = np.zeros(len(tokens), dtype=bool)
+    masked_value = converter.null if converter.null is not None else converter.default
+    for index, token in enumerate(tokens):
+        token = token.lower()
+        if not token or token == "nan":
+            if (not token and not config.get("version_1_3_or_later")
+                    or token and converter.null is None):
+                # astropy warns about these
+                raise _Unsupported()
+            values[index], empty[index] = masked_value, True
+            continue
+        try:
+            if token.startswith("0x"):
+                values[index] = int(token[2:], 16)
+            else:
+                values[index] = int(token, 10)
+        except (ValueError, OverflowError):
+            raise _Unsupported()
+    return values, empty
+
+
+def _by_value(tokens, converter, parse):
+    """
+    returns values and mask of the array tokens, parsing each distinct
+    token with parse.
+    """
+    distinct, inverse = np.unique(tokens, return_inverse=True)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        try:
+            parsed = [parse(token) for token in distinct]
+        except Exception:
+            raise _Unsupported()
+    values = np.array([value for value, _ in parsed], dtype=converter.format)
+    mask = np.array([value_mask for _, value_mask in parsed], dtype=bool)
+    inverse = inverse.reshape(-1)
+    return values[inverse], mask[inverse]
+
+
+def _binary_layout(fields):
+    """
+    returns, for each field, the numpy dtype of its BINARY2 serialization,
+    or the size of its characters if it has a variable length.
+    """
+    layout = []
+    for field in fields:
+        converter = field.converter
+        if field.datatype in _STRINGS:
+            width = 1 if field.datatype == "char" else 2
+            if field.arraysize.endswith("*"):
+                layout.append(width)
+            else:
+                layout.append(np.dtype(f"S{converter.arraysize * width}"))
+        elif field.datatype == "boolean":
+            layout.append(np.dtype("S1"))
+        else:
+            layout.append(np.dtype(converter.format).newbyteorder(">"))
+    return layout
+
+
+def _read_binary2(raw, fields, colnumbers, max_rows):
+    """
+    returns (values, mask) for the columns colnumbers of the BINARY2
+    stream raw, reading at most max_rows rows.
+    """
+    layout = _binary_layout(fields)
+    nbitmap = (len(fields) + 7) // 8
+
+    if all(isinstance(item, np.dtype) for item in layout):
+        row = np.dtype([("bitmap", "u1", (nbitmap,))] + [
+            (f"f{index}", item) for index, item in enumerate(layout)])
+        if len(raw) % row.itemsize:
+            raise _Unsupported()
+        count = len(raw) // row.itemsize
+        if max_rows is not None:
+            count = min(count, max_rows)
+        rows = np.frombuffer(raw, dtype=row, count=count)
+        bitmap = rows["bitmap"]
+        raw_columns = [rows[f"f{index}"] for index in range(len(fields))]
+    else:
+        bitmap, raw_columns = _split_binary_rows(raw, layout, nbitmap, colnumbers, max_rows)
+
+    null_flags = np.unpackbits(bitmap, axis=1, count=len(fields)).astype(bool)
+    columns = []
+    for index in colnumbers:
+        field = fields[index]
+        raw_column, converter = raw_columns[index], field.converter
+        if field.datatype in _STRINGS:
+            # astropy ignores the null flags of strings
+            columns.append(_strings_from_binary(raw_column, field))
+        elif field.datatype == "boolean":
+            values, mask = _by_value(
+                raw_column.view(np.uint8), converter,
+                lambda code, converter=converter: converter.binparse(BytesIO(bytes([code])).read))
+            columns.append((values, mask | null_flags[:, index]))
+        else:
+            values = raw_column.astype(converter.format)
+            if converter.null is not None:
+                mask = values == converter.null
+            elif values.dtype.kind == "f":
+                mask = np.isnan(values)
+            else:
+                mask = np.zeros(len(values), dtype=bool)
+            columns.append((values, mask | null_flags[:, index]))
+    return columns
+
+
+def _split_binary_rows(raw, layout, nbitmap, colnumbers, max_rows):
+    """
+    returns the null flag bitmap and the raw columns colnumbers (None for
+    the others) of the first max_rows rows of a BINARY2 stream with
+    variable-length columns.
+
+    The rows are walked to find where the variable-length values are; the
+    fixed-size values are then gathered with fancy indexing.
+    """
+    # the runs of fixed-size fields between variable-length ones, as
+    # lists of (field index, dtype, offset in the run), with their sizes
+    runs, run, run_size = [], [], nbitmap
+    for index, item in enumerate(layout):
+        if isinstance(item, np.dtype):
+            run.append((index, item, run_size))
+            run_size += item.itemsize
+        else:
+            runs.append((run, run_size, index, item))
+            run, run_size = [], 0
+    runs.append((run, run_size, None, None))
+
+    run_starts = [[] for _ in runs]
+    var_cells = {index: [] for _, _, index, _ in runs if index is not None}
+    pos, size, nrows = 0, len(raw), 0
+    if max_rows is None:
+        max_rows = size
+    try:
+        while pos < size and nrows < max_rows:
+            nrows += 1
+            for run_index, (_, run_size, var_index, width) in enumerate(runs):
+                run_starts[run_index].append(pos)
+                pos += run_size
+                if var_index is not None:
+                    length = int.from_bytes(raw[pos:pos + 4], "big") * width
+                    var_cells[var_index].append(raw[pos + 4:pos + 4 + length])
+                    pos += 4 + length
+    except IndexError:
+        raise _Unsupported()
+    if pos > size:
+        raise _Unsupported()
+
+    buf = np.frombuffer(raw, dtype=np.uint8)
+    raw_columns = [None] * len(layout)
+    for (run, _, var_index, _), starts in zip(runs, run_starts):
+        starts = np.array(starts, dtype=np.intp)
+        for index, dtype, offset in run:
+            if index in colnumbers:
+                raw_columns[index] = _gather(buf, starts + offset, dtype)
+        if var_index is not None:
+            raw_columns[var_index] = var_cells[var_index]
+    bitmap = _gather(buf, np.array(run_starts[0], dtype=np.intp), nbitmap)
+    return bitmap, raw_columns
+
+
+def _gather(buf, offsets, dtype):
+    """
+    returns the values of type dtype (or byte strings of this length if
+    it is an integer) at offsets in the byte array buf.
+    """
+    size = dtype if isinstance(dtype, int) else dtype.itemsize
+    indices = offsets[:, np.newaxis] + np.arange(size)
+    if len(indices) and size and indices.max() >= len(buf):
+        raise _Unsupported()
+    chunks = np.ascontiguousarray(buf[indices])
+    if isinstance(dtype, int):
+        return chunks
+    return chunks.view(dtype).reshape(len(offsets))
+
+
+def _strings_from_binary(raw_column, field):
+    converter = field.converter
+    if isinstance(raw_column, list):
+        # variable length
+        try:
+            if field.datatype == "char":
+                values = [value.decode("ascii") for value in raw_column]
+            else:
+                values = [value.decode("utf_16_be") for value in raw_column]
+        except UnicodeDecodeError:
+            raise _Unsupported()
+        return _string_column(values, converter)
+
+    if field.datatype == "char":
+        if any(b"\0" in value for value in raw_column.tolist()):
+            # astropy cuts the value there
+            raise _Unsupported()
+        try:
+            values = raw_column.astype(converter.format)
+        except UnicodeDecodeError:
+            raise _Unsupported()
+    else:
+        codes = raw_column.view(">u2").reshape(len(raw_column), converter.arraysize)
+        if np.any((codes >= 0xd800) & (codes < 0xe000)):
+            raise _Unsupported()
+        # astropy cuts the value at the first NUL
+        after_nul = np.cumsum(codes == 0, axis=1) > 0
+        if np.any(after_nul & (codes != 0)):
+            raise _Unsupported()
+        values = codes.astype(np.uint32).view(converter.format).reshape(len(raw_column))
+    return values, np.zeros(len(raw_column), dtype=bool)
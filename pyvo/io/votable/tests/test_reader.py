@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Tests for pyvo.io.votable
+"""
+import gzip
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+from astropy.io.votable import parse as astropy_parse
+from astropy.io.votable.tree import Field, Resource, TableElement, VOTableFile
+
+from pyvo.io.votable import parse
+from pyvo.io.votable import reader
+
+
+FIELDS = [
+    dict(name="s", datatype="char", arraysize="*"),
+    dict(name="c", datatype="char", arraysize="6"),
+    dict(name="u", datatype="unicodeChar", arraysize="*"),
+    dict(name="uf", datatype="unicodeChar", arraysize="4"),
+    dict(name="i", datatype="int", null=-1),
+    dict(name="l", datatype="long"),
+    dict(name="sh", datatype="short", null=-99),
+    dict(name="ub", datatype="unsignedByte"),
+    dict(name="f", datatype="float"),
+    dict(name="d", datatype="double"),
+    dict(name="b", datatype="boolean"),
+    dict(name="vb", datatype="char", arraysize="5*"),
+]
+
+ROWS = [
+    ("a&b<c>", "xy", "ü€", "äb", 5, 2**40, 3, 200, 1.5, np.nan, True, "ab"),
+    ("", "", "", "", -1, -5, -99, 0, np.nan, 1e300, False, ""),
+    ("  pad ", "abcdef", "漢字", "abcd", 7, 0, 1, 255, -0.0, -2.5, True, "abcde"),
+]
+
+MASKS = [
+    (False,) * 12,
+    (False, False, False, False, True, True, True, True, True, False, True, False),
+    (False,) * 12,
+]
+
+SIMPLE_FIELDS = (
+    '<FIELD name="s" datatype="char" arraysize="*"/>'
+    '<FIELD name="i" datatype="int"><VALUES null="-1"/></FIELD>'
+    '<FIELD name="d" datatype="double"/>'
+    '<FIELD name="b" datatype="boolean"/>')
+
+
+def make_votable(format):
+    votable = VOTableFile()
+    resource = Resource()
+    votable.resources.append(resource)
+    table = TableElement(votable)
+    resource.tables.append(table)
+    for spec in FIELDS:
+        spec = dict(spec)
+        null = spec.pop("null", None)
+        field = Field(votable, **spec)
+        if null is not None:
+            field.values.null = null
+        table.fields.append(field)
+
+    table.create_arrays(len(ROWS))
+    for index, (row, mask) in enumerate(zip(ROWS, MASKS)):
+        table.array[index] = row
+        table.array.mask[index] = mask
+    table.format = format
+
+    out = BytesIO()
+    votable.to_xml(out)
+    return out.getvalue()
+
+
+def votable_document(fields, data, table_attributes=""):
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<VOTABLE version="1.4" xmlns="http://www.ivoa.net/xml/VOTable/v1.3">'
+        f'<RESOURCE type="results"><TABLE{table_attributes}>{fields}'
+        f'<DATA>{data}</DATA></TABLE></RESOURCE></VOTABLE>').encode("utf-8")
+
+
+def is_fast(content):
+    try:
+        reader._parse_fast(content)
+    except reader._Unsupported:
+        return False
+    return True
+
+
+def assert_same_table(content):
+    expected = astropy_parse(BytesIO(content)).get_first_table().array
+    array = parse(BytesIO(content)).get_first_table().array
+
+    assert array.dtype == expected.dtype
+    assert type(array.data) is type(expected.data)
+    for name in expected.dtype.names:
+        mask = np.ma.getmaskarray(array[name])
+        np.testing.assert_array_equal(mask, np.ma.getmaskarray(expected[name]))
+        values, expected_values = array[name].data[~mask], expected[name].data[~mask]
+        if values.dtype.kind == "f":
+            np.testing.assert_array_equal(values, expected_values)
+        else:
+            assert values.tolist() == expected_values.tolist()
+
+
+@pytest.mark.parametrize("format", ["tabledata", "binary2"])
+def test_fast_formats(format):
+    content = make_votable(format)
+    assert is_fast(content)
+    assert_same_table(content)
+
+
+@pytest.mark.parametrize("data", [
+    '<TABLEDATA><TR><TD>  a  b  </TD><TD> 5 </TD><TD> 1.5 </TD><TD>T</TD></TR>\n'
+    '<TR><TD>x&amp;y&#65;&#x42;</TD><TD/><TD></TD><TD>?</TD></TR>'
+    '<TR><TD>\nmulti\nline</TD><TD>0x10</TD><TD>NaN</TD><TD>false</TD></TR>'
+    '<TR><TD/><TD>nan</TD><TD> </TD><TD>1</TD></TR>'
+    '<TR ID="r"><TD>z</TD><TD>-1</TD><TD>inf</TD><TD> </TD></TR></TABLEDATA>',
+    '<TABLEDATA/>',
+    '<TABLEDATA>\n</TABLEDATA>',
+])
+def test_tabledata_text(data):
+    content = votable_document(SIMPLE_FIELDS, data)
+    assert is_fast(content)
+    assert_same_table(content)
+
+
+def test_tabledata_integers():
+    content = votable_document(
+        '<FIELD name="l" datatype="long"/><FIELD name="ub" datatype="unsignedByte"/>'
+        '<FIELD name="f" datatype="float"><VALUES null="-99"/></FIELD>',
+        '<TABLEDATA><TR><TD>-9223372036854775808</TD><TD>255</TD><TD>-99</TD></TR>'
+        '<TR><TD>+12</TD><TD>0x1F</TD><TD/></TR></TABLEDATA>')
+    assert is_fast(content)
+    assert_same_table(content)
+
+
+@pytest.mark.parametrize("fields,data", [
+    # encoded cells
+    (SIMPLE_FIELDS, '<TABLEDATA><TR><TD>a</TD><TD encoding="base64">AAAAAQ==</TD>'
+                    '<TD>1</TD><TD>T</TD></TR></TABLEDATA>'),
+    # comments
+    (SIMPLE_FIELDS, '<TABLEDATA><!-- x --><TR><TD>a</TD><TD>1</TD><TD>1</TD>'
+                    '<TD>T</TD></TR></TABLEDATA>'),
+    # non-ASCII char
+    (SIMPLE_FIELDS, '<TABLEDATA><TR><TD>ä</TD><TD>1</TD><TD>1</TD><TD>T</TD></TR></TABLEDATA>'),
+    # arrays
+    ('<FIELD name="d" datatype="float" arraysize="2"/>',
+     '<TABLEDATA><TR><TD>1 2</TD></TR></TABLEDATA>'),
+    # out of range
+    ('<FIELD name="d" datatype="short"/>', '<TABLEDATA><TR><TD>70000</TD></TR></TABLEDATA>'),
+])
+@pytest.mark.filterwarnings("ignore::astropy.io.votable.exceptions.VOTableSpecWarning")
+def test_fallback(fields, data):
+    content = votable_document(fields, data)
+    assert not is_fast(content)
+    assert_same_table(content)
+
+
+def test_fallback_several_tables():
+    content = votable_document(SIMPLE_FIELDS, '<TABLEDATA/>').replace(
+        b'</RESOURCE>', b'<TABLE><FIELD name="x" datatype="int"/></TABLE></RESOURCE>')
+    assert not is_fast(content)
+    assert len(parse(BytesIO(content)).resources[0].tables) == 2
+
+
+def test_fallback_error():
+    content = votable_document(
+        SIMPLE_FIELDS, '<TABLEDATA><TR><TD>a</TD><TD>1</TD><TD>1</TD></TR></TABLEDATA>')
+    with pytest.raises(Exception) as expected:
+        astropy_parse(BytesIO(content))
+    with pytest.raises(expected.type):
+        parse(BytesIO(content))
+
+
+def test_engine():
+    content = make_votable("tabledata")
+    table = parse(BytesIO(content), engine="astropy").get_first_table()
+    assert len(table.array) == len(ROWS)
+
+    with pytest.raises(ValueError):
+        parse(BytesIO(content), engine="fast")
+
+
+def test_sources(tmp_path):
+    content = make_votable("binary2")
+    path = tmp_path / "table.xml"
+    path.write_bytes(content)
+
+    for source in (str(path), BytesIO(content), BytesIO(content).read):
+        assert len(parse(source).get_first_table().array) == len(ROWS)
+
+
+def test_gzip(tmp_path):
+    content = make_votable("tabledata")
+    path = tmp_path / "table.xml.gz"
+    path.write_bytes(gzip.compress(content))
+
+    for source in (str(path), BytesIO(gzip.compress(content)).read):
+        assert len(parse(source).get_first_table().array) == len(ROWS)
+
+
+def test_streamed(monkeypatch):
+    content = make_votable("binary2")
+    monkeypatch.setattr(reader, "FAST_READER_MAX_BYTES", 100)
+    monkeypatch.setattr(reader, "_parse_fast", None)
+
+    chunks = BytesIO(gzip.compress(content))
+    assert len(parse(lambda size: chunks.read(min(size, 50))).get_first_table().array) == len(ROWS)
+    assert_same_table(content)
+
+
+@pytest.mark.parametrize("format", ["tabledata", "binary2"])
+@pytest.mark.parametrize("engine", ["auto", "astropy"])
+def test_columns_and_rows(format, engine):
+    content = make_votable(format)
+    expected = astropy_parse(BytesIO(content)).get_first_table().array
+
+    table = parse(
+        BytesIO(content), engine=engine, columns=["d", "s", 4], max_rows=2).get_first_table()
+    assert [field.ID for field in table.fields] == ["s", "i", "d"]
+    assert table.array.dtype.names == ("s", "i", "d")
+    assert len(table.array) == 2
+    for name in table.array.dtype.names:
+        np.testing.assert_array_equal(table.array[name], expected[name][:2])
+        np.testing.assert_array_equal(
+            np.ma.getmaskarray(table.array[name]), np.ma.getmaskarray(expected[name][:2]))
+
+
+def test_columns_by_name():
+    content = votable_document(
+        '<FIELD ID="_1" name="1" datatype="int"/><FIELD ID="_2" name="2" datatype="int"/>',
+        '<TABLEDATA><TR><TD>1</TD><TD>2</TD></TR></TABLEDATA>')
+    for columns in (["2"], ["_2"], [1]):
+        table = parse(BytesIO(content), columns=columns).get_first_table()
+        assert table.array["_2"].tolist() == [2]
+        assert table.array.dtype.names == ("_2",)
+
+    with pytest.raises(ValueError):
+        parse(BytesIO(content), columns=["3"])
+    with pytest.raises(ValueError):
+        parse(BytesIO(content), columns=[2])
+
+
+def test_max_rows():
+    content = make_votable("tabledata")
+    assert len(parse(BytesIO(content), max_rows=0).get_first_table().array) == 0
+    assert len(parse(BytesIO(content), max_rows=10).get_first_table().array) == len(ROWS)
+    with pytest.raises(ValueError):
+        parse(BytesIO(content), max_rows=-1)
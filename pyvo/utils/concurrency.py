@@ -0,0 +1,64 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Helpers for running network-bound operations concurrently.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = ["DEFAULT_MAX_WORKERS", "ordered_map"]
+
+# Default number of worker threads for concurrent network requests.
+DEFAULT_MAX_WORKERS = 4
+
+
+def ordered_map(func, iterable, *, max_workers=DEFAULT_MAX_WORKERS,
+                window=None):
+    """
+    Lazily apply ``func`` to the items of ``iterable`` in a thread pool,
+    yielding the results in input order.
+
+    At most ``window`` calls are in flight (or finished but not yet
+    consumed) at any time, so memory stays bounded even for very long
+    or unbounded inputs.  The input iterable is consumed lazily.
+
+    Parameters
+    ----------
+    func : callable
+        the function to apply to each item.
+    iterable : iterable
+        the items to process.
+    max_workers : int
+        the maximum number of worker threads.  With one worker or less,
+        ``func`` is called in the calling thread.
+    window : int, optional
+        the maximum number of pending results; defaults to twice
+        ``max_workers``.
+
+    Yields
+    ------
+    the results of ``func`` in the order of ``iterable``.  If a call
+    raises, the exception is re-raised when its result is due, and
+    all outstanding calls that have not started yet are cancelled.
+    """
+    if not max_workers or max_workers <= 1:
+        for item in iterable:
+            yield func(item)
+        return
+
+    if window is None:
+        window = 2 * max_workers
+    window = max(window, 1)
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for item in iterable:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
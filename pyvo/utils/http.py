@@ -2,11 +2,14 @@
 """
 HTTP utils
 """
+import copy
 import platform
+import threading
+
 import requests
 from ..version import version
 
-__all__ = ["setup_user_agent"]
+__all__ = ["setup_user_agent", "single_flight"]
 
 
 _USER_AGENT_TEMPLATE = ("pyVO/{pyvo_version} Python/{python_version}"
@@ -65,4 +68,113 @@ def create_session():
     return session
 
 
+class _Call:
+    """
+    a call in flight, see `single_flight`.
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.completed = False
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+def _session_key(session):
+    """
+    returns the key under which requests made through session may be
+    shared.
+
+    Plain requests sessions without credentials, cookies or client
+    certificates are interchangeable as long as they send the same
+    headers.  Other sessions only share requests with themselves.
+    """
+    if (type(session) is requests.Session and session.auth is None
+            and not session.cookies and session.cert is None):
+        return (tuple(sorted(session.headers.items())), repr(session.verify),
+                tuple(sorted(session.proxies.items())))
+    return session
+
+
+def _copy_error(error):
+    """
+    returns a copy of error for raising in another thread, so that the
+    threads do not add to the traceback of the same exception.
+    """
+    try:
+        duplicate = copy.copy(error)
+    except Exception:
+        return error
+    if type(duplicate) is not type(error) or str(duplicate) != str(error):
+        return error
+    duplicate.__cause__, duplicate.__context__ = error.__cause__, error.__context__
+    duplicate.__suppress_context__ = error.__suppress_context__
+    return duplicate.with_traceback(error.__traceback__)
+
+
+def single_flight(session, key, function):
+    """
+    returns ``function()``, sharing the call with identical calls in
+    flight in other threads.
+
+    This is for idempotent GET requests and the parsing of their
+    responses: while one thread runs function for a key, other threads
+    asking for the same key (through an equivalent session) wait for it
+    and get its result rather than sending their own request.  Results
+    are usually mutable (e.g., parsed VOTables), so if other threads
+    waited for a call, each thread gets its own deep copy of the result.
+    If function raises an exception, all waiting threads raise it, too;
+    if it is interrupted (e.g., by KeyboardInterrupt), one of the waiting
+    threads runs function itself.
+
+    Nothing is kept once the call is complete, so later calls run
+    function again.
+
+    Parameters
+    ----------
+    session : object
+        the session function makes its requests with.
+    key : tuple
+        identifies the request, e.g., by its URL and parameters.
+    function : callable
+        makes the request and parses the response.
+    """
+    key = (_session_key(session),) + tuple(key)
+    while True:
+        with _calls_lock:
+            call = _calls.get(key)
+            leader = call is None
+            if leader:
+                call = _calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if leader:
+            try:
+                call.result = function()
+                call.completed = True
+            except Exception as error:
+                call.error = error
+                raise
+            finally:
+                with _calls_lock:
+                    del _calls[key]
+                    waiters = call.waiters
+                call.done.set()
+            # the result itself is only handed out if nobody else gets it;
+            # otherwise it stays untouched for the waiters to copy.
+            return copy.deepcopy(call.result) if waiters else call.result
+
+        call.done.wait()
+        if call.error is not None:
+            raise _copy_error(call.error)
+        if call.completed:
+            return copy.deepcopy(call.result)
+        # the call was interrupted; try again
+
+
 setup_user_agent()
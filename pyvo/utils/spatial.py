@@ -0,0 +1,241 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+A spatial index for positions on the sky.
+"""
+import numpy as np
+
+__all__ = ["SpatialIndex"]
+
+# the area of the sky in square degrees
+_SKY_AREA = 41253.
+
+
+def _unit_vectors(ra, dec):
+    """
+    returns the cartesian unit vectors for ra and dec (in degrees) as an
+    (n, 3) array.
+    """
+    ra, dec = np.radians(ra), np.radians(dec)
+    cos_dec = np.cos(dec)
+    return np.stack(
+        [cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)], axis=-1)
+
+
+def _chord_to_angle(chord):
+    """
+    returns the angles in degrees subtended by chords of the unit sphere.
+    """
+    return np.degrees(2 * np.arcsin(np.clip(chord / 2, 0, 1)))
+
+
+def _angle_to_chord(angle):
+    """
+    returns the length of the chords of the unit sphere subtending angle
+    (in degrees).
+    """
+    return 2 * np.sin(np.radians(np.minimum(angle, 180)) / 2)
+
+
+class SpatialIndex:
+    """
+    An index for within-radius and nearest-neighbour lookups on a set of
+    positions on the sky.
+
+    The positions are sorted into declination zones and by right
+    ascension within each zone, so that a lookup only has to look at a
+    few short runs of positions.  Distances are computed from unit
+    vectors, which is accurate at all scales and free of trouble at the
+    poles and the RA wrap-around.
+
+    Positions that are not finite are not indexed and never returned.
+
+    Parameters
+    ----------
+    ra, dec : array-like
+        the positions in degrees.
+    zone_height : float, optional
+        the height of the declination zones in degrees.  The default is
+        chosen so that, for evenly spread positions, a zone square holds
+        about ten of them.
+    """
+    def __init__(self, ra, dec, *, zone_height=None):
+        ra = np.asarray(ra, dtype=float).reshape(-1) % 360
+        dec = np.asarray(dec, dtype=float).reshape(-1)
+        valid = np.isfinite(ra) & np.isfinite(dec)
+        rows = np.flatnonzero(valid)
+        ra, dec = ra[valid], dec[valid]
+
+        if zone_height is None:
+            zone_height = np.clip(
+                np.sqrt(_SKY_AREA * 10 / max(len(ra), 1)), 1 / 60, 10)
+        self.zone_height = float(zone_height)
+        self._nzones = int(np.ceil(180 / self.zone_height)) + 1
+
+        zones = self._zone(dec)
+        order = np.lexsort((ra, zones))
+        self._rows = rows[order]
+        self._ra = ra[order]
+        self._vectors = _unit_vectors(ra[order], dec[order])
+        self._zone_bounds = np.searchsorted(zones[order], np.arange(self._nzones + 1))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _zone(self, dec):
+        return np.clip(
+            np.floor((np.asarray(dec) + 90) / self.zone_height).astype(int),
+            0, self._nzones - 1)
+
+    def _candidates(self, ra, dec, radius):
+        """
+        returns the positions (in index order) of the indexed points that
+        may be within radius degrees of (ra, dec).
+        """
+        low_zone = self._zone(max(dec - radius, -90))
+        high_zone = self._zone(min(dec + radius, 90))
+
+        if abs(dec) + radius >= 90:
+            ra_ranges = [(0, 360)]
+        else:
+            # the half width in RA of the circle, padded for rounding
+            half_width = np.degrees(np.arcsin(
+                min(np.sin(np.radians(radius)) / np.cos(np.radians(dec)), 1))) + 1e-9
+            ra = ra % 360
+            low, high = ra - half_width, ra + half_width
+            if low < 0:
+                ra_ranges = [(0, high), (low + 360, 360)]
+            elif high > 360:
+                ra_ranges = [(low, 360), (0, high - 360)]
+            else:
+                ra_ranges = [(low, high)]
+
+        parts = []
+        for zone in range(low_zone, high_zone + 1):
+            start, end = self._zone_bounds[zone], self._zone_bounds[zone + 1]
+            zone_ra = self._ra[start:end]
+            for low, high in ra_ranges:
+                parts.append(np.arange(
+                    start + np.searchsorted(zone_ra, low, side="left"),
+                    start + np.searchsorted(zone_ra, high, side="right")))
+        if not parts:
+            return np.zeros(0, dtype=int)
+        return np.concatenate(parts)
+
+    def _within(self, ra, dec, radius):
+        """
+        returns the positions in the index and the chord distances of the
+        points within radius degrees of (ra, dec).
+        """
+        candidates = self._candidates(ra, dec, radius)
+        chords = np.linalg.norm(
+            self._vectors[candidates] - _unit_vectors(ra, dec), axis=-1)
+        inside = chords <= _angle_to_chord(radius)
+        return candidates[inside], chords[inside]
+
+    def within(self, ra, dec, radius):
+        """
+        returns the indices of the positions within radius of (ra, dec),
+        ordered by distance, and their distances.
+
+        Parameters
+        ----------
+        ra, dec : float
+            the center of the circle in degrees.
+        radius : float
+            the radius of the circle in degrees.
+
+        Returns
+        -------
+        indices : `numpy.ndarray`
+            the indices of the positions in the input arrays.
+        separations : `numpy.ndarray`
+            their distances from (ra, dec) in degrees.
+        """
+        found, chords = self._within(ra, dec, radius)
+        order = np.argsort(chords, kind="stable")
+        return self._rows[found[order]], _chord_to_angle(chords[order])
+
+    def nearest(self, ra, dec):
+        """
+        returns the index of the position nearest to each of the given
+        positions, and the distance to it.
+
+        Parameters
+        ----------
+        ra, dec : array-like
+            the positions to look up in degrees.
+
+        Returns
+        -------
+        indices : `numpy.ndarray`
+            the indices of the nearest positions in the input arrays, -1
+            for positions that are not finite.
+        separations : `numpy.ndarray`
+            the distances to them in degrees, NaN for positions that are
+            not finite.
+
+        Raises
+        ------
+        ValueError
+            if the index is empty.
+        """
+        if not len(self):
+            raise ValueError("Cannot look up neighbours in an empty index")
+
+        ra = np.asarray(ra, dtype=float).reshape(-1)
+        dec = np.asarray(dec, dtype=float).reshape(-1)
+        indices = np.full(len(ra), -1)
+        chords = np.full(len(ra), np.nan)
+        for i in np.flatnonzero(np.isfinite(ra) & np.isfinite(dec)):
+            # widen the circle until there is something in it; the nearest
+            # point within the circle then is the nearest overall.
+            radius = self.zone_height
+            while radius < 180:
+                found, found_chords = self._within(ra[i], dec[i], radius)
+                if len(found):
+                    break
+                radius *= 2
+            else:
+                # the whole sky, where rounding might miss antipodes
+                found = np.arange(len(self))
+                found_chords = np.linalg.norm(
+                    self._vectors - _unit_vectors(ra[i], dec[i]), axis=-1)
+            best = np.argmin(found_chords)
+            indices[i], chords[i] = self._rows[found[best]], found_chords[best]
+        return indices, _chord_to_angle(chords)
+
+    def crossmatch(self, ra, dec, radius):
+        """
+        returns all pairs of indexed positions and given positions closer
+        than radius.
+
+        Parameters
+        ----------
+        ra, dec : array-like
+            the positions to match in degrees.
+        radius : float
+            the maximal distance of a pair in degrees.
+
+        Returns
+        -------
+        indices : `numpy.ndarray`
+            the indices of the matching positions in the indexed arrays.
+        other_indices : `numpy.ndarray`
+            the indices of the matching positions in ``ra`` and ``dec``.
+        separations : `numpy.ndarray`
+            the distances of the pairs in degrees.
+
+        The pairs are ordered by ``other_indices``, then by distance.
+        """
+        ra = np.asarray(ra, dtype=float).reshape(-1)
+        dec = np.asarray(dec, dtype=float).reshape(-1)
+        indices, other_indices, separations = [], [], []
+        for i in np.flatnonzero(np.isfinite(ra) & np.isfinite(dec)):
+            found, found_separations = self.within(ra[i], dec[i], radius)
+            indices.append(found)
+            other_indices.append(np.full(len(found), i))
+            separations.append(found_separations)
+        if not indices:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+        return (np.concatenate(indices), np.concatenate(other_indices),
+                np.concatenate(separations))
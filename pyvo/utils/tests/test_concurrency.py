@@ -0,0 +1,52 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Tests for pyvo.utils.concurrency
+"""
+import threading
+import time
+
+import pytest
+
+from pyvo.utils.concurrency import ordered_map
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_ordered_map_keeps_order(max_workers):
+    def slow_square(x):
+        # make early items finish last
+        time.sleep(0.001 * (10 - x))
+        return x * x
+
+    assert list(ordered_map(slow_square, range(10), max_workers=max_workers)) == [
+        x * x for x in range(10)]
+
+
+def test_ordered_map_bounded_window():
+    lock = threading.Lock()
+    started = []
+
+    def record(x):
+        with lock:
+            started.append(x)
+        return x
+
+    def items():
+        yield from range(1000)
+
+    results = ordered_map(record, items(), max_workers=2, window=3)
+    assert next(results) == 0
+    # only the window was submitted, not the whole input
+    assert len(started) <= 4
+    results.close()
+
+
+def test_ordered_map_propagates_errors():
+    def fail_on_three(x):
+        if x == 3:
+            raise ValueError("three")
+        return x
+
+    results = ordered_map(fail_on_three, range(10), max_workers=3)
+    assert [next(results) for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(ValueError, match="three"):
+        next(results)
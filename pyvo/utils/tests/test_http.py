@@ -4,8 +4,19 @@ Tests for pyvo.utils.http
 """
 
 import platform
+import threading
+import time
+from io import BytesIO
 
-from pyvo.utils.http import create_session
+import pytest
+import requests
+
+from astropy.utils.data import get_pkg_data_contents
+
+from pyvo.auth.authsession import AuthSession
+from pyvo.io.votable import parse as parse_votable
+from pyvo.utils import http
+from pyvo.utils.http import create_session, single_flight
 from pyvo.version import version
 
 
@@ -14,3 +25,138 @@ def test_create_session():
     assert (test_session.headers['User-Agent']
             == (f'pyvo-unittest pyVO/{version} Python/{platform.python_version()}'
                 f' ({platform.system()}) (IVOA-test)'))
+
+
+class Interrupted(BaseException):
+    pass
+
+
+class InFlight:
+    """
+    Runs single_flight in several threads while the first call blocks
+    until the others wait for it.
+    """
+    def __init__(self, monkeypatch, sessions, function, key=("GET", "http://example.com/x")):
+        self.sessions = sessions
+        self.function = function
+        self.key = key
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.waiting = 0
+        self.release = threading.Event()
+        self.results = [None] * len(sessions)
+
+        flight = self
+
+        class Done(threading.Event):
+            def wait(self, timeout=None):
+                flight.waiting += 1
+                return super().wait(timeout)
+
+        class Call(http._Call):
+            def __init__(self):
+                super().__init__()
+                self.done = Done()
+
+        monkeypatch.setattr(http, "_Call", Call)
+
+    def call(self):
+        with self.lock:
+            self.calls += 1
+            calls = self.calls
+        if calls == 1:
+            assert self.release.wait(5)
+        return self.function(calls)
+
+    def run(self, index):
+        try:
+            self.results[index] = ("result", single_flight(self.sessions[index], self.key, self.call))
+        except BaseException as error:
+            self.results[index] = ("error", error)
+
+    def start(self):
+        threads = [threading.Thread(target=self.run, args=(index,))
+                   for index in range(len(self.sessions))]
+        threads[0].start()
+        while self.calls == 0:
+            time.sleep(0.001)
+        for thread in threads[1:]:
+            thread.start()
+        # the first call returns once the other threads either wait for it
+        # or have made their own calls
+        deadline = time.monotonic() + 5
+        while (self.waiting + self.calls - 1 < len(self.sessions) - 1
+               and time.monotonic() < deadline):
+            time.sleep(0.001)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return self.results
+
+
+def test_single_flight_shares_result(monkeypatch):
+    session = create_session()
+    flight = InFlight(monkeypatch, [session, session, create_session()], lambda calls: [calls])
+    results = flight.start()
+    assert flight.calls == 1
+    assert [kind for kind, _ in results] == ["result"] * 3
+    assert all(result == [1] for _, result in results)
+    # each thread gets its own copy
+    assert len({id(result) for _, result in results}) == 3
+
+    # nothing is kept after the call
+    assert single_flight(session, flight.key, lambda: "again") == "again"
+
+
+def test_single_flight_results_independent(monkeypatch):
+    votable = get_pkg_data_contents("../../dal/tests/data/tap/obscore-image.xml", encoding="binary")
+    session = create_session()
+    flight = InFlight(
+        monkeypatch, [session] * 3, lambda calls: parse_votable(BytesIO(votable).read))
+    results = [result for _, result in flight.start()]
+    assert flight.calls == 1
+
+    # one consumer changes its result while the others use theirs
+    table = results[0].get_first_table()
+    table.array = table.array[:1]
+    for result in results[1:]:
+        assert len(result.get_first_table().array) == 10
+
+
+def test_single_flight_errors(monkeypatch):
+    def fail(calls):
+        raise ValueError(f"failure {calls}")
+
+    flight = InFlight(monkeypatch, [create_session()] * 3, fail)
+    results = flight.start()
+    assert flight.calls == 1
+    errors = [error for _, error in results]
+    assert all(isinstance(error, ValueError) and str(error) == "failure 1" for error in errors)
+    assert len({id(error) for error in errors}) == 3
+
+
+def test_single_flight_interrupted(monkeypatch):
+    def interrupt(calls):
+        if calls == 1:
+            raise Interrupted()
+        return calls
+
+    flight = InFlight(monkeypatch, [create_session()] * 2, interrupt)
+    results = flight.start()
+    assert isinstance(results[0][1], Interrupted)
+    assert results[1] == ("result", 2)
+
+
+@pytest.mark.parametrize("make_session", [
+    AuthSession,
+    lambda: requests.Session(),
+])
+def test_single_flight_separate_sessions(monkeypatch, make_session):
+    other = make_session()
+    if isinstance(other, requests.Session):
+        other.headers["Authorization"] = "Bearer x"
+    flight = InFlight(monkeypatch, [create_session(), other], lambda calls: calls)
+    results = flight.start()
+    assert flight.calls == 2
+    assert flight.waiting == 0
+    assert [result for _, result in results] == [1, 2]
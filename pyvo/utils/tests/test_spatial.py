@@ -0,0 +1,86 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Tests for pyvo.utils.spatial
+"""
+import numpy as np
+import pytest
+
+from astropy.coordinates import SkyCoord
+
+from pyvo.utils.spatial import SpatialIndex
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(42)
+    ra = rng.uniform(0, 360, 2000)
+    dec = np.degrees(np.arcsin(rng.uniform(-1, 1, 2000)))
+    # points close to the poles and the RA wrap-around
+    ra[:4], dec[:4] = [0.01, 359.99, 123, 300], [0, 0, 89.99, -89.99]
+    return ra, dec
+
+
+def _separations(ra, dec, ra0, dec0):
+    return SkyCoord(ra, dec, unit="deg").separation(
+        SkyCoord(ra0, dec0, unit="deg")).deg
+
+
+@pytest.mark.parametrize("center", [(10, 20), (0, 0), (359.9, 0.5), (42, 89.5), (200, -88)])
+def test_within(points, center):
+    index = SpatialIndex(*points)
+
+    found, separations = index.within(*center, 3)
+
+    expected = np.flatnonzero(_separations(*points, *center) <= 3)
+    assert sorted(found) == list(expected)
+    assert np.all(np.diff(separations) >= 0)
+    np.testing.assert_allclose(separations, _separations(*points, *center)[found])
+
+
+def test_nearest(points):
+    index = SpatialIndex(*points)
+    queries = [(10, 20), (0, 0), (180, 89.9), (33, -60)]
+
+    found, separations = index.nearest(*np.array(queries).T)
+
+    for (ra, dec), row, separation in zip(queries, found, separations):
+        expected = _separations(*points, ra, dec)
+        assert row == np.argmin(expected)
+        assert separation == pytest.approx(expected.min())
+
+
+def test_crossmatch(points):
+    index = SpatialIndex(*points)
+    ra, dec = points[0][:50] + 0.5, points[1][:50]
+
+    indices, other_indices, separations = index.crossmatch(ra, dec, 2)
+
+    pairs = set(zip(indices, other_indices))
+    for i in range(50):
+        expected = np.flatnonzero(_separations(*points, ra[i], dec[i]) <= 2)
+        assert {row for row, other in pairs if other == i} == set(expected)
+    assert list(other_indices) == sorted(other_indices)
+
+
+def test_invalid_positions():
+    index = SpatialIndex([10, np.nan, 10.1], [10, 10, np.nan])
+
+    assert len(index) == 1
+    assert list(index.within(10, 10, 1)[0]) == [0]
+
+    with pytest.raises(ValueError):
+        SpatialIndex([], []).nearest(0, 0)
+
+
+def test_nearest_invalid_queries():
+    index = SpatialIndex([10, 200], [10, -10])
+
+    found, separations = index.nearest([np.nan, 10, 190, 10], [0, np.inf, -10, 80])
+    assert list(found) == [-1, -1, 1, 0]
+    assert np.isnan(separations[:2]).all()
+    assert separations[2] == pytest.approx(10 * np.cos(np.radians(10)), rel=1e-3)
+
+    # the antipode of the only position
+    found, separations = SpatialIndex([0], [0]).nearest(180, 0)
+    assert list(found) == [0]
+    assert separations[0] == pytest.approx(180)